@@ -1,34 +1,276 @@
 import asyncio
 import json
+import math
 import time
-from typing import AsyncGenerator, Dict, List, Optional
+from collections import deque
+from typing import AsyncGenerator, Deque, Dict, List, Optional, Tuple, Union
 
 import httpx
-from fastapi import FastAPI, HTTPException, Request, status, UploadFile, File
+from fastapi import FastAPI, HTTPException, Query, Request, status, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, ConfigDict, Field
 from pathlib import Path
-import shutil
+from typing import TYPE_CHECKING
+
+from rag_engine import jsoncodec
+from rag_engine.batch_jobs import BatchJobError, BatchJobManager, BatchJobNotFoundError
+from rag_engine.ollama_pool import NoHealthyEndpointError, OllamaPool
+from rag_engine.residency import ModelResidencyManager
+from rag_engine.routing import ModelRouter, RouteTimer
+from rag_engine.namespaces import (
+    DEFAULT_NAMESPACE,
+    NamespaceError,
+    namespace_paths,
+    validate_namespace,
+)
+from rag_engine.uploads import (
+    UploadError,
+    UploadManager,
+    UploadOffsetError,
+    UploadTooLargeError,
+)
 
-from rag_engine import RAGEngine
+if TYPE_CHECKING:
+    from rag_engine import NamespaceRegistry, RAGEngine, RetrievalGate
 
 OLLAMA_BASE_URL = "http://127.0.0.1:11434"
+# Instancias de Ollama para chat y para embeddings (None = solo OLLAMA_BASE_URL)
+OLLAMA_CHAT_URLS: Optional[List[str]] = None
+OLLAMA_EMBEDDING_URLS: Optional[List[str]] = None
+OLLAMA_EJECT_AFTER_FAILURES = 3  # Fallas seguidas antes de sacar una instancia del pool
+OLLAMA_EJECT_SECONDS = 30.0
+OLLAMA_HEALTH_INTERVAL_SECONDS = 10.0  # Chequeo activo de /api/ps (readmite instancias)
+OLLAMA_CHAT_MODEL = "llama3.2"
+OLLAMA_EMBEDDING_MODEL = "nomic-embed-text"
+OLLAMA_KEEP_ALIVE: Optional[Union[str, int]] = "30m"  # Tiempo que Ollama mantiene los modelos cargados (-1 = siempre, None = 5 min)
+OLLAMA_RESIDENCY_POLICY = "pin"  # "pin" (recargar si se descargan), "preload" (solo al arrancar) u "off"
+OLLAMA_RESIDENCY_INTERVAL_SECONDS = 60.0  # Revisión de /api/ps para recargar modelos
+EMBEDDING_BACKEND = "ollama"  # "ollama" o un modelo local en este proceso: "sentence-transformers" o "hashing" (pruebas sin red)
+EMBEDDING_LOCAL_OPTIONS: Dict = {"model_path": "backend/rag_engine/models/nomic-embed-text-v1.5"}  # Mismo modelo que OLLAMA_EMBEDDING_MODEL para reutilizar el índice
+EMBEDDING_EXECUTION = "thread"  # Modelo local en un hilo ("thread") o en un proceso worker ("process")
+EMBEDDING_MAX_BATCH = 32  # Consultas máximas por lote del modelo local
+EMBEDDING_BATCH_WAIT_MS = 5.0  # Espera máxima de una consulta para agruparse con otras
 SYSTEM_PROMPT = "Responde en frases cortas."
 SESSION_TTL_SECONDS = 1800
 MAX_RESPONSE_CHARS = 500
+RESPONSE_CHARS_PER_TOKEN = 3.5  # Aproximación para español
+CHAT_NUM_PREDICT = math.ceil(MAX_RESPONSE_CHARS / RESPONSE_CHARS_PER_TOKEN)  # No generar más de lo que se devuelve
+CHAT_ROUTING_ENABLED = False  # Elegir entre CHAT_FAST_MODEL y CHAT_QUALITY_MODEL según el turno
+AUTO_MODEL = "auto"  # Valor de `model` que deja la elección al router
+CHAT_FAST_MODEL = "llama3.2:1b"
+CHAT_QUALITY_MODEL = OLLAMA_CHAT_MODEL
+CHAT_ROUTING_MAX_FAST_CHARS = 160  # Mensajes más largos van al modelo de calidad
+CHAT_ROUTING_MAX_FAST_TURNS = 6  # Conversaciones con más turnos del usuario van al modelo de calidad
+CHAT_ROUTING_MIN_FAST_RELEVANCE: Optional[float] = 0.5  # Con contexto RAG de menor similitud coseno va al modelo de calidad
 MAX_SESSION_MESSAGES = 20
+CHAT_PROTOCOL_VERSION = 1  # Versión del protocolo delta (sessionId + turn + prompt)
+HISTORY_COMPACTION_ENABLED = False  # Resumir los turnos viejos en lugar de reenviarlos completos
+HISTORY_TOKEN_BUDGET = 1024  # Tokens estimados (caracteres / 4) de historial por turno, sin el system prompt
+HISTORY_KEEP_RECENT_MESSAGES = 6  # Mensajes recientes que se envían siempre textuales
+HISTORY_SUMMARY_MODEL = OLLAMA_CHAT_MODEL
+HISTORY_SUMMARY_MAX_CHARS = 1200
+HISTORY_SUMMARY_PROMPT = (
+    "Resume la conversación en español en pocas frases. Conserva datos, nombres, "
+    "preguntas pendientes y decisiones; omite saludos y cortesías."
+)
 HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
 
+# Reducción de dimensionalidad del índice RAG (None = vectores completos)
+RAG_REDUCED_DIMENSION: Optional[int] = None
+RAG_REDUCTION_METHOD = "truncate"  # "truncate" (Matryoshka) o "pca"
+RAG_KEEP_FULL_VECTORS = False  # Guardar vectores completos para re-ranking
+RAG_BATCH_SEARCH_CHUNK = 64  # Consultas por búsqueda matricial en /rag/search/batch
+RAG_BATCH_SEARCH_MAX_QUERIES = 10000
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+RAG_EAGER_INIT = True  # Inicializar RAG en segundo plano al arrancar (si no, al primer uso)
+RAG_WATCH_ENABLED = False  # Re-indexar automáticamente los PDFs que cambien en rag/
+RAG_WATCH_DEBOUNCE_SECONDS = 2.0
+RAG_REBUILD_MIN_RATIO = 0.5  # Una reconstrucción con menos chunks que esta fracción del índice activo no se activa
+RAG_RETRIEVAL_BUDGET_MS: Optional[float] = None  # Responder sin contexto si la búsqueda tarda más (None = sin límite)
+RAG_GATE_ENABLED = True  # Omitir la búsqueda en mensajes de cortesía o demasiado cortos
+RAG_MIN_RELEVANCE: Optional[float] = None  # Descartar chunks con menor similitud coseno con la consulta (None = todos)
+RAG_GATE_CENTROID_THRESHOLD: Optional[float] = None  # Similitud mínima con el centroide del índice (None = no se compara)
+RAG_NUM_SHARDS = 0  # Procesos worker del vector store (0/1 = sin particionar)
+RAG_DEDUP_THRESHOLD: Optional[float] = 0.8  # Jaccard mínima para guardar un solo chunk entre casi duplicados (None = sin deduplicar)
+RAG_PDF_BACKENDS = ["pypdf2", "pymupdf", "pdfminer"]  # Orden de preferencia; los siguientes reintentan las páginas fallidas (se omiten los no instalados)
+RAG_PDF_PAGE_TIMEOUT_SECONDS: Optional[float] = 30.0  # Tiempo máximo por página al extraer (None = sin límite)
+RAG_REBALANCE_TOLERANCE = 0.2  # Desbalance de chunks tolerado entre shards
+
+# Trabajos de chat por lotes (/batch/chat)
+BATCH_JOBS_DIR = "backend/batch_jobs"
+BATCH_MAX_PROMPTS = 10000
+BATCH_MAX_PROMPT_CHARS = 8000
+BATCH_CONCURRENCY = 2  # Peticiones simultáneas de todos los lotes hacia Ollama
+BATCH_MAX_INTERACTIVE_IN_FLIGHT = 1  # Los lotes esperan mientras haya estas peticiones del chat (o más) en curso
+BATCH_WINDOW = 64  # Prompts cuyo contexto RAG se busca y reordena junto
+BATCH_NUM_PREDICT = 1024  # Tokens por respuesta por defecto (sin el recorte de MAX_RESPONSE_CHARS)
+BATCH_RESUME_ON_STARTUP = True  # Reanudar al arrancar los trabajos interrumpidos
+
 app = FastAPI(title="Willay Chatbot", version="2.0.0")
 
-# Inicializar motor RAG
-rag_engine = RAGEngine(
-    pdf_dir="rag",
-    cache_dir="backend/rag_engine/cache",
-    vector_store_dir="backend/rag_engine/vector_store",
-    embedding_model="nomic-embed-text"
-)
+# Motor RAG: se crea de forma diferida para no importar chromadb/PyPDF2/numpy
+# ni abrir el PersistentClient antes de que uvicorn empiece a escuchar
+# rag_engine es el motor del namespace por defecto; rag_namespaces crea los demás
+rag_engine: Optional["RAGEngine"] = None
+rag_namespaces: Optional["NamespaceRegistry"] = None
+retrieval_gate: Optional["RetrievalGate"] = None
+_rag_init_task: Optional[asyncio.Task] = None
+_rag_init_error: Optional[str] = None
+_document_watchers: List = []
+_rebuild_tasks: Dict[str, asyncio.Task] = {}
+_last_rebuilds: Dict[str, Dict] = {}
+
+
+_ollama_pools: Dict[str, OllamaPool] = {}
+_model_residency: Optional[ModelResidencyManager] = None
+model_router: Optional[ModelRouter] = None
+batch_jobs: Optional[BatchJobManager] = None
+
+
+def get_ollama_pool(kind: str = "chat") -> OllamaPool:
+    """Pool de instancias de Ollama para "chat" o "embeddings" (se crea al primer uso)"""
+    pool = _ollama_pools.get(kind)
+    if pool is None:
+        urls = OLLAMA_CHAT_URLS if kind == "chat" else OLLAMA_EMBEDDING_URLS
+        pool = OllamaPool(
+            urls or [OLLAMA_BASE_URL],
+            name=kind,
+            timeout=HTTP_TIMEOUT if kind == "chat" else httpx.Timeout(30.0),
+            eject_after=OLLAMA_EJECT_AFTER_FAILURES,
+            eject_seconds=OLLAMA_EJECT_SECONDS,
+            health_interval=OLLAMA_HEALTH_INTERVAL_SECONDS
+        )
+        _ollama_pools[kind] = pool
+    return pool
+
+
+def _create_embedding_generator():
+    """Generador con modelo local, o None para que el motor use Ollama"""
+    if EMBEDDING_BACKEND == "ollama":
+        return None
+    from rag_engine import EmbeddingGenerator
+    from rag_engine.embedding_backends import LocalEmbedder
+
+    return EmbeddingGenerator(
+        OLLAMA_EMBEDDING_MODEL,
+        local=LocalEmbedder(
+            EMBEDDING_BACKEND,
+            EMBEDDING_LOCAL_OPTIONS,
+            execution=EMBEDDING_EXECUTION,
+            max_batch=EMBEDDING_MAX_BATCH,
+            max_wait_ms=EMBEDDING_BATCH_WAIT_MS
+        )
+    )
+
+
+def _create_rag_engine(namespace: str = DEFAULT_NAMESPACE) -> "RAGEngine":
+    from rag_engine import RAGEngine
+
+    paths = namespace_paths(namespace, pdf_dir="rag", cache_dir="backend/rag_engine/cache")
+    return RAGEngine(
+        pdf_dir=paths["pdf_dir"],
+        cache_dir=paths["cache_dir"],
+        vector_store_dir="backend/rag_engine/vector_store",
+        embedding_model=OLLAMA_EMBEDDING_MODEL,
+        ollama_base_url=OLLAMA_BASE_URL,
+        reduced_dimension=RAG_REDUCED_DIMENSION,
+        reduction_method=RAG_REDUCTION_METHOD,
+        keep_full_vectors=RAG_KEEP_FULL_VECTORS,
+        rebuild_min_ratio=RAG_REBUILD_MIN_RATIO,
+        collection_name=paths["collection_name"],
+        num_shards=RAG_NUM_SHARDS,
+        ollama_pool=get_ollama_pool("embeddings"),
+        ollama_keep_alive=OLLAMA_KEEP_ALIVE,
+        dedup_threshold=RAG_DEDUP_THRESHOLD,
+        pdf_backends=RAG_PDF_BACKENDS,
+        pdf_page_timeout=RAG_PDF_PAGE_TIMEOUT_SECONDS,
+        # Todos los namespaces comparten el generador (y su dimensión detectada)
+        embedding_generator=rag_engine.embedding_generator if rag_engine is not None else _create_embedding_generator()
+    )
+
+
+async def _init_rag_engine() -> "RAGEngine":
+    global rag_engine, rag_namespaces, retrieval_gate, _rag_init_error
+    from rag_engine.gating import RetrievalGate
+    from rag_engine.namespaces import NamespaceRegistry
+
+    # Ya creado (p. ej. sembrado por benchmarks/load_test.py antes de arrancar)
+    if rag_engine is not None:
+        return rag_engine
+    started = time.perf_counter()
+    try:
+        engine = await asyncio.to_thread(_create_rag_engine)
+    except Exception as error:  # noqa: BLE001
+        _rag_init_error = str(error)
+        print(f"❌ Error inicializando motor RAG: {error}")
+        raise
+    rag_namespaces = NamespaceRegistry(_create_rag_engine, default_engine=engine, pdf_dir="rag")
+    if RAG_GATE_ENABLED:
+        retrieval_gate = RetrievalGate(
+            min_relevance=RAG_MIN_RELEVANCE,
+            centroid_threshold=RAG_GATE_CENTROID_THRESHOLD
+        )
+    rag_engine = engine
+    _rag_init_error = None
+    print(f"✓ Motor RAG listo en {time.perf_counter() - started:.2f}s")
+    return engine
+
+
+def _start_rag_init() -> asyncio.Task:
+    global _rag_init_task
+    # Reintentar si la inicialización anterior falló
+    if _rag_init_task is None or (_rag_init_task.done() and rag_engine is None):
+        _rag_init_task = asyncio.create_task(_init_rag_engine())
+    return _rag_init_task
+
+
+async def get_rag_engine(namespace: Optional[str] = None, create: bool = False) -> "RAGEngine":
+    """
+    Retorna el motor RAG de un namespace, esperando su inicialización si hace falta
+    
+    Args:
+        namespace: Namespace (None = por defecto)
+        create: Crear el namespace si no existe (subidas e indexación)
+    """
+    if rag_engine is None:
+        try:
+            await asyncio.shield(_start_rag_init())
+        except Exception as error:  # noqa: BLE001
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Motor RAG no disponible"
+            ) from error
+    try:
+        namespace = validate_namespace(namespace)
+    except NamespaceError as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+    try:
+        return await rag_namespaces.get(namespace, create=create)
+    except NamespaceError as error:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(error)) from error
+
+
+_upload_managers: Dict[str, UploadManager] = {}
+
+
+def get_upload_manager(namespace: Optional[str] = None) -> UploadManager:
+    """Gestor de subidas del directorio de PDFs de un namespace"""
+    try:
+        name = validate_namespace(namespace)
+    except NamespaceError as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+    manager = _upload_managers.get(name)
+    if manager is None:
+        manager = UploadManager(
+            namespace_paths(name)["pdf_dir"],
+            max_bytes=MAX_UPLOAD_BYTES,
+            chunk_size=UPLOAD_CHUNK_BYTES
+        )
+        manager.cleanup_stale()
+        _upload_managers[name] = manager
+    return manager
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +278,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Turn", "X-Chat-Protocol"],
 )
 
 
@@ -44,8 +287,20 @@ class ChatMessage(BaseModel):
     content: str
 
 
+def _message(role: str, content: str) -> ChatMessage:
+    """ChatMessage armado por el servidor: el rol es fijo, no hace falta validar"""
+    return ChatMessage.model_construct(role=role, content=content)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada con jsoncodec (orjson si está instalado)"""
+
+    def render(self, content) -> bytes:
+        return jsoncodec.dumps_bytes(content)
+
+
 class ChatRequest(BaseModel):
-    model: str = Field(default="llama3.2", min_length=1)
+    model: str = Field(default=OLLAMA_CHAT_MODEL, min_length=1)
     temperature: float = Field(default=0.3, ge=0.0, le=2.0)
     messages: Optional[List[ChatMessage]] = None
     prompt: Optional[str] = None
@@ -53,17 +308,64 @@ class ChatRequest(BaseModel):
     reset: bool = False
     use_rag: bool = Field(default=False, alias="useRag")
     rag_n_results: int = Field(default=5, ge=1, le=10, alias="ragNResults")
+    rag_namespaces: Optional[List[str]] = Field(default=None, max_length=16, alias="ragNamespaces")
+    rag_filename: Optional[str] = Field(default=None, alias="ragFilename")
+    # Protocolo delta: el cliente manda solo el mensaje nuevo y el último turno
+    # confirmado por el servidor; si no coincide se responde 409 y el cliente
+    # reenvía la conversación completa en `messages`
+    session_id: Optional[str] = Field(default=None, min_length=1, max_length=128, alias="sessionId")
+    turn: Optional[int] = Field(default=None, ge=0)
+    protocol: int = Field(default=CHAT_PROTOCOL_VERSION, ge=1, le=CHAT_PROTOCOL_VERSION)
 
     model_config = ConfigDict(populate_by_name=True, extra="ignore")
 
 
 class ChatResponse(BaseModel):
     response: str
+    turn: Optional[int] = None
+
+
+class BatchSearchQuery(BaseModel):
+    query: str = Field(min_length=1)
+    n_results: Optional[int] = Field(default=None, ge=1, le=50)
+    filename_filter: Optional[str] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchSearchQuery] = Field(min_length=1, max_length=RAG_BATCH_SEARCH_MAX_QUERIES)
+    n_results: int = Field(default=5, ge=1, le=50)
+
+
+class BatchChatItem(BaseModel):
+    prompt: str = Field(min_length=1, max_length=BATCH_MAX_PROMPT_CHARS)
+    id: Optional[str] = Field(default=None, max_length=128)
+    # Opciones de RAG propias del prompt (None = las del trabajo)
+    use_rag: Optional[bool] = Field(default=None, alias="useRag")
+    rag_n_results: Optional[int] = Field(default=None, ge=1, le=10, alias="ragNResults")
+    rag_namespaces: Optional[List[str]] = Field(default=None, max_length=16, alias="ragNamespaces")
+    rag_filename: Optional[str] = Field(default=None, alias="ragFilename")
+
+    model_config = ConfigDict(populate_by_name=True, extra="ignore")
+
+
+class BatchChatRequest(BaseModel):
+    prompts: List[BatchChatItem] = Field(min_length=1, max_length=BATCH_MAX_PROMPTS)
+    system_prompt: Optional[str] = Field(default=None, alias="systemPrompt")
+    model: str = Field(default=OLLAMA_CHAT_MODEL, min_length=1)
+    temperature: float = Field(default=0.3, ge=0.0, le=2.0)
+    max_tokens: int = Field(default=BATCH_NUM_PREDICT, ge=1, le=8192, alias="maxTokens")
+    use_rag: bool = Field(default=False, alias="useRag")
+    rag_n_results: int = Field(default=5, ge=1, le=10, alias="ragNResults")
+    rag_namespaces: Optional[List[str]] = Field(default=None, max_length=16, alias="ragNamespaces")
+
+    model_config = ConfigDict(populate_by_name=True, extra="ignore")
 
 
 class SessionData(BaseModel):
     messages: List[ChatMessage]
     expires_at: float
+    summary: str = ""  # Resumen de los turnos ya compactados (modo compactación)
+    turn: int = 0  # Último turno confirmado al cliente (protocolo delta)
 
 
 _sessions: Dict[str, SessionData] = {}
@@ -77,18 +379,37 @@ async def _prune_sessions() -> None:
         _sessions.pop(key, None)
 
 
-async def _get_session_messages(client_id: str) -> List[ChatMessage]:
+def _session_key(payload: "ChatRequest") -> Optional[str]:
+    # Cada conversación del cliente tiene su propio historial en el servidor
+    if payload.session_id:
+        return f"{payload.client_id or 'anon'}:{payload.session_id}"
+    return payload.client_id
+
+
+def _check_turn(data: Optional[SessionData], expected_turn: Optional[int]) -> None:
+    """Protocolo delta: el turno que vio el cliente debe coincidir con el guardado"""
+    if not expected_turn:
+        return
+    if data is None or data.turn != expected_turn:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Historial desincronizado: reenvía la conversación completa"
+        )
+
+
+async def _get_session_messages(client_id: str, expected_turn: Optional[int] = None) -> List[ChatMessage]:
     async with _sessions_lock:
         await _prune_sessions()
         data = _sessions.get(client_id)
+        _check_turn(data, expected_turn)
         if not data:
             return []
         return list(data.messages)
 
 
-async def _save_session_messages(client_id: str, messages: List[ChatMessage]) -> None:
+async def _save_session_messages(client_id: str, messages: List[ChatMessage], turn: int = 0) -> None:
     trimmed = list(messages)[-MAX_SESSION_MESSAGES:]
-    data = SessionData(messages=trimmed, expires_at=time.time() + SESSION_TTL_SECONDS)
+    data = SessionData(messages=trimmed, expires_at=time.time() + SESSION_TTL_SECONDS, turn=turn)
     async with _sessions_lock:
         _sessions[client_id] = data
 
@@ -98,103 +419,369 @@ async def _clear_session(client_id: str) -> None:
         _sessions.pop(client_id, None)
 
 
+def _estimate_tokens(messages: List[ChatMessage]) -> int:
+    # Aproximación barata: ~4 caracteres por token más el rol de cada mensaje
+    return sum(len(message.content) // 4 + 4 for message in messages)
+
+
+def _fit_token_budget(messages: List[ChatMessage], budget: int) -> List[ChatMessage]:
+    """Los mensajes más recientes que entran en el presupuesto (siempre al menos el último)"""
+    kept: List[ChatMessage] = []
+    used = 0
+    for message in reversed(messages):
+        used += _estimate_tokens([message])
+        if kept and used > budget:
+            break
+        kept.append(message)
+    kept.reverse()
+    return kept
+
+
+async def _get_compacted_history(client_id: str, expected_turn: Optional[int] = None) -> List[ChatMessage]:
+    """Historial de la sesión con el resumen de los turnos viejos en el system prompt"""
+    async with _sessions_lock:
+        await _prune_sessions()
+        data = _sessions.get(client_id)
+        _check_turn(data, expected_turn)
+        if not data:
+            return []
+        summary, messages = data.summary, list(data.messages)
+    system = SYSTEM_PROMPT
+    if summary:
+        system = f"{SYSTEM_PROMPT}\n\nResumen de la conversación hasta ahora:\n{summary}"
+    return [_message("system", system), *messages]
+
+
+_compaction_tasks: Dict[str, asyncio.Task] = {}
+_compaction_stats = {"runs": 0, "failures": 0, "messages_folded": 0, "total_seconds": 0.0}
+
+
+async def _append_session_turn(
+    client_id: str,
+    conversation: List[ChatMessage],
+    assistant_reply: str,
+    new_messages: Optional[List[ChatMessage]],
+    turn: int = 0,
+) -> None:
+    """
+    Guarda el turno en modo compactación
+
+    Con `new_messages` (historial en el servidor) se agregan a los mensajes
+    guardados; si no, el cliente mandó su historial y se reemplaza. Cuando el
+    historial supera HISTORY_TOKEN_BUDGET se resume en segundo plano.
+    """
+    assistant = _message("assistant", assistant_reply)
+    async with _sessions_lock:
+        data = _sessions.get(client_id)
+        if new_messages is not None and data is not None:
+            messages, summary = [*data.messages, *new_messages, assistant], data.summary
+        else:
+            messages, summary = [m for m in conversation if m.role != "system"] + [assistant], ""
+        # Tope por si el resumen falla repetidamente
+        messages = _fit_token_budget(messages, HISTORY_TOKEN_BUDGET * 4)
+        _sessions[client_id] = SessionData(
+            messages=messages,
+            summary=summary,
+            expires_at=time.time() + SESSION_TTL_SECONDS,
+            turn=turn
+        )
+        needs_compaction = (
+            len(messages) > HISTORY_KEEP_RECENT_MESSAGES
+            and _estimate_tokens(messages) > HISTORY_TOKEN_BUDGET
+        )
+    if needs_compaction:
+        task = _compaction_tasks.get(client_id)
+        if task is None or task.done():
+            task = asyncio.create_task(_compact_session(client_id))
+            task.add_done_callback(lambda _: _compaction_tasks.pop(client_id, None))
+            _compaction_tasks[client_id] = task
+
+
+async def _summarize_history(previous: str, messages: List[ChatMessage]) -> str:
+    transcript = "\n".join(
+        f"{'Usuario' if message.role == 'user' else 'Asistente'}: {message.content}"
+        for message in messages
+    )
+    content = f"Resumen anterior:\n{previous}\n\nConversación nueva:\n{transcript}" if previous else transcript
+    payload = {
+        "model": HISTORY_SUMMARY_MODEL,
+        "messages": [
+            {"role": "system", "content": HISTORY_SUMMARY_PROMPT},
+            {"role": "user", "content": content},
+        ],
+        "stream": False,
+        "options": {"temperature": 0.1, "num_predict": HISTORY_SUMMARY_MAX_CHARS // 4},
+    }
+    if OLLAMA_KEEP_ALIVE is not None:
+        payload["keep_alive"] = OLLAMA_KEEP_ALIVE
+    response = await get_ollama_pool("chat").post("/api/chat", payload, model=HISTORY_SUMMARY_MODEL)
+    summary = response.json()["message"]["content"].strip()
+    return summary[:HISTORY_SUMMARY_MAX_CHARS]
+
+
+async def _compact_session(client_id: str) -> None:
+    """Pliega los mensajes viejos de una sesión en su resumen (fuera del camino crítico)"""
+    async with _sessions_lock:
+        data = _sessions.get(client_id)
+        if data is None:
+            return
+        older = list(data.messages[:-HISTORY_KEEP_RECENT_MESSAGES])
+        previous = data.summary
+    if not older:
+        return
+
+    started = time.perf_counter()
+    try:
+        summary = await _summarize_history(previous, older)
+    except (httpx.HTTPError, KeyError, ValueError) as error:
+        _compaction_stats["failures"] += 1
+        print(f"⚠️  No se pudo resumir el historial de la sesión: {error}")
+        return
+    if not summary:
+        _compaction_stats["failures"] += 1
+        return
+
+    async with _sessions_lock:
+        data = _sessions.get(client_id)
+        # La sesión pudo reiniciarse o recortarse mientras se resumía
+        if data is None or data.messages[:len(older)] != older:
+            return
+        data.messages = data.messages[len(older):]
+        data.summary = summary
+    _compaction_stats["runs"] += 1
+    _compaction_stats["messages_folded"] += len(older)
+    _compaction_stats["total_seconds"] += time.perf_counter() - started
+
+
 def _ensure_system_message(messages: List[ChatMessage]) -> List[ChatMessage]:
     if messages and messages[0].role == "system":
         return messages
-    return [ChatMessage(role="system", content=SYSTEM_PROMPT), *messages]
+    return [_message("system", SYSTEM_PROMPT), *messages]
 
 
 def _sanitize_messages(messages: List[ChatMessage]) -> List[ChatMessage]:
+    """Descarta los mensajes vacíos; los ya validados se reutilizan sin copiarlos"""
     sanitized: List[ChatMessage] = []
     for message in messages:
-        content = (message.content or "").strip()
+        content = message.content.strip()
         if not content:
             continue
-        sanitized.append(ChatMessage(role=message.role, content=content))
+        if len(content) != len(message.content):
+            message = message.model_copy(update={"content": content})
+        sanitized.append(message)
     return sanitized
 
 
-async def _build_messages(payload: ChatRequest) -> List[ChatMessage]:
-    if payload.reset and payload.client_id:
-        await _clear_session(payload.client_id)
+class _RetrievalStats:
+    """Latencia de la recuperación de contexto en el chat y veces que superó el presupuesto"""
+
+    def __init__(self, window: int = 512):
+        self.count = 0
+        self.over_budget = 0
+        self.recent: Deque[float] = deque(maxlen=window)
 
+    def record(self, elapsed: float, over_budget: bool) -> None:
+        self.count += 1
+        self.over_budget += int(over_budget)
+        self.recent.append(elapsed)
+
+    def as_dict(self) -> Dict:
+        ordered = sorted(self.recent)
+        return {
+            "count": self.count,
+            "over_budget": self.over_budget,
+            "budget_ms": RAG_RETRIEVAL_BUDGET_MS,
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3) if ordered else 0.0
+        }
+
+
+_retrieval_stats = _RetrievalStats()
+
+
+def _worth_retrieving(query: str) -> bool:
+    """Etapa heurística del gating (sin gate se busca siempre)"""
+    return retrieval_gate is None or retrieval_gate.check_query(query) is None
+
+
+async def _retrieve_context(payload: ChatRequest, query: str) -> List[Dict]:
+    """
+    Busca contexto para el chat respetando RAG_RETRIEVAL_BUDGET_MS
+
+    Si la búsqueda excede el presupuesto se cancela y se responde sin contexto.
+    """
+    started = time.perf_counter()
+    search = rag_namespaces.search(
+        query,
+        payload.rag_namespaces or [DEFAULT_NAMESPACE],
+        n_results=payload.rag_n_results,
+        filename_filter=payload.rag_filename,
+        gate=retrieval_gate
+    )
+    try:
+        if RAG_RETRIEVAL_BUDGET_MS is None:
+            chunks = await search
+        else:
+            chunks = await asyncio.wait_for(search, timeout=RAG_RETRIEVAL_BUDGET_MS / 1000)
+    except asyncio.TimeoutError:
+        elapsed = time.perf_counter() - started
+        _retrieval_stats.record(elapsed, over_budget=True)
+        print(f"⚠️  Recuperación RAG superó {RAG_RETRIEVAL_BUDGET_MS} ms; se responde sin contexto")
+        return []
+    except NamespaceError as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+    except Exception as error:  # noqa: BLE001
+        # P. ej. modelo de embeddings inalcanzable antes de conocer la dimensión
+        print(f"⚠️  Recuperación RAG fallida; se responde sin contexto: {error}")
+        return []
+    _retrieval_stats.record(time.perf_counter() - started, over_budget=False)
+    return chunks
+
+
+async def _build_messages(payload: ChatRequest) -> Tuple[List[ChatMessage], List[Dict], List[ChatMessage]]:
+    """
+    Conversación a enviar a Ollama, los chunks RAG usados (vacío si no hubo)
+    y la conversación a guardar en la sesión
+
+    El contexto RAG solo va en la copia enviada: la sesión conserva el system
+    prompt original para que el turno siguiente no vuelva a enviar el contexto
+    de los anteriores.
+    """
     incoming = _sanitize_messages(payload.messages or [])
     if not incoming:
         prompt = (payload.prompt or "").strip()
         if not prompt:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No recibí ningún mensaje")
         incoming = [
-            ChatMessage(role="system", content=SYSTEM_PROMPT),
-            ChatMessage(role="user", content=prompt),
+            _message("system", SYSTEM_PROMPT),
+            _message("user", prompt),
         ]
 
-    if payload.client_id and not payload.reset and not payload.messages:
-        session_messages = await _get_session_messages(payload.client_id)
-    else:
-        session_messages = []
+    # Si RAG está habilitado, la búsqueda de contexto arranca antes de leer la
+    # sesión: la consulta es el último mensaje del usuario y ya se conoce.
+    # Si el motor aún no está listo se responde sin contexto en lugar de bloquear
+    if payload.use_rag and rag_engine is None:
+        _start_rag_init()
+    use_rag = payload.use_rag and rag_engine is not None
+    last_user_msg = next((m.content for m in reversed(incoming) if m.role == "user"), "")
+    retrieval = None
+    if use_rag and last_user_msg and _worth_retrieving(last_user_msg):
+        retrieval = asyncio.create_task(_retrieve_context(payload, last_user_msg))
+
+    key = _session_key(payload)
+    # turn=0 en el protocolo delta equivale a empezar la conversación
+    expected_turn = payload.turn if payload.session_id else None
+    try:
+        if key and (payload.reset or expected_turn == 0):
+            await _clear_session(key)
+
+        if key and not payload.reset and not payload.messages:
+            if HISTORY_COMPACTION_ENABLED:
+                session_messages = await _get_compacted_history(key, expected_turn)
+            else:
+                session_messages = await _get_session_messages(key, expected_turn)
+        else:
+            session_messages = []
+    except BaseException:
+        if retrieval is not None:
+            retrieval.cancel()
+        raise
 
-    merged = list(session_messages or []) + incoming
+    if session_messages:
+        # El historial guardado ya trae su system prompt (con el resumen si se compacta)
+        merged = session_messages + [m for m in incoming if m.role != "system"]
+    else:
+        merged = incoming
     merged = _ensure_system_message(merged)
-    
-    # Si RAG está habilitado, enriquecer el system prompt con contexto
-    if payload.use_rag and rag_engine.is_indexed():
-        # Obtener el último mensaje del usuario
+
+    if use_rag and retrieval is None and not last_user_msg:
+        # Sin mensaje de usuario nuevo: se usa el último de la sesión
         last_user_msg = next((m.content for m in reversed(merged) if m.role == "user"), "")
+        if last_user_msg and _worth_retrieving(last_user_msg):
+            retrieval = asyncio.create_task(_retrieve_context(payload, last_user_msg))
+
+    context_chunks: List[Dict] = []
+    outgoing = merged
+    if retrieval is not None:
+        context_chunks = await retrieval
         
-        if last_user_msg:
-            # Buscar contexto relevante
-            context_chunks = await rag_engine.search_context(
+        if context_chunks:
+            # Enriquecer el system prompt con contexto (merged siempre empieza con uno)
+            enhanced_system = rag_engine.build_rag_prompt(
                 last_user_msg,
-                n_results=payload.rag_n_results
+                context_chunks,
+                merged[0].content
             )
-            
-            if context_chunks:
-                # Enriquecer el system prompt con contexto
-                original_system = merged[0].content if merged and merged[0].role == "system" else SYSTEM_PROMPT
-                enhanced_system = rag_engine.build_rag_prompt(
-                    last_user_msg,
-                    context_chunks,
-                    original_system
-                )
-                
-                # Reemplazar el system message
-                if merged and merged[0].role == "system":
-                    merged[0] = ChatMessage(role="system", content=enhanced_system)
-                else:
-                    merged.insert(0, ChatMessage(role="system", content=enhanced_system))
+            outgoing = [_message("system", enhanced_system), *merged[1:]]
     
-    return merged[-MAX_SESSION_MESSAGES:]
+    if HISTORY_COMPACTION_ENABLED:
+        # Límite por tokens: el system prompt y los mensajes más recientes que entren
+        return [outgoing[0], *_fit_token_budget(outgoing[1:], HISTORY_TOKEN_BUDGET)], context_chunks, merged
+    return outgoing[-MAX_SESSION_MESSAGES:], context_chunks, merged[-MAX_SESSION_MESSAGES:]
+
+
+def _select_model(
+    payload: ChatRequest,
+    messages: List[ChatMessage],
+    context_chunks: List[Dict]
+) -> Tuple[Optional[str], str]:
+    """
+    Ruta y modelo del turno
+
+    El router decide si el cliente no indicó modelo o pidió "auto"; si
+    eligió uno concreto (o no hay router) se respeta y la ruta es None.
+    """
+    auto = payload.model == AUTO_MODEL or "model" not in payload.model_fields_set
+    if model_router is None:
+        return None, OLLAMA_CHAT_MODEL if payload.model == AUTO_MODEL else payload.model
+    if not auto:
+        model_router.client_selected += 1
+        return None, payload.model
+    prompt = next((m.content for m in reversed(messages) if m.role == "user"), "")
+    user_turns = sum(m.role == "user" for m in messages)
+    return model_router.route(prompt, user_turns, context_chunks)
 
 
 async def _ollama_stream(
     messages: List[ChatMessage],
     model: str,
     temperature: float,
+    num_predict: int = CHAT_NUM_PREDICT,
 ) -> AsyncGenerator[str, None]:
     payload = {
         "model": model,
-        "messages": [message.model_dump() for message in messages],
+        "messages": [{"role": message.role, "content": message.content} for message in messages],
         "stream": True,
-        "options": {"temperature": temperature, "num_predict": 128},
+        "options": {"temperature": temperature, "num_predict": num_predict},
     }
-
-    async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-        async with client.stream("POST", f"{OLLAMA_BASE_URL}/api/chat", json=payload) as response:
-            response.raise_for_status()
-            async for line in response.aiter_lines():
+    if OLLAMA_KEEP_ALIVE is not None:
+        # Sin keep_alive cada petición reinicia el plazo de descarga al valor por defecto
+        payload["keep_alive"] = OLLAMA_KEEP_ALIVE
+
+    async with get_ollama_pool("chat").stream("/api/chat", payload, model=model) as response:
+        # NDJSON leído como bytes: cada línea se parsea sin decodificarla a str
+        pending = b""
+        async for chunk in response.aiter_bytes():
+            if pending:
+                chunk = pending + chunk
+            lines = chunk.split(b"\n")
+            pending = lines.pop()
+            for line in lines:
                 if not line:
                     continue
                 try:
-                    data = json.loads(line)
-                except json.JSONDecodeError:
+                    data = jsoncodec.loads(line)
+                except jsoncodec.DecodeError:
                     continue
                 if data.get("error"):
                     raise RuntimeError(data["error"])
-                content = data.get("message", {}).get("content", "")
-                if content:
-                    yield content
+                message = data.get("message")
+                if message:
+                    content = message.get("content")
+                    if content:
+                        yield content
                 if data.get("done"):
-                    break
+                    return
 
 
 
@@ -209,47 +796,96 @@ def _truncate_text(text: str) -> str:
 
 
 
+def _new_turn(payload: ChatRequest) -> Optional[List[ChatMessage]]:
+    """Mensajes nuevos del turno cuando el historial lo guarda el servidor"""
+    if payload.messages:
+        return None
+    return [_message("user", (payload.prompt or "").strip())]
+
+
+def _protocol_headers(turn: Optional[int]) -> Dict[str, str]:
+    headers = {"X-Chat-Protocol": str(CHAT_PROTOCOL_VERSION)}
+    if turn is not None:
+        headers["X-Session-Turn"] = str(turn)
+    return headers
+
+
+async def _next_turn(payload: ChatRequest) -> Optional[int]:
+    """Turno que quedará confirmado si la respuesta se completa (solo con sessionId)"""
+    if not payload.session_id:
+        return None
+    if payload.turn is not None and not payload.messages:
+        return payload.turn + 1
+    # Resincronización: el contador sigue avanzando para invalidar turnos viejos
+    async with _sessions_lock:
+        data = _sessions.get(_session_key(payload))
+    return (data.turn if data else 0) + 1
+
+
 async def _finalize_session(
     client_id: Optional[str],
     conversation: List[ChatMessage],
     assistant_reply: str,
+    new_messages: Optional[List[ChatMessage]] = None,
+    turn: Optional[int] = None,
 ) -> None:
     if not client_id:
         return
     if not assistant_reply.strip():
         return
-    updated = conversation + [ChatMessage(role="assistant", content=assistant_reply)]
-    await _save_session_messages(client_id, updated)
+    if HISTORY_COMPACTION_ENABLED:
+        await _append_session_turn(client_id, conversation, assistant_reply, new_messages, turn or 0)
+        return
+    updated = conversation + [_message("assistant", assistant_reply)]
+    await _save_session_messages(client_id, updated, turn or 0)
 
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(payload: ChatRequest) -> JSONResponse:
     if payload.reset and not (payload.messages or (payload.prompt and payload.prompt.strip())):
-        if payload.client_id:
-            await _clear_session(payload.client_id)
-        return JSONResponse(content=ChatResponse(response="Sesión reiniciada").model_dump())
+        if _session_key(payload):
+            await _clear_session(_session_key(payload))
+        return FastJSONResponse(content={"response": "Sesión reiniciada"})
+
+    # Circuito abierto: responder al instante en lugar de esperar el timeout
+    if not get_ollama_pool("chat").admit():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Ollama no disponible")
 
     try:
-        messages = await _build_messages(payload)
-        accumulated = ""
+        messages, context_chunks, history = await _build_messages(payload)
+        route, model = _select_model(payload, messages, context_chunks)
+        next_turn = await _next_turn(payload)
+        parts: List[str] = []
+        length = 0
 
         try:
-            async for token in _ollama_stream(messages, payload.model, payload.temperature):
-                if len(accumulated) >= MAX_RESPONSE_CHARS:
-                    break
-                remaining = MAX_RESPONSE_CHARS - len(accumulated)
-                snippet = token[:remaining]
-                accumulated += snippet
+            with RouteTimer(model_router, route) as timer:
+                async for token in _ollama_stream(messages, model, payload.temperature):
+                    timer.token()
+                    remaining = MAX_RESPONSE_CHARS - length
+                    if len(token) > remaining:
+                        token = token[:remaining]
+                    parts.append(token)
+                    length += len(token)
+                    if length >= MAX_RESPONSE_CHARS:
+                        break
+        except NoHealthyEndpointError as error:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Ollama no disponible") from error
         except (httpx.HTTPError, RuntimeError) as error:
             raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Ollama no disponible") from error
         except Exception as error:  # noqa: BLE001
             raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error interno") from error
 
+        accumulated = "".join(parts)
         if not accumulated:
             raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error interno")
 
-        await _finalize_session(payload.client_id, messages, accumulated)
-        return JSONResponse(content=ChatResponse(response=accumulated).model_dump())
+        await _finalize_session(_session_key(payload), history, accumulated, _new_turn(payload), next_turn)
+        # Mismo cuerpo que ChatResponse, sin pasar por el modelo de Pydantic
+        content = {"response": accumulated}
+        if next_turn is not None:
+            content["turn"] = next_turn
+        return FastJSONResponse(content=content, headers=_protocol_headers(next_turn))
 
     except HTTPException:
         raise
@@ -260,28 +896,35 @@ async def chat_endpoint(payload: ChatRequest) -> JSONResponse:
 @app.post("/chat/stream")
 async def chat_stream(payload: ChatRequest):
     if payload.reset and not (payload.messages or (payload.prompt and payload.prompt.strip())):
-        if payload.client_id:
-            await _clear_session(payload.client_id)
+        if _session_key(payload):
+            await _clear_session(_session_key(payload))
         return StreamingResponse(iter(["Sesión reiniciada"]), media_type="text/plain")
 
+    if not get_ollama_pool("chat").admit():
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": "Ollama no disponible"})
+
     try:
-        messages = await _build_messages(payload)
+        messages, context_chunks, history = await _build_messages(payload)
+        route, model = _select_model(payload, messages, context_chunks)
+        next_turn = await _next_turn(payload)
     except HTTPException as exc:
         return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
 
     async def stream_generator():
-        accumulated = ""
+        parts: List[str] = []
+        length = 0
         try:
-            async for token in _ollama_stream(messages, payload.model, payload.temperature):
-                if len(accumulated) >= MAX_RESPONSE_CHARS:
-                    break
-                remaining = MAX_RESPONSE_CHARS - len(accumulated)
-                snippet = token[:remaining]
-                if not snippet:
-                    continue
-                accumulated_part = snippet
-                accumulated += accumulated_part
-                yield accumulated_part
+            with RouteTimer(model_router, route) as timer:
+                async for token in _ollama_stream(messages, model, payload.temperature):
+                    timer.token()
+                    remaining = MAX_RESPONSE_CHARS - length
+                    if len(token) > remaining:
+                        token = token[:remaining]
+                    parts.append(token)
+                    length += len(token)
+                    yield token
+                    if length >= MAX_RESPONSE_CHARS:
+                        break
         except (httpx.HTTPError, RuntimeError):
             yield "Ollama no disponible"
             return
@@ -289,24 +932,165 @@ async def chat_stream(payload: ChatRequest):
             yield "Error interno"
             return
         finally:
-            await _finalize_session(payload.client_id, messages, accumulated)
+            await _finalize_session(_session_key(payload), history, "".join(parts), _new_turn(payload), next_turn)
 
-    return StreamingResponse(stream_generator(), media_type="text/plain")
+    return StreamingResponse(stream_generator(), media_type="text/plain", headers=_protocol_headers(next_turn))
 
 
 @app.get("/health")
 async def health_check():
-    try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=3.0)) as client:
-            response = await client.get(f"{OLLAMA_BASE_URL}/api/tags")
-            response.raise_for_status()
-        return {"status": "ok"}
-    except httpx.HTTPError:
+    """Estado de Ollama según el último chequeo en segundo plano (no consulta en cada llamada)"""
+    pool = get_ollama_pool("chat")
+    if not pool.checked:
+        await pool.check_health()
+    health = pool.health()
+    if health["status"] == "down":
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Ollama no disponible")
+    return {"status": health["status"], "ollama": health["endpoints"]}
+
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness: el proceso está vivo y atiende peticiones"""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: el motor RAG está inicializado y listo para consultas"""
+    if rag_engine is not None:
+        return {"status": "ready", "rag": "ready"}
+    if _rag_init_task is None:
+        # RAG_EAGER_INIT = False: el motor se crea con la primera petición que lo use
+        return {"status": "ready", "rag": "not_started"}
+
+    rag_state = "error" if _rag_init_error else "initializing"
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "not_ready", "rag": rag_state, "detail": _rag_init_error}
+    )
+
+
+async def _start_document_watcher() -> None:
+    from rag_engine.watcher import DocumentWatcher
+
+    try:
+        await get_rag_engine()
+    except HTTPException:
+        print("⚠️  Observador de documentos no iniciado: motor RAG no disponible")
+        return
+    # Un observador por namespace existente al arrancar
+    for namespace in rag_namespaces.names():
+        engine = await rag_namespaces.get(namespace)
+        watcher = DocumentWatcher(engine, debounce_seconds=RAG_WATCH_DEBOUNCE_SECONDS)
+        await watcher.start()
+        _document_watchers.append(watcher)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métricas internas de rendimiento (JSON)"""
+    metrics = {
+        "rag_ready": rag_engine is not None,
+        "chat_retrieval": _retrieval_stats.as_dict(),
+        "history_compaction": {
+            **_compaction_stats,
+            "enabled": HISTORY_COMPACTION_ENABLED,
+            "in_flight": len(_compaction_tasks)
+        }
+    }
+    metrics["ollama"] = {kind: pool.metrics() for kind, pool in _ollama_pools.items()}
+    if _model_residency is not None:
+        metrics["model_residency"] = _model_residency.state()
+    if model_router is not None:
+        metrics["model_routing"] = model_router.metrics()
+    if batch_jobs is not None:
+        metrics["batch"] = batch_jobs.metrics()
+    if rag_engine is not None:
+        metrics["vector_store"] = rag_engine.store.metrics()
+        if retrieval_gate is not None:
+            metrics["retrieval_gate"] = retrieval_gate.metrics()
+        metrics["namespaces"] = {
+            name: engine.store.metrics()
+            for name, engine in rag_namespaces.loaded().items()
+            if name != DEFAULT_NAMESPACE
+        }
+        if rag_engine.sharded:
+            metrics["shards"] = await rag_engine.store.health()
+    return metrics
+
+
+@app.on_event("startup")
+async def start_background_init() -> None:
+    # Crea el gestor de subidas por defecto (limpia temporales abandonados)
+    get_upload_manager(DEFAULT_NAMESPACE)
+    global _model_residency, model_router, batch_jobs
+
+    for kind in ("chat", "embeddings"):
+        get_ollama_pool(kind).start()
+    chat_models = [OLLAMA_CHAT_MODEL, HISTORY_SUMMARY_MODEL]
+    if CHAT_ROUTING_ENABLED:
+        model_router = ModelRouter(
+            CHAT_FAST_MODEL,
+            CHAT_QUALITY_MODEL,
+            max_fast_chars=CHAT_ROUTING_MAX_FAST_CHARS,
+            max_fast_turns=CHAT_ROUTING_MAX_FAST_TURNS,
+            min_fast_relevance=CHAT_ROUTING_MIN_FAST_RELEVANCE
+        )
+        chat_models += [CHAT_FAST_MODEL, CHAT_QUALITY_MODEL]
+    # Precarga y calentamiento en segundo plano: no demora el arranque
+    _model_residency = ModelResidencyManager(
+        get_ollama_pool("chat"),
+        get_ollama_pool("embeddings"),
+        chat_models=chat_models,
+        embedding_models=[OLLAMA_EMBEDDING_MODEL] if EMBEDDING_BACKEND == "ollama" else [],
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        policy=OLLAMA_RESIDENCY_POLICY,
+        interval=OLLAMA_RESIDENCY_INTERVAL_SECONDS,
+        system_prompt=SYSTEM_PROMPT
+    )
+    _model_residency.start()
+    batch_jobs = BatchJobManager(
+        BATCH_JOBS_DIR,
+        generate=_batch_generate,
+        retrieve=_batch_retrieve,
+        build_prompt=_batch_build_prompt,
+        busy=_batch_busy,
+        concurrency=BATCH_CONCURRENCY,
+        window=BATCH_WINDOW
+    )
+    if BATCH_RESUME_ON_STARTUP:
+        resumed = batch_jobs.resume_interrupted()
+        if resumed:
+            print(f"✓ {len(resumed)} trabajo(s) por lotes reanudados")
+    if RAG_EAGER_INIT:
+        _start_rag_init()
+    if RAG_WATCH_ENABLED:
+        asyncio.create_task(_start_document_watcher())
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks() -> None:
+    if batch_jobs is not None:
+        await batch_jobs.stop()
+    for watcher in _document_watchers:
+        await watcher.stop()
+    if rag_namespaces is not None:
+        for engine in rag_namespaces.loaded().values():
+            engine.close()
+    if rag_engine is not None:
+        rag_engine.embedding_generator.close()
+    if _model_residency is not None:
+        await _model_residency.stop()
+    for pool in _ollama_pools.values():
+        await pool.close()
 
 
 @app.middleware("http")
 async def timeout_middleware(request: Request, call_next):
+    # Las subidas grandes pueden durar más que el timeout general
+    if request.url.path.startswith("/rag/upload"):
+        return await call_next(request)
     try:
         return await asyncio.wait_for(call_next(request), timeout=65.0)
     except asyncio.TimeoutError as error:
@@ -316,13 +1100,16 @@ async def timeout_middleware(request: Request, call_next):
 # ==================== ENDPOINTS RAG ====================
 
 @app.post("/rag/index")
-async def rag_index_documents(force: bool = False):
+async def rag_index_documents(force: bool = False, namespace: str = DEFAULT_NAMESPACE):
     """
-    Indexa todos los PDFs en el directorio rag/
+    Indexa todos los PDFs en el directorio rag/ (o rag/<namespace>/)
     
     Query params:
-        force: Si True, fuerza la re-indexación completa
+        force: Si True, reconstruye el índice en una generación nueva y la
+            activa al terminar (para no esperar la respuesta usar /rag/rebuild)
+        namespace: Namespace a indexar (se crea si no existe)
     """
+    rag_engine = await get_rag_engine(namespace, create=True)
     try:
         stats = await rag_engine.index_documents(force=force)
         return JSONResponse(content=stats)
@@ -333,13 +1120,113 @@ async def rag_index_documents(force: bool = False):
         )
 
 
+async def _run_rebuild(rag_engine: "RAGEngine", namespace: str, force_extraction: bool) -> None:
+    started = time.time()
+    _last_rebuilds[namespace] = {"status": "running", "started_at": started}
+    try:
+        result = await rag_engine.rebuild_index(force_extraction=force_extraction)
+        _last_rebuilds[namespace] = {**result, "started_at": started, "finished_at": time.time()}
+    except Exception as e:  # noqa: BLE001
+        print(f"❌ Reconstrucción del índice fallida ({namespace}): {e}")
+        _last_rebuilds[namespace] = {
+            "status": "error", "error": str(e), "started_at": started, "finished_at": time.time()
+        }
+
+
+def _rebuild_running(namespace: str) -> bool:
+    task = _rebuild_tasks.get(namespace)
+    return task is not None and not task.done()
+
+
+@app.post("/rag/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def rag_rebuild_index(force_extraction: bool = False, namespace: str = DEFAULT_NAMESPACE):
+    """
+    Reconstruye el índice de un namespace en segundo plano sin interrumpir las búsquedas
+    
+    La generación nueva se activa al terminar si pasa la validación; el
+    progreso se consulta en GET /rag/generations.
+    """
+    rag_engine = await get_rag_engine(namespace)
+    namespace = validate_namespace(namespace)
+    if _rebuild_running(namespace):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Ya hay una reconstrucción en curso")
+    _rebuild_tasks[namespace] = asyncio.create_task(_run_rebuild(rag_engine, namespace, force_extraction))
+    return {"status": "accepted", "namespace": namespace, "message": "Reconstrucción iniciada"}
+
+
+@app.get("/rag/generations")
+async def rag_get_generations(namespace: str = DEFAULT_NAMESPACE):
+    """Generación activa, anterior (rollback) y estado de la última reconstrucción"""
+    rag_engine = await get_rag_engine(namespace)
+    generations = await rag_engine.store.get_generations()
+    generations["last_rebuild"] = _last_rebuilds.get(validate_namespace(namespace))
+    return JSONResponse(content=generations)
+
+
+@app.post("/rag/rollback")
+async def rag_rollback_index(namespace: str = DEFAULT_NAMESPACE):
+    """Vuelve a activar la generación anterior del índice de un namespace"""
+    rag_engine = await get_rag_engine(namespace)
+    if _rebuild_running(validate_namespace(namespace)):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Hay una reconstrucción en curso")
+    try:
+        generation = await rag_engine.rollback_index()
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return JSONResponse(content={"status": "success", "active": generation})
+
+
+async def _get_sharded_engine(namespace: str) -> "RAGEngine":
+    rag_engine = await get_rag_engine(namespace)
+    if not rag_engine.sharded:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El índice no está particionado (RAG_NUM_SHARDS)")
+    return rag_engine
+
+
+@app.get("/rag/shards")
+async def rag_get_shards(namespace: str = DEFAULT_NAMESPACE):
+    """Estado de cada shard (proceso, chunks, latencia); reinicia los caídos"""
+    rag_engine = await _get_sharded_engine(namespace)
+    return JSONResponse(content={"shards": await rag_engine.store.health()})
+
+
+@app.post("/rag/shards/rebalance")
+async def rag_rebalance_shards(namespace: str = DEFAULT_NAMESPACE, tolerance: float = RAG_REBALANCE_TOLERANCE):
+    """Mueve archivos entre shards hasta que la carga quede dentro de la tolerancia"""
+    rag_engine = await _get_sharded_engine(namespace)
+    if _rebuild_running(validate_namespace(namespace)):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Hay una reconstrucción en curso")
+    try:
+        result = await rag_engine.store.rebalance(tolerance)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error rebalanceando shards: {str(e)}"
+        )
+    return JSONResponse(content={"status": "success", **result})
+
+
+@app.get("/rag/namespaces")
+async def rag_list_namespaces():
+    """Namespaces disponibles con su cantidad de chunks y archivos"""
+    await get_rag_engine()
+    try:
+        return JSONResponse(content={"namespaces": await rag_namespaces.get_stats()})
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error obteniendo namespaces: {str(e)}"
+        )
+
+
 @app.get("/rag/stats")
-async def rag_get_stats():
-    """Retorna estadísticas del sistema RAG"""
+async def rag_get_stats(namespace: str = DEFAULT_NAMESPACE):
+    """Retorna estadísticas del sistema RAG (de un namespace)"""
+    rag_engine = await get_rag_engine(namespace)
     try:
-        stats = rag_engine.get_stats()
-        stats["is_indexed"] = rag_engine.is_indexed()
-        stats["indexed_files"] = rag_engine.get_indexed_files()
+        stats = await rag_engine.get_stats()
+        stats["is_indexed"] = await rag_engine.is_indexed()
+        stats["indexed_files"] = await rag_engine.get_indexed_files()
         return JSONResponse(content=stats)
     except Exception as e:
         raise HTTPException(
@@ -348,33 +1235,73 @@ async def rag_get_stats():
         )
 
 
+async def _iter_upload_file(upload: UploadFile) -> AsyncGenerator[bytes, None]:
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _upload_http_error(error: UploadError) -> HTTPException:
+    if isinstance(error, UploadTooLargeError):
+        code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    elif isinstance(error, UploadOffsetError):
+        code = status.HTTP_409_CONFLICT
+    else:
+        code = status.HTTP_400_BAD_REQUEST
+    return HTTPException(status_code=code, detail=str(error))
+
+
+async def _after_upload(result: Dict, index: bool, namespace: str = DEFAULT_NAMESPACE) -> Dict:
+    """Indexa el archivo recién guardado si se pidió y agrega un mensaje"""
+    result["namespace"] = validate_namespace(namespace)
+    if result["status"] == "duplicate":
+        result["message"] = f"Contenido idéntico a {result['duplicate_of']}; no se guardó una copia"
+    elif result["status"] == "unchanged":
+        result["message"] = "El archivo ya estaba subido con el mismo contenido"
+    elif index:
+        rag_engine = await get_rag_engine(namespace, create=True)
+        result["index"] = await rag_engine.index_file(result["filename"])
+        result["message"] = "PDF subido e indexado correctamente."
+    else:
+        result["message"] = "PDF subido correctamente. Ejecuta /rag/index para indexarlo."
+    return result
+
+
 @app.post("/rag/upload")
-async def rag_upload_pdf(file: UploadFile = File(...)):
+async def rag_upload_pdf(
+    file: Optional[UploadFile] = File(None),
+    files: Optional[List[UploadFile]] = File(None),
+    index: bool = False,
+    namespace: str = DEFAULT_NAMESPACE
+):
     """
-    Sube un PDF al directorio rag/
+    Sube uno o varios PDFs al directorio rag/ (o rag/<namespace>/)
     
-    Luego debes llamar a /rag/index para indexarlo
+    El contenido se guarda por bloques (sin bloquear el event loop), se
+    descarta si ya existe un PDF idéntico y se mueve atómicamente al destino.
+    
+    Query params:
+        index: Si True, indexa cada archivo nuevo al terminar de subirlo
+        namespace: Namespace destino (se crea si no existe)
     """
+    upload_manager = get_upload_manager(namespace)
+    uploads = ([file] if file else []) + list(files or [])
+    if not uploads:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No se recibió ningún archivo")
+
+    results = []
     try:
-        # Verificar que sea PDF
-        if not file.filename.endswith(".pdf"):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Solo se permiten archivos PDF"
-            )
-        
-        # Guardar archivo
-        pdf_path = Path("rag") / file.filename
-        pdf_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(pdf_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        return JSONResponse(content={
-            "status": "success",
-            "filename": file.filename,
-            "message": "PDF subido correctamente. Ejecuta /rag/index para indexarlo."
-        })
+        for upload in uploads:
+            try:
+                result = await upload_manager.save_stream(upload.filename, _iter_upload_file(upload))
+            except UploadError as error:
+                if len(uploads) == 1:
+                    raise _upload_http_error(error) from error
+                results.append({"status": "error", "filename": upload.filename, "detail": str(error)})
+                continue
+            results.append(await _after_upload(result, index, namespace))
     except HTTPException:
         raise
     except Exception as e:
@@ -383,23 +1310,102 @@ async def rag_upload_pdf(file: UploadFile = File(...)):
             detail=f"Error subiendo PDF: {str(e)}"
         )
 
+    first = results[0]
+    return JSONResponse(content={
+        "status": "success" if first["status"] != "error" else "error",
+        "filename": first["filename"],
+        "message": first.get("message") or first.get("detail"),
+        "uploads": results
+    })
+
+
+@app.put("/rag/upload/raw/{filename}")
+async def rag_upload_pdf_raw(
+    filename: str,
+    request: Request,
+    index: bool = False,
+    namespace: str = DEFAULT_NAMESPACE
+):
+    """
+    Sube un PDF enviando el contenido crudo en el cuerpo (sin multipart)
+    
+    Es la vía más eficiente para archivos grandes: los bloques se escriben
+    a disco a medida que llegan, sin pasar por el parser multipart.
+    """
+    upload_manager = get_upload_manager(namespace)
+    try:
+        result = await upload_manager.save_stream(filename, request.stream())
+    except UploadError as error:
+        raise _upload_http_error(error) from error
+    return JSONResponse(content=await _after_upload(result, index, namespace))
+
+
+@app.post("/rag/upload/resumable")
+async def rag_upload_resumable_create(filename: str, namespace: str = DEFAULT_NAMESPACE):
+    """Inicia una subida reanudable; retorna upload_id y offset 0"""
+    upload_manager = get_upload_manager(namespace)
+    try:
+        return JSONResponse(content=upload_manager.create_session(filename))
+    except UploadError as error:
+        raise _upload_http_error(error) from error
+
+
+@app.get("/rag/upload/resumable/{upload_id}")
+async def rag_upload_resumable_status(upload_id: str, namespace: str = DEFAULT_NAMESPACE):
+    """Bytes ya recibidos de una subida reanudable (para continuar tras un corte)"""
+    upload_manager = get_upload_manager(namespace)
+    try:
+        return JSONResponse(content=upload_manager.get_session(upload_id))
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subida no encontrada")
+    except UploadError as error:
+        raise _upload_http_error(error) from error
+
+
+@app.patch("/rag/upload/resumable/{upload_id}")
+async def rag_upload_resumable_append(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    namespace: str = DEFAULT_NAMESPACE
+):
+    """Agrega el cuerpo de la petición a la subida a partir de `offset`"""
+    upload_manager = get_upload_manager(namespace)
+    try:
+        return JSONResponse(content=await upload_manager.append(upload_id, offset, request.stream()))
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subida no encontrada")
+    except UploadError as error:
+        raise _upload_http_error(error) from error
+
+
+@app.post("/rag/upload/resumable/{upload_id}/complete")
+async def rag_upload_resumable_complete(upload_id: str, index: bool = False, namespace: str = DEFAULT_NAMESPACE):
+    """Cierra la subida reanudable: deduplica, mueve el archivo y opcionalmente lo indexa"""
+    upload_manager = get_upload_manager(namespace)
+    try:
+        result = await upload_manager.complete(upload_id)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subida no encontrada")
+    except UploadError as error:
+        raise _upload_http_error(error) from error
+    return JSONResponse(content=await _after_upload(result, index, namespace))
+
 
 @app.delete("/rag/document/{filename}")
-async def rag_delete_document(filename: str):
-    """Elimina un documento del índice y del directorio"""
+async def rag_delete_document(filename: str, namespace: str = DEFAULT_NAMESPACE):
+    """Elimina un documento del índice y del directorio de su namespace"""
+    rag_engine = await get_rag_engine(namespace)
+    filename = Path(filename).name
     try:
-        # Eliminar del índice
-        rag_engine.remove_document(filename)
+        # Eliminar del índice junto con su caché de texto
+        await rag_engine.forget_document(filename)
         
         # Eliminar archivo físico
-        pdf_path = Path("rag") / filename
+        pdf_path = rag_engine.pdf_dir / filename
         if pdf_path.exists():
             pdf_path.unlink()
-        
-        # Eliminar caché
-        cache_path = Path("backend/rag_engine/cache") / f"{Path(filename).stem}.txt"
-        if cache_path.exists():
-            cache_path.unlink()
+        await get_upload_manager(namespace).forget(filename)
         
         return JSONResponse(content={
             "status": "success",
@@ -413,10 +1419,11 @@ async def rag_delete_document(filename: str):
 
 
 @app.delete("/rag/clear")
-async def rag_clear_index():
-    """Limpia completamente el índice RAG (no elimina PDFs)"""
+async def rag_clear_index(namespace: str = DEFAULT_NAMESPACE):
+    """Limpia el índice RAG de un namespace (no elimina PDFs); el anterior queda disponible para rollback"""
+    rag_engine = await get_rag_engine(namespace)
     try:
-        rag_engine.clear_index()
+        await rag_engine.clear_index()
         return JSONResponse(content={
             "status": "success",
             "message": "Índice RAG limpiado"
@@ -429,22 +1436,31 @@ async def rag_clear_index():
 
 
 @app.post("/rag/search")
-async def rag_search_context(query: str, n_results: int = 5):
+async def rag_search_context(
+    query: str,
+    n_results: int = 5,
+    namespace: Optional[List[str]] = Query(None),
+    filename: Optional[str] = None
+):
     """
     Busca contexto relevante en los documentos indexados
     
     Query params:
         query: Texto de búsqueda
         n_results: Cantidad de resultados (default: 5)
+        namespace: Namespace(s) donde buscar (repetible; default: el por defecto)
+        filename: Restringir la búsqueda a un archivo
     """
+    namespaces = namespace or [DEFAULT_NAMESPACE]
+    engines = [await get_rag_engine(name) for name in namespaces]
     try:
-        if not rag_engine.is_indexed():
+        if not any([await engine.is_indexed() for engine in engines]):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="No hay documentos indexados"
             )
         
-        context_chunks = await rag_engine.search_context(query, n_results=n_results)
+        context_chunks = await rag_namespaces.search(query, namespaces, n_results=n_results, filename_filter=filename)
         
         return JSONResponse(content={
             "query": query,
@@ -457,3 +1473,178 @@ async def rag_search_context(query: str, n_results: int = 5):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error en búsqueda: {str(e)}"
         )
+
+
+@app.post("/rag/search/batch")
+async def rag_search_context_batch(payload: BatchSearchRequest, namespace: str = DEFAULT_NAMESPACE):
+    """
+    Busca contexto para muchas consultas en una sola petición
+
+    Los resultados se envían como NDJSON (una línea por consulta, en orden)
+    a medida que se resuelve cada bloque de consultas.
+    """
+    rag_engine = await get_rag_engine(namespace)
+    if not await rag_engine.is_indexed():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No hay documentos indexados"
+        )
+
+    queries = [query.model_dump() for query in payload.queries]
+
+    async def result_lines():
+        for start in range(0, len(queries), RAG_BATCH_SEARCH_CHUNK):
+            block = queries[start:start + RAG_BATCH_SEARCH_CHUNK]
+            try:
+                block_results = await rag_engine.search_context_batch(
+                    block,
+                    default_n_results=payload.n_results
+                )
+            except Exception as e:  # noqa: BLE001
+                for offset, query in enumerate(block):
+                    yield json.dumps({
+                        "index": start + offset,
+                        "query": query["query"],
+                        "error": f"Error en búsqueda: {str(e)}"
+                    }, ensure_ascii=False) + "\n"
+                continue
+
+            for offset, (query, results) in enumerate(zip(block, block_results)):
+                yield json.dumps({
+                    "index": start + offset,
+                    "query": query["query"],
+                    "results": results
+                }, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+
+# ==================== ENDPOINTS BATCH ====================
+
+def _batch_busy() -> bool:
+    """Los lotes ceden Ollama mientras haya chat interactivo en curso o el pool esté caído"""
+    pool = get_ollama_pool("chat")
+    if pool.circuit_open:
+        return True
+    interactive = sum(endpoint.outstanding for endpoint in pool.endpoints) - batch_jobs.in_flight
+    return interactive >= BATCH_MAX_INTERACTIVE_IN_FLIGHT
+
+
+async def _batch_generate(system: str, prompt: str, options: Dict) -> str:
+    messages = [_message("system", system), _message("user", prompt)]
+    parts = [
+        part async for part in _ollama_stream(
+            messages,
+            options["model"],
+            options["temperature"],
+            num_predict=options["num_predict"]
+        )
+    ]
+    return "".join(parts)
+
+
+async def _batch_retrieve(query: str, item: Dict) -> List[Dict]:
+    if rag_engine is None:
+        await get_rag_engine()
+    return await rag_namespaces.search(
+        query,
+        item["rag_namespaces"] or [DEFAULT_NAMESPACE],
+        n_results=item["rag_n_results"],
+        filename_filter=item["rag_filename"],
+        gate=retrieval_gate
+    )
+
+
+def _batch_build_prompt(query: str, chunks: List[Dict], system: str) -> str:
+    return rag_engine.build_rag_prompt(query, chunks, system)
+
+
+def _batch_http_error(error: BatchJobError) -> HTTPException:
+    if isinstance(error, BatchJobNotFoundError):
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(error))
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(error))
+
+
+@app.post("/batch/chat", status_code=status.HTTP_202_ACCEPTED)
+async def batch_chat_create(payload: BatchChatRequest):
+    """
+    Crea un trabajo de chat por lotes (guías de estudio, respuestas de cuestionarios)
+
+    Los prompts se responden en segundo plano con prioridad baja: solo cuando
+    el chat interactivo deja Ollama libre. El progreso se consulta en
+    GET /batch/chat/{job_id} y los resultados (JSON Lines, uno por prompt
+    con su `index`) en GET /batch/chat/{job_id}/results a medida que se generan.
+    """
+    items = []
+    for prompt in payload.prompts:
+        namespaces = prompt.rag_namespaces or payload.rag_namespaces
+        try:
+            namespaces = [validate_namespace(name) for name in namespaces] if namespaces else None
+        except NamespaceError as error:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+        items.append({
+            "prompt": prompt.prompt.strip(),
+            "id": prompt.id,
+            "use_rag": payload.use_rag if prompt.use_rag is None else prompt.use_rag,
+            "rag_n_results": prompt.rag_n_results or payload.rag_n_results,
+            "rag_namespaces": namespaces,
+            "rag_filename": prompt.rag_filename
+        })
+    if any(item["use_rag"] for item in items) and rag_engine is None:
+        _start_rag_init()
+    options = {
+        # El system prompt es el mismo para todo el trabajo: prefijo común para la caché de Ollama
+        "system_prompt": payload.system_prompt or SYSTEM_PROMPT,
+        "model": OLLAMA_CHAT_MODEL if payload.model == AUTO_MODEL else payload.model,
+        "temperature": payload.temperature,
+        "num_predict": payload.max_tokens
+    }
+    try:
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=await batch_jobs.create(items, options))
+    except BatchJobError as error:
+        raise _batch_http_error(error) from error
+
+
+@app.get("/batch/chat")
+async def batch_chat_list():
+    """Trabajos por lotes, del más reciente al más antiguo"""
+    return JSONResponse(content={"jobs": batch_jobs.list_jobs(), "scheduler": batch_jobs.metrics()})
+
+
+@app.get("/batch/chat/{job_id}")
+async def batch_chat_progress(job_id: str):
+    """Estado, porcentaje, ritmo (prompts por minuto) y tiempo restante estimado"""
+    try:
+        return JSONResponse(content=batch_jobs.progress(job_id))
+    except BatchJobError as error:
+        raise _batch_http_error(error) from error
+
+
+@app.get("/batch/chat/{job_id}/results")
+async def batch_chat_results(job_id: str):
+    """Resultados generados hasta ahora (JSON Lines; si un index se repite vale la última línea)"""
+    try:
+        path = batch_jobs.results_path(job_id)
+    except BatchJobError as error:
+        raise _batch_http_error(error) from error
+    if not path.exists():
+        return Response(content=b"", media_type="application/x-ndjson")
+    return FileResponse(path, media_type="application/x-ndjson", filename=f"{job_id}.jsonl")
+
+
+@app.post("/batch/chat/{job_id}/resume")
+async def batch_chat_resume(job_id: str):
+    """Reanuda un trabajo cancelado o fallido (reintenta también los prompts con error)"""
+    try:
+        return JSONResponse(content=batch_jobs.resume(job_id))
+    except BatchJobError as error:
+        raise _batch_http_error(error) from error
+
+
+@app.post("/batch/chat/{job_id}/cancel")
+async def batch_chat_cancel(job_id: str):
+    """Detiene un trabajo; los resultados ya escritos se conservan"""
+    try:
+        return JSONResponse(content=await batch_jobs.cancel(job_id))
+    except BatchJobError as error:
+        raise _batch_http_error(error) from error
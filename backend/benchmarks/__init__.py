@@ -0,0 +1,6 @@
+"""
+Benchmarks de rendimiento de Willay
+
+Ejecutar desde el directorio backend/, por ejemplo:
+    python -m benchmarks.load_test --students 20 --turns 5
+"""
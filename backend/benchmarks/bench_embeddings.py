@@ -0,0 +1,120 @@
+"""
+Benchmark de embeddings de consultas: Ollama frente a un modelo local con y sin micro-batching
+
+Lanza --queries consultas con --concurrency en vuelo a la vez y mide latencia
+(p50/p95/p99 en ms) y consultas por segundo para cada configuración:
+
+- ollama: /api/embeddings (solo con --ollama-url)
+- local: modelo en proceso sin agrupar (max_batch=1)
+- local_batched: modelo en proceso con micro-batching (--max-wait-ms)
+
+Por defecto usa el modelo de juguete "hashing" (sin red ni descargas); con
+--model sentence-transformers --model-path DIR mide un modelo real.
+
+La salida es JSON Lines (una línea por configuración).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --model sentence-transformers --model-path rag_engine/models/nomic-embed-text-v1.5
+    python -m benchmarks.bench_embeddings --ollama-url http://127.0.0.1:11434 --output results.jsonl
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.common import summarize  # noqa: E402
+from benchmarks.fake_ollama import WORDS  # noqa: E402
+from rag_engine.chunker import EmbeddingGenerator  # noqa: E402
+from rag_engine.embedding_backends import LocalEmbedder  # noqa: E402
+
+
+def build_queries(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 16))) for _ in range(count)]
+
+
+async def run_case(name: str, generator: EmbeddingGenerator, queries: List[str], concurrency: int) -> Dict:
+    await generator.detect_dimension()  # carga del modelo fuera de la medición
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def query(text: str) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await generator.generate_embedding(text)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(query(text) for text in queries))
+    elapsed = time.perf_counter() - started
+    row = {
+        "case": name,
+        "queries": len(queries),
+        "concurrency": concurrency,
+        "qps": round(len(queries) / elapsed, 1),
+        "latency_ms": summarize(latencies)
+    }
+    if generator.local is not None:
+        metrics = generator.local.metrics()
+        row["avg_batch"] = metrics["avg_query_batch"]
+    return row
+
+
+async def run(args: argparse.Namespace) -> List[Dict]:
+    queries = build_queries(args.queries, args.seed)
+    options = {"model_path": args.model_path} if args.model_path else {}
+    rows = []
+    if args.ollama_url:
+        generator = EmbeddingGenerator(args.ollama_model, base_url=args.ollama_url)
+        rows.append(await run_case("ollama", generator, queries, args.concurrency))
+    for name, max_batch in (("local", 1), ("local_batched", args.max_batch)):
+        local = LocalEmbedder(
+            args.model, options, execution=args.execution, max_batch=max_batch, max_wait_ms=args.max_wait_ms
+        )
+        generator = EmbeddingGenerator(args.ollama_model, local=local)
+        try:
+            rows.append(await run_case(name, generator, queries, args.concurrency))
+        finally:
+            generator.close()
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de embeddings de consultas")
+    parser.add_argument("--model", default="hashing", help="Modelo local (hashing, sentence-transformers)")
+    parser.add_argument("--model-path", default=None, help="Directorio del modelo de sentence-transformers")
+    parser.add_argument("--execution", default="thread", choices=["thread", "process"])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32, help="Consultas en vuelo a la vez")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--ollama-url", default=None, help="Incluir Ollama en la comparación")
+    parser.add_argument("--ollama-model", default="nomic-embed-text")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="Archivo JSON Lines (por defecto stdout)")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        rows = asyncio.run(run(args))
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for row in rows:
+            output.write(json.dumps(row, ensure_ascii=False) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Benchmark de extracción de texto de PDFs: velocidad y rendimiento por backend
+
+Extrae cada PDF con cada backend (sin caché) usando PDFExtractor y reporta,
+por backend y archivo, el tiempo total, páginas con texto, caracteres
+extraídos y percentiles del tiempo por página. La última línea de cada
+backend resume todos los archivos.
+
+Sin PDFs en --pdf-dir (o con --synthetic) se genera un documento sintético
+de --pages páginas.
+
+La salida es JSON Lines (una línea por backend y archivo).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_extraction --pdf-dir rag
+    python -m benchmarks.bench_extraction --synthetic --pages 200 --backends pypdf2,pymupdf
+    python -m benchmarks.bench_extraction --page-timeout 10 --output results.jsonl
+"""
+import argparse
+import contextlib
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.common import summarize  # noqa: E402
+from rag_engine.pdf_backends import BACKENDS, available_backends  # noqa: E402
+from rag_engine.pdf_extractor import PDFExtractor  # noqa: E402
+
+WORDS = (
+    "celula membrana nucleo proteina energia mitocondria sintesis funcion "
+    "tejido organo sistema evolucion especie genetica herencia ambiente"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_synthetic_pdf(path: Path, pages: int, lines_per_page: int = 40, seed: int = 7) -> None:
+    """PDF mínimo con texto (Helvetica) en cada página, sin dependencias"""
+    rng = random.Random(seed)
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # Pages, se completa al final
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)]
+        content = "BT /F1 10 Tf 50 800 Td 12 TL " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        stream = content.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(output))
+
+
+def bench_backend(backend: str, pdfs: List[Path], page_timeout: Optional[float]) -> List[Dict]:
+    rows = []
+    page_seconds_all: List[float] = []
+    totals = {"seconds": 0.0, "pages": 0, "extracted": 0, "chars": 0, "timeouts": 0, "errors": 0}
+    with tempfile.TemporaryDirectory(prefix="bench-extraction-") as cache_dir:
+        with contextlib.redirect_stdout(sys.stderr):
+            extractor = PDFExtractor(str(pdfs[0].parent), cache_dir, backends=[backend], page_timeout=page_timeout)
+        try:
+            for pdf_path in pdfs:
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(sys.stderr):
+                    pages_text = extractor.extract_text_from_pdf(pdf_path)
+                seconds = time.perf_counter() - started
+                report = extractor.reports[pdf_path.name]
+                page_seconds = [timing[3] for timing in report["timings"]]
+                page_seconds_all.extend(page_seconds)
+                row = {
+                    "backend": backend,
+                    "file": pdf_path.name,
+                    "seconds": round(seconds, 3),
+                    "pages": report["pages"],
+                    "extracted": len(pages_text),
+                    "chars": sum(len(text) for text in pages_text.values()),
+                    "timeouts": len(report["timeouts"]),
+                    "errors": len(report["errors"]),
+                    "page_ms": summarize(page_seconds)
+                }
+                for key in totals:
+                    totals[key] += row[key]
+                rows.append(row)
+        finally:
+            extractor.close()
+    totals["seconds"] = round(totals["seconds"], 3)
+    rows.append({
+        "backend": backend,
+        "file": "*",
+        **totals,
+        "pages_per_second": round(totals["pages"] / totals["seconds"], 1) if totals["seconds"] else None,
+        "page_ms": summarize(page_seconds_all)
+    })
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de extracción de texto de PDFs")
+    parser.add_argument("--pdf-dir", default="rag", help="Directorio con los PDFs de muestra")
+    parser.add_argument("--backends", default=None, help=f"Lista separada por comas ({', '.join(BACKENDS)}); por defecto los instalados")
+    parser.add_argument("--synthetic", action="store_true", help="Usar un PDF sintético en lugar de --pdf-dir")
+    parser.add_argument("--pages", type=int, default=100, help="Páginas del PDF sintético")
+    parser.add_argument("--page-timeout", type=float, default=None, help="Segundos por página (por defecto sin límite, en proceso)")
+    parser.add_argument("--output", default=None, help="Archivo JSON Lines (por defecto stdout)")
+    args = parser.parse_args()
+
+    backends = args.backends.split(",") if args.backends else available_backends()
+    missing = [name for name in backends if name not in available_backends()]
+    if missing:
+        parser.error(f"Backends no instalados o desconocidos: {', '.join(missing)}")
+
+    with tempfile.TemporaryDirectory(prefix="bench-pdfs-") as synthetic_dir:
+        pdfs = [] if args.synthetic else sorted(Path(args.pdf_dir).glob("*.pdf"))
+        if not pdfs:
+            synthetic = Path(synthetic_dir) / f"synthetic_{args.pages}.pdf"
+            write_synthetic_pdf(synthetic, args.pages)
+            pdfs = [synthetic]
+
+        output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+        try:
+            for backend in backends:
+                for row in bench_backend(backend, pdfs, args.page_timeout):
+                    output.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    output.flush()
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Micro-benchmark del camino crítico del chat: costo de CPU por token y por petición
+
+Compara, con los mismos datos, la implementación anterior (json.loads por
+línea decodificada, dicts anidados, acumulación con +=, ChatMessage
+reconstruido y model_dump) contra la actual de app.py:
+
+- stream: _ollama_stream completo sobre un transporte httpx en memoria que
+  entrega una línea NDJSON por chunk, como Ollama (µs de CPU por token)
+- parse: solo el parseo de las líneas NDJSON (µs por token)
+- accumulate: acumulación de la respuesta con el límite MAX_RESPONSE_CHARS
+- messages: saneado del historial y armado de los mensajes del payload (µs por petición)
+- response: serialización del cuerpo de /chat (µs por petición)
+
+La salida es JSON Lines (una línea por caso) con legacy_us, current_us y
+speedup, más una primera línea con el codec JSON en uso.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_hot_path
+    python -m benchmarks.bench_hot_path --tokens 400 --requests 200 --output results.jsonl
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+import app as chat_app  # noqa: E402
+from benchmarks.fake_ollama import WORDS  # noqa: E402
+from rag_engine import jsoncodec  # noqa: E402
+
+
+def build_token_lines(tokens: int, seed: int) -> List[bytes]:
+    """Líneas NDJSON con el formato de /api/chat en streaming"""
+    rng = random.Random(seed)
+    lines = [
+        json.dumps({
+            "model": "llama3.2",
+            "created_at": "2024-06-04T14:38:31.837530123Z",
+            "message": {"role": "assistant", "content": rng.choice(WORDS) + " "},
+            "done": False
+        }, ensure_ascii=False).encode("utf-8") + b"\n"
+        for _ in range(tokens)
+    ]
+    lines.append(json.dumps({
+        "model": "llama3.2",
+        "message": {"role": "assistant", "content": ""},
+        "done": True,
+        "eval_count": tokens
+    }).encode("utf-8") + b"\n")
+    return lines
+
+
+def build_history(size: int) -> List["chat_app.ChatMessage"]:
+    history = [chat_app.ChatMessage(role="system", content=chat_app.SYSTEM_PROMPT)]
+    for index in range(size):
+        role = "user" if index % 2 == 0 else "assistant"
+        history.append(chat_app.ChatMessage(role=role, content=" ".join(WORDS[: 8 + index % 10])))
+    return history
+
+
+def cpu_us(func: Callable[[], object], repeat: int) -> float:
+    """µs de CPU por repetición"""
+    started = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - started) / repeat * 1e6
+
+
+# ==================== Implementación anterior ====================
+
+def legacy_parse(lines: List[str]) -> List[str]:
+    contents = []
+    for line in lines:
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if data.get("error"):
+            raise RuntimeError(data["error"])
+        content = data.get("message", {}).get("content", "")
+        if content:
+            contents.append(content)
+        if data.get("done"):
+            break
+    return contents
+
+
+async def legacy_stream(client: httpx.AsyncClient, payload: Dict) -> AsyncIterator[str]:
+    async with client.stream("POST", "http://ollama/api/chat", json=payload) as response:
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if data.get("error"):
+                raise RuntimeError(data["error"])
+            content = data.get("message", {}).get("content", "")
+            if content:
+                yield content
+            if data.get("done"):
+                break
+
+
+def legacy_accumulate(tokens: List[str], limit: int) -> str:
+    accumulated = ""
+    for token in tokens:
+        if len(accumulated) >= limit:
+            break
+        remaining = limit - len(accumulated)
+        snippet = token[:remaining]
+        accumulated += snippet
+    return accumulated
+
+
+def legacy_messages(history: List["chat_app.ChatMessage"]) -> List[Dict]:
+    sanitized = []
+    for message in history:
+        content = (message.content or "").strip()
+        if not content:
+            continue
+        sanitized.append(chat_app.ChatMessage(role=message.role, content=content))
+    return [message.model_dump() for message in sanitized]
+
+
+def legacy_response(text: str) -> bytes:
+    return chat_app.JSONResponse(
+        content=chat_app.ChatResponse(response=text, turn=3).model_dump(exclude_none=True)
+    ).body
+
+
+# ==================== Implementación actual ====================
+
+def current_parse(lines: List[bytes]) -> List[str]:
+    contents = []
+    for line in lines:
+        try:
+            data = jsoncodec.loads(line)
+        except jsoncodec.DecodeError:
+            continue
+        if data.get("error"):
+            raise RuntimeError(data["error"])
+        message = data.get("message")
+        if message:
+            content = message.get("content")
+            if content:
+                contents.append(content)
+        if data.get("done"):
+            break
+    return contents
+
+
+def current_accumulate(tokens: List[str], limit: int) -> str:
+    parts: List[str] = []
+    length = 0
+    for token in tokens:
+        remaining = limit - length
+        if len(token) > remaining:
+            token = token[:remaining]
+        parts.append(token)
+        length += len(token)
+        if length >= limit:
+            break
+    return "".join(parts)
+
+
+def current_messages(history: List["chat_app.ChatMessage"]) -> List[Dict]:
+    return [
+        {"role": message.role, "content": message.content}
+        for message in chat_app._sanitize_messages(history)
+    ]
+
+
+def current_response(text: str) -> bytes:
+    return chat_app.FastJSONResponse(content={"response": text, "turn": 3}).body
+
+
+# ==================== Casos ====================
+
+def mock_transport(lines: List[bytes]) -> httpx.MockTransport:
+    async def body() -> AsyncIterator[bytes]:
+        for line in lines:
+            yield line
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=body(), headers={"Content-Type": "application/x-ndjson"})
+
+    return httpx.MockTransport(handler)
+
+
+async def stream_case(lines: List[bytes], requests: int) -> Dict:
+    history = build_history(6)
+    payload = {
+        "model": "llama3.2",
+        "messages": legacy_messages(history),
+        "stream": True,
+        "options": {"temperature": 0.3, "num_predict": 128}
+    }
+    tokens = len(lines) - 1
+    transport = mock_transport(lines)
+
+    async def run_legacy() -> None:
+        async with httpx.AsyncClient(transport=transport) as client:
+            for _ in range(requests):
+                async for _token in legacy_stream(client, payload):
+                    pass
+
+    pool = chat_app.get_ollama_pool("chat")
+    pool._client = httpx.AsyncClient(transport=transport)
+
+    async def run_current() -> None:
+        for _ in range(requests):
+            async for _token in chat_app._ollama_stream(history, "llama3.2", 0.3):
+                pass
+
+    results = {}
+    for name, runner in (("legacy", run_legacy), ("current", run_current)):
+        await runner()  # calentamiento
+        started = time.process_time()
+        await runner()
+        results[name] = (time.process_time() - started) / (requests * tokens) * 1e6
+    await pool.close()
+    return {"case": "stream", "unit": "us_per_token", "legacy_us": results["legacy"], "current_us": results["current"]}
+
+
+def run_cases(args: argparse.Namespace) -> List[Dict]:
+    lines = build_token_lines(args.tokens, args.seed)
+    text_lines = [line.decode("utf-8").rstrip("\n") for line in lines]
+    byte_lines = [line.rstrip(b"\n") for line in lines]
+    tokens = [json.loads(line)["message"]["content"] for line in text_lines[:-1]]
+    history = build_history(args.history)
+    reply = "".join(tokens)[: chat_app.MAX_RESPONSE_CHARS]
+    repeat = args.requests
+    # Ambas implementaciones deben decodificar exactamente los mismos tokens
+    assert legacy_parse(text_lines) == tokens, "legacy_parse no coincide con los tokens generados"
+    assert current_parse(byte_lines) == tokens, "current_parse no coincide con los tokens generados"
+
+    with contextlib.redirect_stdout(sys.stderr):
+        stream = asyncio.run(stream_case(lines, max(1, repeat // 10)))
+    per_token = len(tokens)
+    cases = [
+        stream,
+        {
+            "case": "parse",
+            "unit": "us_per_token",
+            "legacy_us": cpu_us(lambda: legacy_parse(text_lines), repeat) / per_token,
+            "current_us": cpu_us(lambda: current_parse(byte_lines), repeat) / per_token
+        },
+        {
+            # Sin límite efectivo para medir todos los tokens
+            "case": "accumulate",
+            "unit": "us_per_token",
+            "legacy_us": cpu_us(lambda: legacy_accumulate(tokens, 10 ** 9), repeat) / per_token,
+            "current_us": cpu_us(lambda: current_accumulate(tokens, 10 ** 9), repeat) / per_token
+        },
+        {
+            "case": "messages",
+            "unit": "us_per_request",
+            "legacy_us": cpu_us(lambda: legacy_messages(history), repeat),
+            "current_us": cpu_us(lambda: current_messages(history), repeat)
+        },
+        {
+            "case": "response",
+            "unit": "us_per_request",
+            "legacy_us": cpu_us(lambda: legacy_response(reply), repeat),
+            "current_us": cpu_us(lambda: current_response(reply), repeat)
+        },
+    ]
+    for case in cases:
+        case["legacy_us"] = round(case["legacy_us"], 3)
+        case["current_us"] = round(case["current_us"], 3)
+        case["speedup"] = round(case["legacy_us"] / case["current_us"], 2) if case["current_us"] else None
+    return cases
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmark del camino crítico del chat")
+    parser.add_argument("--tokens", type=int, default=400, help="Tokens por respuesta simulada")
+    parser.add_argument("--requests", type=int, default=200, help="Repeticiones por caso")
+    parser.add_argument("--history", type=int, default=20, help="Mensajes del historial")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="Archivo JSON Lines (por defecto stdout)")
+    args = parser.parse_args()
+
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        output.write(json.dumps({"json_backend": jsoncodec.BACKEND, "tokens": args.tokens}) + "\n")
+        for case in run_cases(args):
+            output.write(json.dumps(case, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
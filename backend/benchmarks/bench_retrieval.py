@@ -0,0 +1,285 @@
+"""
+Micro-benchmark de recuperación sobre corpus sintéticos de distintos tamaños
+
+Mide, por backend y escala, el throughput de indexación de
+VectorStore.add_documents, percentiles de latencia de search (con y sin
+filtro por archivo), el costo de delete_by_filename y get_stats, la memoria
+residente y el tamaño en disco.
+
+La salida es JSON Lines (una línea por backend y escala) para poder
+compararla entre ejecuciones.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_retrieval --scales 1000,10000,100000
+    python -m benchmarks.bench_retrieval --scales 1000000 --backends chroma --output results.jsonl
+"""
+import argparse
+import contextlib
+import gc
+import json
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.common import summarize  # noqa: E402
+
+WORDS = (
+    "célula membrana núcleo proteína energía mitocondria síntesis función "
+    "tejido órgano sistema evolución especie genética herencia ambiente"
+).split()
+
+
+class FlatNumpyStore:
+    """Backend de referencia: búsqueda exacta por fuerza bruta en memoria"""
+
+    def __init__(self, persist_dir: str):
+        self.persist_dir = Path(persist_dir)
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        self.blocks: List[np.ndarray] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.texts: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.ids: List[str] = []
+
+    def add_documents(self, texts, embeddings, metadatas, ids=None):
+        self.blocks.append(np.vstack(embeddings).astype(np.float32))
+        self.matrix = None
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        self.ids.extend(ids or [str(len(self.ids) + i) for i in range(len(texts))])
+
+    def _matrix(self) -> np.ndarray:
+        if self.matrix is None:
+            self.matrix = np.vstack(self.blocks) if self.blocks else np.zeros((0, 1), np.float32)
+            self.blocks = [self.matrix]
+        return self.matrix
+
+    def search(self, query_embedding, n_results=5, filter_metadata=None):
+        matrix = self._matrix()
+        candidates = np.arange(len(self.ids))
+        if filter_metadata:
+            key, value = next(iter(filter_metadata.items()))
+            candidates = np.array([i for i, meta in enumerate(self.metadatas) if meta[key] == value], dtype=int)
+        if candidates.size == 0:
+            return {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        distances = np.sum((matrix[candidates] - query_embedding) ** 2, axis=1)
+        k = min(n_results, candidates.size)
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        rows = candidates[top]
+        return {
+            "ids": [self.ids[i] for i in rows],
+            "documents": [self.texts[i] for i in rows],
+            "metadatas": [self.metadatas[i] for i in rows],
+            "distances": distances[top].tolist()
+        }
+
+    def delete_by_filename(self, filename):
+        keep = [i for i, meta in enumerate(self.metadatas) if meta["filename"] != filename]
+        self.blocks = [self._matrix()[keep]]
+        self.matrix = None
+        self.texts = [self.texts[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self.ids = [self.ids[i] for i in keep]
+
+    def get_stats(self):
+        files = {}
+        for meta in self.metadatas:
+            files.setdefault(meta["filename"], set()).add(meta["page"])
+        return {"total_chunks": len(self.ids), "total_files": len(files)}
+
+    def count_documents(self):
+        return len(self.ids)
+
+
+def _chroma_store(persist_dir: str):
+    from rag_engine.vector_store import VectorStore
+    return VectorStore(persist_dir)
+
+
+BACKENDS: Dict[str, Callable[[str], object]] = {
+    "chroma": _chroma_store,
+    "numpy": FlatNumpyStore,
+}
+
+
+def synthetic_corpus(
+    n_chunks: int,
+    dimension: int,
+    batch_size: int,
+    seed: int = 0
+) -> Iterator[Tuple[List[str], List[np.ndarray], List[Dict], List[str]]]:
+    """
+    Genera el corpus en lotes para no materializar 1M de vectores a la vez
+
+    El tamaño de los archivos sigue una distribución log-normal (pocos libros
+    grandes y muchos apuntes cortos) y cada página produce de 1 a 4 chunks.
+    """
+    rng = np.random.default_rng(seed)
+    file_sizes: List[int] = []
+    remaining = n_chunks
+    while remaining > 0:
+        size = int(min(remaining, max(5, rng.lognormal(mean=4.5, sigma=1.0))))
+        file_sizes.append(size)
+        remaining -= size
+
+    texts, metadatas, ids = [], [], []
+    for file_index, size in enumerate(file_sizes):
+        filename = f"curso_{file_index:05d}.pdf"
+        page, chunk_in_page, chunks_this_page = 1, 0, int(rng.integers(1, 5))
+        for chunk_id in range(size):
+            if chunk_in_page >= chunks_this_page:
+                page += 1
+                chunk_in_page, chunks_this_page = 0, int(rng.integers(1, 5))
+            text = " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), 40))
+            texts.append(text)
+            metadatas.append({
+                "filename": filename,
+                "page": page,
+                "chunk_id": chunk_id,
+                "local_chunk_id": chunk_in_page,
+                "char_count": len(text)
+            })
+            ids.append(f"{filename}::{chunk_id}")
+            chunk_in_page += 1
+
+            if len(texts) >= batch_size:
+                yield texts, _random_vectors(rng, len(texts), dimension), metadatas, ids
+                texts, metadatas, ids = [], [], []
+
+    if texts:
+        yield texts, _random_vectors(rng, len(texts), dimension), metadatas, ids
+
+
+def _random_vectors(rng, count: int, dimension: int) -> List[np.ndarray]:
+    matrix = rng.standard_normal((count, dimension)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return list(matrix)
+
+
+def _rss_mb() -> float:
+    """Memoria residente actual del proceso en MB"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # Fallback: pico de memoria (KB en Linux, bytes en macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def _disk_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / (1024.0 * 1024.0)
+
+
+def _timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_case(backend: str, scale: int, args) -> Dict:
+    """Ejecuta el benchmark para un backend y una escala"""
+    workdir = Path(tempfile.mkdtemp(prefix=f"willay-bench-{backend}-"))
+    gc.collect()
+    rss_before = _rss_mb()
+
+    try:
+        store = BACKENDS[backend](str(workdir))
+
+        # Indexación
+        filenames = set()
+        index_seconds = 0.0
+        for texts, embeddings, metadatas, ids in synthetic_corpus(scale, args.dimension, args.batch_size, args.seed):
+            filenames.update(meta["filename"] for meta in metadatas)
+            index_seconds += _timed(store.add_documents, texts, embeddings, metadatas, ids)
+
+        rng = np.random.default_rng(args.seed + 1)
+        queries = _random_vectors(rng, args.queries, args.dimension)
+        sorted_files = sorted(filenames)
+
+        # Búsqueda sin filtro y filtrada por archivo
+        search_times = [_timed(store.search, q, n_results=args.top_k) for q in queries]
+        filtered_times = [
+            _timed(store.search, q, n_results=args.top_k,
+                   filter_metadata={"filename": sorted_files[i % len(sorted_files)]})
+            for i, q in enumerate(queries)
+        ]
+
+        stats_times = [_timed(store.get_stats) for _ in range(args.stats_repeats)]
+        rss_after = _rss_mb()
+        disk = _disk_mb(workdir)
+
+        delete_targets = sorted_files[:args.deletes]
+        delete_times = [_timed(store.delete_by_filename, name) for name in delete_targets]
+
+        return {
+            "backend": backend,
+            "scale": scale,
+            "dimension": args.dimension,
+            "files": len(filenames),
+            "index_seconds": round(index_seconds, 3),
+            "index_chunks_per_second": round(scale / index_seconds, 1) if index_seconds else None,
+            "search_ms": summarize(search_times),
+            "search_filtered_ms": summarize(filtered_times),
+            "get_stats_ms": summarize(stats_times),
+            "delete_by_filename_ms": summarize(delete_times),
+            "rss_delta_mb": round(rss_after - rss_before, 1),
+            "disk_mb": round(disk, 1)
+        }
+    finally:
+        store = None
+        gc.collect()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmark de recuperación")
+    parser.add_argument("--scales", default="1000,10000,100000", help="Tamaños del corpus en chunks")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"Backends: {', '.join(BACKENDS)}")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--batch-size", type=int, default=5000, help="Chunks por llamada a add_documents")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--deletes", type=int, default=5, help="Archivos a eliminar al final")
+    parser.add_argument("--stats-repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="Archivo JSON Lines (por defecto stdout)")
+    args = parser.parse_args()
+
+    scales = [int(value) for value in args.scales.split(",") if value]
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    unknown = [name for name in backends if name not in BACKENDS]
+    if unknown:
+        parser.error(f"Backends desconocidos: {', '.join(unknown)}")
+
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for scale in scales:
+            for backend in backends:
+                # Los mensajes de progreso del store van a stderr para no mezclarse con el JSON
+                with contextlib.redirect_stdout(sys.stderr):
+                    result = run_case(backend, scale, args)
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
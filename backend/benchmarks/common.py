@@ -0,0 +1,93 @@
+"""
+Utilidades compartidas por los benchmarks: percentiles, resúmenes y baselines
+"""
+import json
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Percentil por interpolación lineal (None si no hay muestras)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return ordered[low]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: Iterable[float], scale: float = 1000.0) -> Dict[str, Optional[float]]:
+    """
+    Resume una serie de mediciones en segundos
+
+    Args:
+        values: Mediciones en segundos
+        scale: Factor de conversión (1000 = milisegundos)
+
+    Returns:
+        Dict con count, mean, p50, p95, p99 y max en la unidad escalada
+    """
+    samples = [v * scale for v in values]
+    if not samples:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples), 3),
+        "p50": round(percentile(samples, 50), 3),
+        "p95": round(percentile(samples, 95), 3),
+        "p99": round(percentile(samples, 99), 3),
+        "max": round(max(samples), 3)
+    }
+
+
+def save_json(path: str, data: Dict) -> None:
+    """Guarda un resultado de benchmark como JSON legible"""
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def load_json(path: str) -> Dict:
+    """Carga un resultado de benchmark guardado"""
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def compare_to_baseline(
+    current: Dict[str, float],
+    baseline: Dict[str, float],
+    tolerance: float,
+    higher_is_better: Iterable[str] = ()
+) -> List[str]:
+    """
+    Compara métricas planas contra un baseline
+
+    Args:
+        current: Métricas de la ejecución actual
+        baseline: Métricas guardadas previamente
+        tolerance: Degradación relativa permitida (0.15 = 15%)
+        higher_is_better: Métricas donde un valor menor es una regresión
+
+    Returns:
+        Lista de descripciones de regresiones (vacía si no hay)
+    """
+    better_high = set(higher_is_better)
+    regressions = []
+
+    for key, base_value in baseline.items():
+        value = current.get(key)
+        if value is None or base_value is None or base_value == 0:
+            continue
+        if key in better_high:
+            change = (base_value - value) / base_value
+        else:
+            change = (value - base_value) / base_value
+        if change > tolerance:
+            regressions.append(f"{key}: {base_value} → {value} ({change:+.1%})")
+
+    return regressions
@@ -0,0 +1,157 @@
+"""
+Servidor Ollama simulado para benchmarks y pruebas locales
+
+Implementa /api/chat (streaming NDJSON y no streaming), /api/embeddings,
+/api/embed, /api/generate, /api/tags y /api/ps con latencias configurables.
+
+Uso:
+    python -m benchmarks.fake_ollama --port 11535 --token-latency-ms 20 --jitter-ms 5
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import List
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "la célula es la unidad básica de la vida y contiene material genético "
+    "que dirige sus funciones según el documento citado en la página indicada"
+).split()
+
+
+class FakeOllamaConfig:
+    """Parámetros de latencia y tamaño del servidor simulado"""
+
+    def __init__(
+        self,
+        token_latency_ms: float = 20.0,
+        jitter_ms: float = 5.0,
+        prefill_ms: float = 50.0,
+        embed_latency_ms: float = 5.0,
+        tokens_per_reply: int = 40,
+        dimension: int = 768,
+        models: List[str] = None
+    ):
+        self.token_latency_ms = token_latency_ms
+        self.jitter_ms = jitter_ms
+        self.prefill_ms = prefill_ms
+        self.embed_latency_ms = embed_latency_ms
+        self.tokens_per_reply = tokens_per_reply
+        self.dimension = dimension
+        self.models = models or ["llama3.2:latest", "nomic-embed-text:latest"]
+
+    def delay(self, base_ms: float) -> float:
+        """Retardo en segundos con jitter uniforme"""
+        jitter = random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, base_ms + jitter) / 1000.0
+
+
+def fake_embedding(text: str, dimension: int) -> List[float]:
+    """Embedding determinista derivado del hash del texto"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector.tolist()
+
+
+def create_fake_ollama(config: FakeOllamaConfig = None) -> FastAPI:
+    """Crea la aplicación FastAPI del Ollama simulado"""
+    config = config or FakeOllamaConfig()
+    app = FastAPI(title="Fake Ollama")
+    app.state.config = config
+    app.state.requests = {"chat": 0, "embeddings": 0, "generate": 0}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": name, "model": name} for name in config.models]}
+
+    @app.get("/api/ps")
+    async def running_models():
+        expires = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 300))
+        return {
+            "models": [
+                {"name": name, "model": name, "size_vram": 0, "expires_at": expires}
+                for name in config.models
+            ]
+        }
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        app.state.requests["embeddings"] += 1
+        await asyncio.sleep(config.delay(config.embed_latency_ms))
+        return {"embedding": fake_embedding(body.get("prompt", ""), config.dimension)}
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        app.state.requests["embeddings"] += 1
+        await asyncio.sleep(config.delay(config.embed_latency_ms))
+        return {"embeddings": [fake_embedding(text, config.dimension) for text in inputs]}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        await request.json()
+        app.state.requests["generate"] += 1
+        await asyncio.sleep(config.delay(config.prefill_ms))
+        return {"response": "", "done": True}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.requests["chat"] += 1
+        options = body.get("options") or {}
+        n_tokens = min(config.tokens_per_reply, options.get("num_predict") or config.tokens_per_reply)
+
+        if not body.get("stream", True):
+            await asyncio.sleep(config.delay(config.prefill_ms) + n_tokens * config.token_latency_ms / 1000.0)
+            content = " ".join(random.choice(WORDS) for _ in range(n_tokens))
+            return JSONResponse({"message": {"role": "assistant", "content": content}, "done": True})
+
+        async def token_stream():
+            await asyncio.sleep(config.delay(config.prefill_ms))
+            for _ in range(n_tokens):
+                await asyncio.sleep(config.delay(config.token_latency_ms))
+                chunk = {"message": {"role": "assistant", "content": random.choice(WORDS) + " "}, "done": False}
+                yield json.dumps(chunk, ensure_ascii=False) + "\n"
+            yield json.dumps({"message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+
+        return StreamingResponse(token_stream(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor Ollama simulado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11535)
+    parser.add_argument("--token-latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--prefill-ms", type=float, default=50.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--dimension", type=int, default=768)
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        token_latency_ms=args.token_latency_ms,
+        jitter_ms=args.jitter_ms,
+        prefill_ms=args.prefill_ms,
+        embed_latency_ms=args.embed_latency_ms,
+        tokens_per_reply=args.tokens,
+        dimension=args.dimension
+    )
+    uvicorn.run(create_fake_ollama(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Presupuesto de tiempo de importación del backend
+
+Importa `app` en un proceso limpio con `-X importtime`, reporta el tiempo
+total y los módulos más lentos, y falla si se supera el presupuesto o si
+se cargaron módulos pesados que deben ser diferidos (chromadb, PyPDF2,
+numpy).
+
+Uso (desde backend/):
+    python -m benchmarks.import_time --budget-ms 1500
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Módulos que no deben cargarse al importar app (se cargan al inicializar RAG)
+DEFERRED_MODULES = ("chromadb", "PyPDF2", "numpy")
+
+PROBE = (
+    "import sys, app; "
+    "print(','.join(m for m in {deferred!r} if m in sys.modules))"
+)
+
+
+def measure(module_probe: str) -> dict:
+    """Importa en un subproceso y retorna tiempos y módulos diferidos cargados"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", module_probe],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    wall = time.perf_counter() - started
+
+    # Formato: "import time: self [us] | cumulative | imported package"
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        # La indentación del nombre indica la profundidad de anidamiento
+        depth = len(name) - len(name.lstrip()) - 1
+        modules.append((int(cumulative_us), int(self_us), name.strip(), depth))
+
+    top_level = [m for m in modules if m[3] == 0]
+    total_us = sum(m[0] for m in top_level)
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+
+    return {
+        "wall_ms": round(wall * 1000, 1),
+        "import_ms": round(total_us / 1000, 1),
+        "slowest": sorted(modules, reverse=True)[:10],
+        "deferred_loaded": loaded
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de importación")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="Tiempo máximo de importación")
+    args = parser.parse_args()
+
+    report = measure(PROBE.format(deferred=DEFERRED_MODULES))
+
+    print(f"⏱️  import app: {report['import_ms']} ms (proceso completo: {report['wall_ms']} ms)")
+    print("Módulos más lentos (acumulado):")
+    for cumulative_us, _, name, _ in report["slowest"]:
+        print(f"  • {name:40s} {cumulative_us / 1000:8.1f} ms")
+
+    failed = False
+    if report["deferred_loaded"]:
+        print(f"❌ Se cargaron módulos que deberían ser diferidos: {', '.join(report['deferred_loaded'])}")
+        failed = True
+    if report["import_ms"] > args.budget_ms:
+        print(f"❌ Presupuesto excedido: {report['import_ms']} ms > {args.budget_ms} ms")
+        failed = True
+
+    if not failed:
+        print(f"✅ Dentro del presupuesto de {args.budget_ms} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
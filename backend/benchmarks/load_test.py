@@ -0,0 +1,349 @@
+"""
+Benchmark de carga end-to-end de la API con un Ollama simulado
+
+Levanta el Ollama simulado y la app FastAPI en el mismo proceso (puertos
+locales), indexa un corpus sintético y lanza N estudiantes concurrentes
+que mantienen conversaciones RAG de varios turnos contra /chat/stream,
+/chat y /rag/search.
+
+Reporta req/s, time-to-first-token, latencias p50/p95/p99 por endpoint y
+el lag del event loop del servidor. Con --save-baseline guarda el
+resultado; con --baseline compara y termina con código 1 si hay
+regresiones mayores a --tolerance.
+
+Uso (desde backend/):
+    python -m benchmarks.load_test --students 20 --turns 5
+    python -m benchmarks.load_test --save-baseline benchmarks/results/load_baseline.json
+    python -m benchmarks.load_test --baseline benchmarks/results/load_baseline.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.common import compare_to_baseline, load_json, save_json, summarize  # noqa: E402
+from benchmarks.fake_ollama import FakeOllamaConfig, WORDS, create_fake_ollama  # noqa: E402
+
+QUESTIONS = [
+    "¿Qué es la célula?",
+    "Explica la función del material genético",
+    "¿Qué dice el documento sobre la unidad básica de la vida?",
+    "Resume la página indicada",
+    "¿Cuál es la diferencia entre célula animal y vegetal?",
+    "gracias",
+]
+
+# Mezcla de peticiones por turno: (endpoint, probabilidad acumulada)
+REQUEST_MIX = [("chat_stream", 0.7), ("chat", 0.9), ("rag_search", 1.0)]
+
+HIGHER_IS_BETTER = ("requests_per_second",)
+
+
+class LoopLagMonitor:
+    """Mide cuánto se atrasa el event loop respecto a un intervalo fijo"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+async def _start_server(app, port: int):
+    """Inicia uvicorn en el event loop actual y espera a que escuche"""
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def _stop_server(server, task) -> None:
+    server.should_exit = True
+    await task
+
+
+async def _seed_corpus(rag_engine, n_files: int, pages_per_file: int) -> int:
+    """Indexa un corpus sintético directamente en el vector store"""
+    rng = random.Random(42)
+    texts, metadatas, ids = [], [], []
+    for file_index in range(n_files):
+        filename = f"curso_{file_index:03d}.pdf"
+        for page in range(1, pages_per_file + 1):
+            text = " ".join(rng.choice(WORDS) for _ in range(120))
+            texts.append(text)
+            metadatas.append({
+                "filename": filename,
+                "page": page,
+                "chunk_id": page - 1,
+                "local_chunk_id": 0,
+                "char_count": len(text)
+            })
+            ids.append(f"{filename}::{page - 1}")
+
+    embeddings = await rag_engine.embedding_generator.generate_embeddings(texts)
+    rag_engine.vector_store.add_documents(texts, embeddings, metadatas, ids)
+    return len(texts)
+
+
+async def _student(
+    client: httpx.AsyncClient,
+    base_url: str,
+    student_id: int,
+    turns: int,
+    think_time: float,
+    samples: Dict[str, Dict[str, List[float]]],
+    rng: random.Random
+) -> None:
+    """Simula un estudiante con una conversación RAG de varios turnos"""
+    client_id = f"bench-student-{student_id}"
+
+    for _ in range(turns):
+        question = rng.choice(QUESTIONS)
+        draw = rng.random()
+        kind = next(name for name, limit in REQUEST_MIX if draw <= limit)
+        bucket = samples[kind]
+        start = time.perf_counter()
+
+        try:
+            if kind == "chat_stream":
+                payload = {"clientId": client_id, "prompt": question, "useRag": True}
+                async with client.stream("POST", f"{base_url}/chat/stream", json=payload) as response:
+                    first_token = None
+                    async for chunk in response.aiter_bytes():
+                        if chunk and first_token is None:
+                            first_token = time.perf_counter() - start
+                    if response.status_code != 200:
+                        raise httpx.HTTPStatusError("error", request=response.request, response=response)
+                if first_token is not None:
+                    bucket["ttft"].append(first_token)
+            elif kind == "chat":
+                payload = {"clientId": client_id, "prompt": question, "useRag": True}
+                response = await client.post(f"{base_url}/chat", json=payload)
+                response.raise_for_status()
+            else:
+                response = await client.post(
+                    f"{base_url}/rag/search",
+                    params={"query": question, "n_results": 5}
+                )
+                response.raise_for_status()
+            bucket["latency"].append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            bucket["errors"].append(time.perf_counter() - start)
+
+        if think_time:
+            await asyncio.sleep(rng.uniform(0, 2 * think_time))
+
+
+def _flatten(report: Dict) -> Dict[str, float]:
+    """Métricas planas usadas para comparar contra el baseline"""
+    flat = {"requests_per_second": report["requests_per_second"]}
+    for endpoint, data in report["endpoints"].items():
+        for metric in ("p50", "p95", "p99"):
+            flat[f"{endpoint}.latency_{metric}_ms"] = data["latency_ms"][metric]
+        if data.get("ttft_ms", {}).get("count"):
+            for metric in ("p50", "p95"):
+                flat[f"{endpoint}.ttft_{metric}_ms"] = data["ttft_ms"][metric]
+    if report["event_loop_lag_ms"]["count"]:
+        flat["event_loop_lag.p99_ms"] = report["event_loop_lag_ms"]["p99"]
+    return flat
+
+
+async def run_load_test(args) -> Dict:
+    """Ejecuta el benchmark completo y retorna el reporte"""
+    workdir = None
+    fake = app_server = None
+    monitor = LoopLagMonitor()
+
+    if args.app_url:
+        base_url = args.app_url.rstrip("/")
+        corpus_chunks = None
+    else:
+        workdir = tempfile.mkdtemp(prefix="willay-bench-")
+        os.chdir(workdir)
+
+        fake_config = FakeOllamaConfig(
+            token_latency_ms=args.token_latency_ms,
+            jitter_ms=args.jitter_ms,
+            prefill_ms=args.prefill_ms,
+            embed_latency_ms=args.embed_latency_ms,
+            tokens_per_reply=args.tokens,
+            dimension=args.dimension
+        )
+        fake = await _start_server(create_fake_ollama(fake_config), args.ollama_port)
+        fake_url = f"http://127.0.0.1:{args.ollama_port}"
+
+        import app as willay_app
+        from rag_engine import NamespaceRegistry, RAGEngine
+
+        willay_app.OLLAMA_BASE_URL = fake_url
+        willay_app.rag_engine = RAGEngine(
+            pdf_dir="rag",
+            cache_dir="cache",
+            vector_store_dir="vector_store",
+            ollama_base_url=fake_url
+        )
+        willay_app.rag_namespaces = NamespaceRegistry(
+            willay_app._create_rag_engine,
+            default_engine=willay_app.rag_engine,
+            pdf_dir="rag"
+        )
+        corpus_chunks = await _seed_corpus(willay_app.rag_engine, args.files, args.pages)
+
+        app_server = await _start_server(willay_app.app, args.app_port)
+        base_url = f"http://127.0.0.1:{args.app_port}"
+
+    samples = {
+        name: {"latency": [], "ttft": [], "errors": []}
+        for name, _ in REQUEST_MIX
+    }
+    limits = httpx.Limits(max_connections=args.students * 2)
+    rng = random.Random(args.seed)
+
+    monitor.start()
+    started = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(120.0), limits=limits) as client:
+            await asyncio.gather(*(
+                _student(client, base_url, i, args.turns, args.think_ms / 1000.0, samples,
+                         random.Random(rng.random()))
+                for i in range(args.students)
+            ))
+    finally:
+        elapsed = time.perf_counter() - started
+        await monitor.stop()
+        if app_server:
+            await _stop_server(*app_server)
+        if fake:
+            await _stop_server(*fake)
+
+    total_ok = sum(len(s["latency"]) for s in samples.values())
+    total_errors = sum(len(s["errors"]) for s in samples.values())
+
+    return {
+        "config": {
+            "students": args.students,
+            "turns": args.turns,
+            "think_ms": args.think_ms,
+            "token_latency_ms": args.token_latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "prefill_ms": args.prefill_ms,
+            "embed_latency_ms": args.embed_latency_ms,
+            "corpus_chunks": corpus_chunks,
+            "app_url": args.app_url
+        },
+        "duration_s": round(elapsed, 3),
+        "requests": total_ok,
+        "errors": total_errors,
+        "requests_per_second": round(total_ok / elapsed, 3) if elapsed else 0.0,
+        "endpoints": {
+            name: {
+                "latency_ms": summarize(data["latency"]),
+                "ttft_ms": summarize(data["ttft"]),
+                "errors": len(data["errors"])
+            }
+            for name, data in samples.items()
+        },
+        # Con --app-url el lag medido es el del cliente, no el del servidor
+        "event_loop_lag_ms": summarize(monitor.samples)
+    }
+
+
+def _print_report(report: Dict) -> None:
+    print(f"\n📊 {report['requests']} peticiones en {report['duration_s']} s "
+          f"({report['requests_per_second']} req/s, {report['errors']} errores)")
+    for name, data in report["endpoints"].items():
+        latency = data["latency_ms"]
+        line = f"  • {name:12s} n={latency['count']:<5} p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} ms"
+        if data["ttft_ms"]["count"]:
+            line += f" | TTFT p50={data['ttft_ms']['p50']} p95={data['ttft_ms']['p95']} ms"
+        print(line)
+    lag = report["event_loop_lag_ms"]
+    print(f"  • event loop lag p50={lag['p50']} p99={lag['p99']} max={lag['max']} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de carga de la API de Willay")
+    parser.add_argument("--students", type=int, default=10, help="Estudiantes concurrentes")
+    parser.add_argument("--turns", type=int, default=5, help="Turnos por estudiante")
+    parser.add_argument("--think-ms", type=float, default=100.0, help="Pausa media entre turnos")
+    parser.add_argument("--token-latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--prefill-ms", type=float, default=50.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens por respuesta simulada")
+    parser.add_argument("--dimension", type=int, default=768, help="Dimensión de los embeddings simulados")
+    parser.add_argument("--files", type=int, default=20, help="Archivos del corpus sintético")
+    parser.add_argument("--pages", type=int, default=10, help="Páginas por archivo del corpus")
+    parser.add_argument("--ollama-port", type=int, default=11535)
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--app-url", default=None, help="Usar un backend ya levantado en vez del in-process")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=None, help="Guardar el reporte completo en JSON")
+    parser.add_argument("--save-baseline", default=None, help="Guardar las métricas como baseline")
+    parser.add_argument("--baseline", default=None, help="Comparar contra un baseline guardado")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Degradación relativa permitida")
+    args = parser.parse_args()
+
+    for option in ("output", "save_baseline", "baseline"):
+        value = getattr(args, option)
+        if value:
+            setattr(args, option, str(Path(value).resolve()))
+
+    report = asyncio.run(run_load_test(args))
+    _print_report(report)
+
+    if args.output:
+        save_json(args.output, report)
+    if args.save_baseline:
+        save_json(args.save_baseline, {"metrics": _flatten(report), "report": report})
+        print(f"\n✓ Baseline guardado en {args.save_baseline}")
+    if args.baseline:
+        baseline = load_json(args.baseline)
+        regressions = compare_to_baseline(
+            _flatten(report), baseline["metrics"], args.tolerance, HIGHER_IS_BETTER
+        )
+        if regressions:
+            print("\n❌ Regresiones respecto al baseline:")
+            for line in regressions:
+                print(f"  • {line}")
+            return 1
+        print("\n✅ Sin regresiones respecto al baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
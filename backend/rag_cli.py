@@ -7,11 +7,13 @@ Uso:
     python rag_cli.py stats          # Ver estadísticas
     python rag_cli.py clear          # Limpiar índice
     python rag_cli.py list           # Listar documentos indexados
+    python rag_cli.py stats --namespace=biologia  # Operar sobre un namespace
 """
 import asyncio
 import sys
 from pathlib import Path
 from rag_engine import RAGEngine
+from rag_engine.namespaces import DEFAULT_NAMESPACE, NamespaceError
 
 
 def print_header(text: str):
@@ -78,16 +80,17 @@ async def show_stats(rag: RAGEngine):
     """Muestra estadísticas del índice"""
     print_header("ESTADÍSTICAS RAG")
     
-    if not rag.is_indexed():
+    if not await rag.is_indexed():
         print_info("No hay documentos indexados")
         print_info("Ejecuta 'python rag_cli.py index' para indexar")
         return
     
-    stats = rag.get_stats()
+    stats = await rag.get_stats()
     
     print(f"📊 Estado del índice:")
     print(f"  • Total de chunks: {stats['total_chunks']}")
     print(f"  • Total de archivos: {stats['total_files']}")
+    print(f"  • Generación activa: {stats['generations']['active']}")
     
     if stats["files"]:
         print(f"\n📚 Archivos indexados:")
@@ -101,32 +104,83 @@ async def clear_index(rag: RAGEngine):
     """Limpia el índice completo"""
     print_header("LIMPIAR ÍNDICE")
     
-    if not rag.is_indexed():
+    if not await rag.is_indexed():
         print_info("El índice ya está vacío")
         return
     
-    stats = rag.get_stats()
+    stats = await rag.get_stats()
     print(f"⚠️  Se eliminarán {stats['total_chunks']} chunks de {stats['total_files']} archivos")
     
     confirm = input("\n¿Confirmas? (s/n): ").lower()
     
     if confirm == 's':
-        rag.clear_index()
+        await rag.clear_index()
         print_success("Índice limpiado correctamente")
         print_info("Los archivos PDF originales se mantienen intactos")
     else:
         print_info("Operación cancelada")
 
 
+async def rollback_index(rag: RAGEngine):
+    """Vuelve a la generación anterior del índice"""
+    print_header("ROLLBACK DEL ÍNDICE")
+    
+    try:
+        generation = await rag.rollback_index()
+    except ValueError as e:
+        print_error(str(e))
+        return
+    
+    print_success(f"Generación activa: {generation}")
+    print_info(f"Chunks indexados: {await rag.store.count_documents()}")
+
+
+async def snapshot_command(rag: RAGEngine, action: str, path: str, force: bool = False):
+    """Exporta o importa un snapshot portable del índice"""
+    from rag_engine.snapshot import SnapshotError, SnapshotManager
+    
+    manager = SnapshotManager(rag)
+    
+    if action == "export":
+        print_header("EXPORTAR SNAPSHOT")
+        try:
+            manifest = await manager.export(path)
+        except SnapshotError as e:
+            print_error(str(e))
+            return
+        print_success(f"Snapshot guardado en {path}")
+        print(f"  • Chunks: {manifest['chunks']}")
+        print(f"  • Archivos: {len(manifest['files'])}")
+        print(f"  • Modelo: {manifest['embedding_model']} ({manifest['index_dimension']} dimensiones en el índice)")
+    
+    elif action == "import":
+        print_header("IMPORTAR SNAPSHOT")
+        try:
+            result = await manager.load(path, force=force)
+        except SnapshotError as e:
+            print_error(str(e))
+            if not force:
+                print_info("Usa --force para importar de todos modos")
+            return
+        print_success(f"Snapshot importado en {result['generation']}")
+        print(f"  • Chunks: {result['chunks']}")
+        print(f"  • Archivos: {result['files']}")
+        print_info("La generación anterior queda disponible con 'rollback'")
+    
+    else:
+        print_error(f"Acción desconocida: {action}")
+        print_info("Uso: python rag_cli.py snapshot export|import <archivo>")
+
+
 async def list_files(rag: RAGEngine):
     """Lista archivos indexados"""
     print_header("DOCUMENTOS INDEXADOS")
     
-    if not rag.is_indexed():
+    if not await rag.is_indexed():
         print_info("No hay documentos indexados")
         return
     
-    files = rag.get_indexed_files()
+    files = await rag.get_indexed_files()
     
     print(f"📁 Total de archivos: {len(files)}\n")
     for i, filename in enumerate(files, 1):
@@ -134,77 +188,67 @@ async def list_files(rag: RAGEngine):
 
 
 async def watch_mode(rag: RAGEngine):
-    """Modo observador: detecta cambios y re-indexa automáticamente"""
+    """Modo observador: detecta cambios y re-indexa solo los archivos modificados"""
+    from rag_engine.watcher import DocumentWatcher
+    
     print_header("MODO OBSERVADOR")
     print_info("Observando cambios en el directorio 'rag/'...")
     print_info("Presiona Ctrl+C para detener\n")
     
+    watcher = DocumentWatcher(rag)
+    await watcher.start()
+    
     try:
-        from watchdog.observers import Observer
-        from watchdog.events import FileSystemEventHandler
-        
-        class PDFHandler(FileSystemEventHandler):
-            def __init__(self, rag_engine):
-                self.rag = rag_engine
-                self.indexing = False
-            
-            def on_created(self, event):
-                if event.src_path.endswith('.pdf') and not self.indexing:
-                    print(f"\n📄 Nuevo PDF detectado: {Path(event.src_path).name}")
-                    self.reindex()
-            
-            def on_modified(self, event):
-                if event.src_path.endswith('.pdf') and not self.indexing:
-                    print(f"\n📝 PDF modificado: {Path(event.src_path).name}")
-                    self.reindex()
-            
-            def on_deleted(self, event):
-                if event.src_path.endswith('.pdf'):
-                    print(f"\n🗑️  PDF eliminado: {Path(event.src_path).name}")
-            
-            def reindex(self):
-                self.indexing = True
-                print("🔄 Re-indexando...")
-                asyncio.run(rag.index_documents())
-                self.indexing = False
-                print("✅ Re-indexación completada\n")
-        
-        event_handler = PDFHandler(rag)
-        observer = Observer()
-        observer.schedule(event_handler, "rag", recursive=False)
-        observer.start()
-        
-        try:
-            while True:
-                await asyncio.sleep(1)
-        except KeyboardInterrupt:
-            observer.stop()
-            print("\n\n👋 Deteniendo observador...")
-        
-        observer.join()
-        
-    except ImportError:
-        print_error("El módulo 'watchdog' no está instalado")
-        print_info("Instala con: pip install watchdog")
+        while True:
+            await asyncio.sleep(1)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("\n\n👋 Deteniendo observador...")
+    finally:
+        await watcher.stop()
 
 
 async def main():
     """Función principal del CLI"""
-    rag = RAGEngine()
-    
+    namespace = next(
+        (arg.split("=", 1)[1] for arg in sys.argv[2:] if arg.startswith("--namespace=")),
+        DEFAULT_NAMESPACE
+    )
     if len(sys.argv) < 2:
         print("Uso: python rag_cli.py <comando> [opciones]")
         print("\nComandos disponibles:")
         print("  index         Indexar todos los PDFs")
-        print("  index --force Forzar re-indexación completa")
+        print("  index --force Reconstruir el índice completo (generación nueva)")
         print("  stats         Mostrar estadísticas")
         print("  clear         Limpiar índice")
+        print("  rollback      Volver a la generación anterior del índice")
+        print("  snapshot export <archivo>  Exportar el índice a un snapshot")
+        print("  snapshot import <archivo>  Importar un snapshot (sin generar embeddings)")
         print("  list          Listar documentos indexados")
         print("  watch         Modo observador (auto-reindex)")
+        print("\nOpciones:")
+        print("  --namespace=<nombre>  Namespace (curso) sobre el que operar")
         return
     
-    command = sys.argv[1].lower()
+    # Misma configuración que el servidor (shards, extractores, proyección, deduplicación)
+    import app as willay_app
+    
+    try:
+        rag = await asyncio.to_thread(willay_app._create_rag_engine, namespace)
+    except NamespaceError as e:
+        print_error(str(e))
+        return
     
+    try:
+        await run_command(rag, sys.argv[1].lower())
+    finally:
+        rag.close()
+        rag.embedding_generator.close()
+        for pool in willay_app._ollama_pools.values():
+            await pool.close()
+
+
+async def run_command(rag: RAGEngine, command: str):
+    """Ejecuta un comando del CLI sobre el motor indicado"""
     if command == "index":
         force = "--force" in sys.argv
         await index_documents(rag, force=force)
@@ -215,6 +259,16 @@ async def main():
     elif command == "clear":
         await clear_index(rag)
     
+    elif command == "rollback":
+        await rollback_index(rag)
+    
+    elif command == "snapshot":
+        args = [arg for arg in sys.argv[2:] if not arg.startswith("--")]
+        if len(args) != 2:
+            print_error("Uso: python rag_cli.py snapshot export|import <archivo> [--force]")
+            return
+        await snapshot_command(rag, args[0].lower(), args[1], force="--force" in sys.argv)
+    
     elif command == "list":
         await list_files(rag)
     
@@ -223,8 +277,11 @@ async def main():
     
     else:
         print_error(f"Comando desconocido: {command}")
-        print_info("Comandos válidos: index, stats, clear, list, watch")
+        print_info("Comandos válidos: index, stats, clear, rollback, snapshot, list, watch")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -1,15 +1,45 @@
 """
 Inicialización del módulo RAG Engine
+
+Los submódulos se importan de forma diferida (PEP 562) para que importar el
+paquete no cargue chromadb, PyPDF2 ni numpy hasta que se usen.
 """
-from .rag_engine import RAGEngine
-from .vector_store import VectorStore
-from .pdf_extractor import PDFExtractor
-from .chunker import TextChunker, EmbeddingGenerator
-
-__all__ = [
-    "RAGEngine",
-    "VectorStore",
-    "PDFExtractor",
-    "TextChunker",
-    "EmbeddingGenerator"
-]
+import importlib
+
+_EXPORTS = {
+    "RAGEngine": ".rag_engine",
+    "VectorStore": ".vector_store",
+    "ShardedVectorStore": ".sharding",
+    "AsyncVectorStore": ".async_store",
+    "PDFExtractor": ".pdf_extractor",
+    "PDFBackend": ".pdf_backends",
+    "TextChunker": ".chunker",
+    "EmbeddingGenerator": ".chunker",
+    "LocalEmbedder": ".embedding_backends",
+    "EmbeddingProjector": ".projection",
+    "UploadManager": ".uploads",
+    "DocumentWatcher": ".watcher",
+    "SnapshotManager": ".snapshot",
+    "NamespaceRegistry": ".namespaces",
+    "RetrievalGate": ".gating",
+    "OllamaPool": ".ollama_pool",
+    "ModelResidencyManager": ".residency",
+    "ModelRouter": ".routing",
+    "ChunkDeduplicator": ".dedup",
+    "BatchJobManager": ".batch_jobs",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,157 @@
+"""
+Fachada asíncrona del VectorStore para usarlo desde el event loop sin bloquearlo
+"""
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict
+
+
+class _OperationStats:
+    """Acumula tiempos de cola y ejecución de una operación"""
+
+    def __init__(self, window: int = 512):
+        self.count = 0
+        self.errors = 0
+        self.queue_total = 0.0
+        self.queue_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+        self.recent_queue: Deque[float] = deque(maxlen=window)
+        self.recent_run: Deque[float] = deque(maxlen=window)
+
+    def record(self, queued: float, ran: float, failed: bool) -> None:
+        self.count += 1
+        self.errors += int(failed)
+        self.queue_total += queued
+        self.run_total += ran
+        self.queue_max = max(self.queue_max, queued)
+        self.run_max = max(self.run_max, ran)
+        self.recent_queue.append(queued)
+        self.recent_run.append(ran)
+
+    @staticmethod
+    def _p95(samples: Deque[float]) -> float:
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def as_dict(self) -> Dict:
+        count = self.count or 1
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "queue_ms_avg": round(self.queue_total / count * 1000, 3),
+            "queue_ms_p95": round(self._p95(self.recent_queue) * 1000, 3),
+            "queue_ms_max": round(self.queue_max * 1000, 3),
+            "run_ms_avg": round(self.run_total / count * 1000, 3),
+            "run_ms_p95": round(self._p95(self.recent_run) * 1000, 3),
+            "run_ms_max": round(self.run_max * 1000, 3)
+        }
+
+
+class AsyncVectorStore:
+    """
+    Ejecuta las operaciones del VectorStore en pools de hilos dedicados
+
+    Las lecturas (search, count, stats...) corren en un pool acotado y pueden
+    ejecutarse en paralelo entre sí y con una escritura en curso. Las
+    escrituras (add, delete, clear y los cambios de generación) usan un único
+    hilo, así quedan serializadas sin retener a las lecturas. Para cada operación se mide el
+    tiempo de espera en cola y el de ejecución.
+    """
+
+    READ_OPERATIONS = (
+        "search",
+        "search_batch",
+        "get_full_embeddings",
+        "get_metadatas",
+        "get_dimension",
+        "count_documents",
+        "get_filenames",
+        "get_file_stats",
+        "get_stats",
+        "get_all_documents",
+        "get_duplicate_records",
+        "health",
+        "get_generations",
+    )
+    WRITE_OPERATIONS = (
+        "add_documents",
+        "add_bulk",
+        "delete_by_filename",
+        "update_metadatas",
+        "clear",
+        "begin_generation",
+        "activate_generation",
+        "discard_generation",
+        "rollback",
+        "rebalance",
+    )
+
+    def __init__(self, store, read_workers: int = 4):
+        """
+        Args:
+            store: VectorStore síncrono a envolver
+            read_workers: Hilos máximos para lecturas concurrentes
+        """
+        self.store = store
+        self.read_workers = read_workers
+        self._read_pool = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="vector-read")
+        self._write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-write")
+        self._stats: Dict[str, _OperationStats] = {}
+        self._in_flight = {"read": 0, "write": 0}
+
+    def __getattr__(self, name):
+        if name in self.READ_OPERATIONS:
+            return self._bind(name, self._read_pool, "read")
+        if name in self.WRITE_OPERATIONS:
+            return self._bind(name, self._write_pool, "write")
+        raise AttributeError(name)
+
+    def _bind(self, name: str, pool: ThreadPoolExecutor, kind: str):
+        async def call(*args, **kwargs):
+            return await self._run(name, pool, kind, *args, **kwargs)
+        call.__name__ = name
+        return call
+
+    async def _run(self, name: str, pool: ThreadPoolExecutor, kind: str, *args, **kwargs):
+        method = getattr(self.store, name)
+        submitted = time.perf_counter()
+        timing = {}
+
+        def task():
+            timing["started"] = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timing["finished"] = time.perf_counter()
+
+        self._in_flight[kind] += 1
+        failed = False
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, task)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._in_flight[kind] -= 1
+            started = timing.get("started", submitted)
+            finished = timing.get("finished", started)
+            stats = self._stats.setdefault(name, _OperationStats())
+            stats.record(started - submitted, finished - started, failed)
+
+    def metrics(self) -> Dict:
+        """Métricas por operación (tiempos de cola/ejecución) y operaciones en curso"""
+        return {
+            "read_workers": self.read_workers,
+            "in_flight": dict(self._in_flight),
+            "operations": {name: stats.as_dict() for name, stats in sorted(self._stats.items())}
+        }
+
+    def shutdown(self) -> None:
+        """Libera los hilos de los pools"""
+        self._read_pool.shutdown(wait=False)
+        self._write_pool.shutdown(wait=True)
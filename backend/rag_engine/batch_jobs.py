@@ -0,0 +1,435 @@
+"""
+Trabajos de generación por lotes (guías de estudio, respuestas de cuestionarios)
+
+Cada trabajo vive en su propio directorio dentro de `jobs_dir`:
+- input.jsonl: un prompt por línea, con su índice y opciones de RAG
+- results.jsonl: un resultado por línea, en orden de finalización
+- state.json: estado y contadores de progreso
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from . import jsoncodec
+from .text import normalize_text
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class BatchJobError(Exception):
+    """Operación inválida sobre un trabajo"""
+
+
+class BatchJobNotFoundError(BatchJobError):
+    """El trabajo no existe"""
+
+
+class BatchJobManager:
+    """
+    Ejecuta trabajos de chat por lotes en la capacidad ociosa de Ollama
+
+    - Prioridad baja: antes de cada petición se espera mientras `busy()`
+      sea True (chat interactivo en curso o Ollama no disponible); los
+      lotes usan solo la capacidad que los estudiantes dejan libre.
+    - Prefijos compartidos: los prompts se procesan en ventanas de `window`;
+      dentro de cada una se ordenan por system prompt final (con el contexto
+      RAG) para que los que comparten prefijo vayan seguidos y Ollama reuse
+      su caché de prompt.
+    - Recuperación reutilizada: las búsquedas RAG se agrupan por consulta
+      normalizada (y opciones) y se guardan en una caché LRU del trabajo;
+      la ventana siguiente se prepara mientras se genera la actual.
+    - Reanudable: cada resultado se agrega a results.jsonl al terminar; al
+      reanudar (o al reiniciar el servidor) se omiten los índices ya
+      respondidos sin error. Si un índice aparece más de una vez, vale la
+      última línea.
+    """
+
+    def __init__(
+        self,
+        jobs_dir: str,
+        generate: Callable[[str, str, Dict], Awaitable[str]],
+        retrieve: Callable[[str, Dict], Awaitable[List[Dict]]],
+        build_prompt: Callable[[str, List[Dict], str], str],
+        busy: Callable[[], bool],
+        concurrency: int = 2,
+        window: int = 64,
+        poll_interval: float = 0.25,
+        retrieval_cache_size: int = 1024
+    ):
+        """
+        Args:
+            jobs_dir: Directorio de los trabajos
+            generate: (system, prompt, opciones) -> respuesta
+            retrieve: (consulta, item) -> chunks de contexto
+            build_prompt: (consulta, chunks, system) -> system prompt con contexto
+            busy: True mientras los lotes deben ceder Ollama
+            concurrency: Peticiones simultáneas máximas de todos los lotes
+            window: Prompts que se preparan y reordenan juntos
+            poll_interval: Segundos entre chequeos de carga mientras se espera
+            retrieval_cache_size: Búsquedas RAG recordadas por trabajo
+        """
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._generate = generate
+        self._retrieve = retrieve
+        self._build_prompt = build_prompt
+        self._busy = busy
+        self.concurrency = max(1, concurrency)
+        self.window = max(1, window)
+        self.poll_interval = poll_interval
+        self.retrieval_cache_size = retrieval_cache_size
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._states: Dict[str, Dict] = {}
+        self.in_flight = 0
+        self.yielded = 0
+        self.yield_seconds = 0.0
+
+    # ==================== Archivos ====================
+
+    def _job_dir(self, job_id: str) -> Path:
+        if not _JOB_ID_RE.match(job_id or ""):
+            raise BatchJobNotFoundError(f"Trabajo inexistente: {job_id}")
+        path = self.jobs_dir / job_id
+        if not (path / "state.json").exists():
+            raise BatchJobNotFoundError(f"Trabajo inexistente: {job_id}")
+        return path
+
+    def _save_state(self, state: Dict) -> None:
+        state["updated_at"] = time.time()
+        path = self.jobs_dir / state["job_id"] / "state.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def _load_state(self, job_id: str) -> Dict:
+        if job_id not in self._states:
+            path = self._job_dir(job_id) / "state.json"
+            self._states[job_id] = json.loads(path.read_text(encoding="utf-8"))
+        return self._states[job_id]
+
+    @staticmethod
+    def _read_items(job_dir: Path) -> List[Dict]:
+        with open(job_dir / "input.jsonl", "rb") as f:
+            return [jsoncodec.loads(line) for line in f if line.strip()]
+
+    @staticmethod
+    def _answered(results_path: Path) -> Set[int]:
+        """
+        Índices ya respondidos sin error
+
+        Descarta una última línea incompleta (p. ej. por un corte durante la
+        escritura) para que las siguientes se agreguen sobre una línea limpia.
+        """
+        if not results_path.exists():
+            return set()
+        data = results_path.read_bytes()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            with open(results_path, "r+b") as f:
+                f.truncate(complete)
+        answered: Dict[int, bool] = {}
+        for line in data[:complete].splitlines():
+            try:
+                record = jsoncodec.loads(line)
+            except jsoncodec.DecodeError:
+                continue
+            answered[record["index"]] = "error" not in record
+        return {index for index, ok in answered.items() if ok}
+
+    # ==================== API ====================
+
+    async def create(self, items: List[Dict], options: Dict) -> Dict:
+        """
+        Crea un trabajo y lo pone en cola
+
+        Args:
+            items: Prompts con prompt, id (opcional) y opciones de RAG
+                (use_rag, rag_namespaces, rag_n_results, rag_filename)
+            options: system_prompt, model, temperature y num_predict del trabajo
+
+        Returns:
+            Estado inicial del trabajo
+        """
+        if not items:
+            raise BatchJobError("El trabajo no tiene prompts")
+        job_id = uuid.uuid4().hex
+        job_dir = self.jobs_dir / job_id
+        job_dir.mkdir(parents=True)
+
+        def write_input() -> None:
+            with open(job_dir / "input.jsonl", "wb") as f:
+                for index, item in enumerate(items):
+                    f.write(jsoncodec.dumps_bytes({"index": index, **item}) + b"\n")
+
+        await asyncio.to_thread(write_input)
+        now = time.time()
+        state = {
+            "job_id": job_id,
+            "status": QUEUED,
+            "options": options,
+            "total": len(items),
+            "completed": 0,
+            "failed": 0,
+            "retrieval_queries": 0,
+            "retrieval_cache_hits": 0,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "error": None
+        }
+        self._states[job_id] = state
+        self._save_state(state)
+        self._start(job_id)
+        return self.progress(job_id)
+
+    def progress(self, job_id: str) -> Dict:
+        """Estado del trabajo con porcentaje, ritmo y tiempo restante estimado"""
+        state = dict(self._load_state(job_id))
+        done = state["completed"] + state["failed"]
+        state["pending"] = state["total"] - done
+        state["percent"] = round(done / state["total"] * 100, 1) if state["total"] else 100.0
+        run = state.pop("run", None)
+        if state["status"] == RUNNING and run and run.get("done"):
+            elapsed = time.time() - run["started_at"]
+            rate = run["done"] / elapsed if elapsed > 0 else 0.0
+            state["prompts_per_minute"] = round(rate * 60, 2)
+            state["eta_seconds"] = round(state["pending"] / rate) if rate else None
+        return state
+
+    def list_jobs(self) -> List[Dict]:
+        jobs = []
+        for path in sorted(self.jobs_dir.iterdir()):
+            if (path / "state.json").exists():
+                try:
+                    jobs.append(self.progress(path.name))
+                except (BatchJobError, ValueError):
+                    continue
+        return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+    def results_path(self, job_id: str) -> Path:
+        return self._job_dir(job_id) / "results.jsonl"
+
+    def resume(self, job_id: str) -> Dict:
+        """Vuelve a poner en cola un trabajo interrumpido, fallido o cancelado"""
+        state = self._load_state(job_id)
+        if job_id in self._tasks:
+            raise BatchJobError("El trabajo ya está en ejecución")
+        if state["status"] == COMPLETED and not state["failed"]:
+            raise BatchJobError("El trabajo ya terminó")
+        state["status"] = QUEUED
+        state["error"] = None
+        self._save_state(state)
+        self._start(job_id)
+        return self.progress(job_id)
+
+    async def cancel(self, job_id: str) -> Dict:
+        state = self._load_state(job_id)
+        task = self._tasks.get(job_id)
+        if task is None and state["status"] not in ACTIVE:
+            raise BatchJobError(f"El trabajo no está activo ({state['status']})")
+        state["status"] = CANCELLED
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._save_state(state)
+        return self.progress(job_id)
+
+    def resume_interrupted(self) -> List[str]:
+        """Reanuda los trabajos que quedaron en cola o en ejecución (p. ej. tras un reinicio)"""
+        resumed = []
+        for path in sorted(self.jobs_dir.iterdir()):
+            if not (path / "state.json").exists():
+                continue
+            try:
+                state = self._load_state(path.name)
+            except (BatchJobError, ValueError):
+                continue
+            if state["status"] in ACTIVE and path.name not in self._tasks:
+                self._start(path.name)
+                resumed.append(path.name)
+        return resumed
+
+    async def stop(self) -> None:
+        """Detiene los trabajos en curso sin cambiar su estado (se reanudan al arrancar)"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def metrics(self) -> Dict:
+        statuses: Dict[str, int] = {}
+        for state in self._states.values():
+            statuses[state["status"]] = statuses.get(state["status"], 0) + 1
+        return {
+            "running": len(self._tasks),
+            "jobs": statuses,
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+            "yielded_to_interactive": self.yielded,
+            "yield_seconds": round(self.yield_seconds, 1)
+        }
+
+    # ==================== Ejecución ====================
+
+    def _start(self, job_id: str) -> None:
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job_id: str) -> None:
+        state = self._load_state(job_id)
+        job_dir = self.jobs_dir / job_id
+        results_path = job_dir / "results.jsonl"
+        prepared: Optional[asyncio.Task] = None
+        try:
+            items = await asyncio.to_thread(self._read_items, job_dir)
+            answered = await asyncio.to_thread(self._answered, results_path)
+            pending = [item for item in items if item["index"] not in answered]
+            # Los contadores se recalculan: los fallidos se reintentan
+            state.update(status=RUNNING, completed=len(answered), failed=0, finished_at=None)
+            state["started_at"] = state["started_at"] or time.time()
+            state["run"] = {"started_at": time.time(), "done": 0}
+            self._save_state(state)
+
+            cache: "OrderedDict[Tuple, List[Dict]]" = OrderedDict()
+            windows = [pending[i:i + self.window] for i in range(0, len(pending), self.window)]
+            with open(results_path, "ab") as results:
+                prepared = asyncio.create_task(self._prepare(state, windows[0], cache)) if windows else None
+                for position in range(len(windows)):
+                    batch = await prepared
+                    # La recuperación de la ventana siguiente corre mientras se genera esta
+                    prepared = (
+                        asyncio.create_task(self._prepare(state, windows[position + 1], cache))
+                        if position + 1 < len(windows) else None
+                    )
+                    await self._generate_window(state, batch, results)
+            state["status"] = COMPLETED
+            state["finished_at"] = time.time()
+        except asyncio.CancelledError:
+            if prepared is not None:
+                prepared.cancel()
+            self._save_state(state)
+            raise
+        except Exception as e:  # noqa: BLE001
+            if prepared is not None:
+                prepared.cancel()
+            state["status"] = FAILED
+            state["error"] = f"{type(e).__name__}: {e}"
+            print(f"❌ Trabajo por lotes {job_id} falló: {state['error']}")
+        state.pop("run", None)
+        self._save_state(state)
+
+    async def _prepare(self, state: Dict, window: List[Dict], cache: "OrderedDict") -> List[Tuple[Dict, str, List[Dict]]]:
+        """
+        System prompt final y contexto de cada prompt de la ventana, ordenados
+        para que los que comparten prefijo queden juntos
+        """
+        system = state["options"]["system_prompt"]
+        keys: Dict[Tuple, List[Dict]] = {}
+        searches = asyncio.Semaphore(self.concurrency)
+        for item in window:
+            if item.get("use_rag"):
+                keys.setdefault(self._retrieval_key(item), []).append(item)
+
+        async def lookup(key: Tuple, item: Dict) -> None:
+            state["retrieval_queries"] += 1
+            if key in cache:
+                cache.move_to_end(key)
+                state["retrieval_cache_hits"] += 1
+                return
+            async with searches:
+                # Las búsquedas también usan Ollama (embeddings): ceden igual
+                await self._wait_for_idle()
+                try:
+                    chunks = await self._retrieve(item["prompt"], item)
+                except Exception as e:  # noqa: BLE001
+                    print(f"⚠️  Recuperación fallida en lote: {e}")
+                    chunks = []
+            cache[key] = chunks
+            while len(cache) > self.retrieval_cache_size:
+                cache.popitem(last=False)
+
+        await asyncio.gather(*(lookup(key, items[0]) for key, items in keys.items()))
+        # Prompts similares de la misma ventana comparten una búsqueda
+        state["retrieval_queries"] += sum(len(items) - 1 for items in keys.values())
+        state["retrieval_cache_hits"] += sum(len(items) - 1 for items in keys.values())
+
+        prepared = []
+        for item in window:
+            chunks = cache.get(self._retrieval_key(item), []) if item.get("use_rag") else []
+            final_system = self._build_prompt(item["prompt"], chunks, system) if chunks else system
+            prepared.append((item, final_system, chunks))
+        prepared.sort(key=lambda entry: hashlib.sha1(entry[1].encode("utf-8")).digest())
+        return prepared
+
+    @staticmethod
+    def _retrieval_key(item: Dict) -> Tuple:
+        return (
+            normalize_text(item["prompt"]),
+            tuple(item.get("rag_namespaces") or ()),
+            item.get("rag_n_results"),
+            item.get("rag_filename")
+        )
+
+    async def _wait_for_idle(self) -> None:
+        """Espera a que Ollama quede libre de peticiones interactivas"""
+        if not self._busy():
+            return
+        self.yielded += 1
+        started = time.perf_counter()
+        while self._busy():
+            await asyncio.sleep(self.poll_interval)
+        self.yield_seconds += time.perf_counter() - started
+
+    async def _generate_window(self, state: Dict, batch: List[Tuple[Dict, str, List[Dict]]], results) -> None:
+        options = state["options"]
+        queue: "asyncio.Queue" = asyncio.Queue()
+        for entry in batch:
+            queue.put_nowait(entry)
+
+        async def worker() -> None:
+            while not queue.empty():
+                item, system, chunks = queue.get_nowait()
+                async with self._slots:
+                    await self._wait_for_idle()
+                    self.in_flight += 1
+                    started = time.perf_counter()
+                    try:
+                        response = await self._generate(system, item["prompt"], options)
+                        record = {"index": item["index"], "response": response}
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:  # noqa: BLE001
+                        record = {"index": item["index"], "error": f"{type(e).__name__}: {e}"}
+                    finally:
+                        self.in_flight -= 1
+                if item.get("id") is not None:
+                    record["id"] = item["id"]
+                if chunks:
+                    record["sources"] = list({
+                        (chunk["filename"], chunk["page"]): {"filename": chunk["filename"], "page": chunk["page"]}
+                        for chunk in chunks
+                    }.values())
+                record["seconds"] = round(time.perf_counter() - started, 3)
+                results.write(jsoncodec.dumps_bytes(record) + b"\n")
+                results.flush()
+                state["failed" if "error" in record else "completed"] += 1
+                state["run"]["done"] += 1
+                self._save_state(state)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(batch)))))
@@ -1,8 +1,9 @@
 """
 Módulo para dividir texto en chunks y crear embeddings
 """
+import asyncio
 import re
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 import numpy as np
 
 
@@ -101,15 +102,48 @@ class TextChunker:
 
 
 class EmbeddingGenerator:
-    """Genera embeddings usando Ollama localmente"""
+    """Genera embeddings usando Ollama localmente (o un modelo en este proceso)"""
     
-    def __init__(self, model: str = "nomic-embed-text"):
+    def __init__(
+        self,
+        model: str = "nomic-embed-text",
+        base_url: str = "http://127.0.0.1:11434",
+        pool=None,
+        keep_alive=None,
+        local=None
+    ):
         """
         Args:
             model: Modelo de embeddings de Ollama (nomic-embed-text, mxbai-embed-large)
+            base_url: URL base del servidor Ollama (si no se usa un pool)
+            pool: OllamaPool de embeddings; reemplaza a base_url y reparte
+                las peticiones entre varias instancias
+            keep_alive: keep_alive que se envía a Ollama en cada petición
+                (None = el de Ollama, que descarga el modelo a los 5 minutos)
+            local: LocalEmbedder que reemplaza a Ollama (ver
+                embedding_backends); `model` sigue identificando al modelo
+                en el índice y los snapshots
         """
         self.model = model
-        self.dimension = 768  # nomic-embed-text usa 768 dimensiones
+        self.base_url = base_url.rstrip("/")
+        self.pool = pool
+        self.keep_alive = keep_alive
+        self.local = local
+        # La dimensión se detecta con la primera respuesta del modelo
+        self.dimension: Optional[int] = None
+    
+    async def detect_dimension(self) -> int:
+        """
+        Consulta al modelo para conocer la dimensión de sus embeddings
+        
+        Returns:
+            Cantidad de dimensiones que produce el modelo
+        """
+        if self.dimension is None:
+            await self.generate_embedding("dimension")
+        if self.dimension is None:
+            raise RuntimeError(f"No se pudo detectar la dimensión del modelo {self.model}")
+        return self.dimension
     
     async def generate_embedding(self, text: str) -> np.ndarray:
         """
@@ -120,19 +154,94 @@ class EmbeddingGenerator:
         """
         import httpx
         
+        if self.local is not None:
+            return self._check_embedding(await self.local.embed(text))
+        if self.pool is not None:
+            return await self._embed_with_client(None, text)
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            return await self._embed_with_client(client, text)
+    
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        max_concurrency: int = 8
+    ) -> List[np.ndarray]:
+        """
+        Genera embeddings para varios textos reutilizando una sola conexión
+        
+        Las peticiones se envían en paralelo (acotadas por max_concurrency)
+        sobre el mismo pool de conexiones. Se usa /api/embeddings y no el
+        endpoint por lotes /api/embed porque este último normaliza los vectores
+        y los haría incompatibles con los ya indexados.
+        
+        Args:
+            texts: Lista de textos
+            max_concurrency: Peticiones simultáneas máximas hacia Ollama
+        
+        Returns:
+            Lista de embeddings en el mismo orden que texts
+        """
+        import httpx
+        
+        if not texts:
+            return []
+        
+        if self.local is not None:
+            vectors = await self.local.embed_many(texts, batch_size=max(max_concurrency, self.local.max_batch))
+            return [self._check_embedding(vector) for vector in vectors]
+        
+        # La primera llamada fija la dimensión para los vectores de error
+        if self.dimension is None:
+            await self.detect_dimension()
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def embed(client, text: str) -> np.ndarray:
+            async with semaphore:
+                return await self._embed_with_client(client, text)
+        
+        if self.pool is not None:
+            # El pool ya comparte un cliente entre todas las instancias
+            return list(await asyncio.gather(*(embed(None, text) for text in texts)))
+        
+        limits = httpx.Limits(max_connections=max_concurrency)
+        async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+            return list(await asyncio.gather(*(embed(client, text) for text in texts)))
+    
+    async def _embed_with_client(self, client, text: str) -> np.ndarray:
+        """Genera un embedding usando un cliente HTTP ya abierto (o el pool)"""
+        payload = {"model": self.model, "prompt": text}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "http://127.0.0.1:11434/api/embeddings",
-                    json={"model": self.model, "prompt": text}
-                )
+            if self.pool is not None:
+                response = await self.pool.post("/api/embeddings", payload, model=self.model)
+            else:
+                response = await client.post(f"{self.base_url}/api/embeddings", json=payload)
                 response.raise_for_status()
-                data = response.json()
-                return np.array(data["embedding"], dtype=np.float32)
+            data = response.json()
+            embedding = np.array(data["embedding"], dtype=np.float32)
         except Exception as e:
             print(f"Error generando embedding: {e}")
+            if self.dimension is None:
+                # Sin dimensión conocida no hay un vector cero válido que retornar
+                raise RuntimeError(f"Modelo de embeddings {self.model} no disponible") from e
             # Retornar embedding cero en caso de error
             return np.zeros(self.dimension, dtype=np.float32)
+        
+        return self._check_embedding(embedding)
+    
+    def _check_embedding(self, embedding: np.ndarray) -> np.ndarray:
+        """Fija la dimensión con el primer embedding y rechaza cambios posteriores"""
+        if embedding.size == 0:
+            raise RuntimeError(f"El modelo {self.model} retornó un embedding vacío")
+        if self.dimension is None:
+            self.dimension = int(embedding.shape[0])
+        elif embedding.shape[0] != self.dimension:
+            raise RuntimeError(
+                f"El modelo {self.model} cambió de dimensión: {self.dimension} → {embedding.shape[0]}"
+            )
+        return embedding
     
     async def generate_embeddings_batch(
         self, 
@@ -150,13 +259,25 @@ class EmbeddingGenerator:
             Lista de embeddings
         """
         embeddings = []
+        if self.local is not None:
+            # Un modelo local rinde más con lotes grandes
+            batch_size = max(batch_size, self.local.max_batch)
         
         for i in range(0, len(texts), batch_size):
             batch = texts[i:i + batch_size]
             print(f"Generando embeddings {i+1}-{min(i+batch_size, len(texts))} de {len(texts)}...")
             
-            for text in batch:
-                embedding = await self.generate_embedding(text)
-                embeddings.append(embedding)
+            embeddings.extend(await self.generate_embeddings(batch, max_concurrency=batch_size))
         
         return embeddings
+    
+    def describe(self) -> Dict:
+        """Backend en uso y su estado (para /rag/stats)"""
+        if self.local is not None:
+            return {"backend": "local", **self.local.metrics()}
+        return {"backend": "ollama", "pool": self.pool is not None}
+    
+    def close(self) -> None:
+        """Detiene el hilo o proceso del modelo local (si hay)"""
+        if self.local is not None:
+            self.local.close()
@@ -0,0 +1,305 @@
+"""
+Eliminación de chunks casi duplicados antes de generar los embeddings
+"""
+import json
+import time
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .text import normalize_text
+
+_MASK = (1 << 64) - 1
+# Marca booleana por archivo fuente: Chroma no puede filtrar dentro del JSON de `sources`
+SOURCE_FLAG_PREFIX = "source:"
+
+
+def shingles(text: str, size: int = 3) -> FrozenSet[int]:
+    """
+    Shingles de `size` palabras normalizadas, como hashes de 64 bits
+
+    hash() de str cambia entre procesos (PYTHONHASHSEED): los shingles solo
+    se comparan dentro de una misma ejecución y no se guardan.
+    """
+    words = normalize_text(text).split()
+    if len(words) <= size:
+        return frozenset([hash(" ".join(words)) & _MASK])
+    return frozenset(hash(" ".join(words[i:i + size])) & _MASK for i in range(len(words) - size + 1))
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def chunk_sources(metadata: Dict) -> List[Dict]:
+    """
+    Ubicaciones (filename, page, chunk_id) que comparten el texto de un chunk
+
+    Los chunks sin duplicados solo tienen la propia.
+    """
+    if metadata.get("sources"):
+        return json.loads(metadata["sources"])
+    return [{"filename": metadata["filename"], "page": metadata["page"], "chunk_id": metadata["chunk_id"]}]
+
+
+def set_chunk_sources(metadata: Dict, sources: List[Dict]) -> None:
+    """
+    Guarda las ubicaciones en la metadata (Chroma solo admite valores escalares)
+
+    Además marca `source:<archivo>` = True por cada archivo fuente para poder
+    filtrar por cualquiera de ellos (ver filename_where). Las marcas de los
+    archivos que dejaron de ser fuente quedan en False: Chroma combina la
+    metadata al actualizar en lugar de reemplazarla.
+    """
+    metadata["duplicate_count"] = len(sources)
+    metadata["sources"] = json.dumps(sources, ensure_ascii=False)
+    for key in [key for key in metadata if key.startswith(SOURCE_FLAG_PREFIX)]:
+        metadata[key] = False
+    for source in sources:
+        metadata[SOURCE_FLAG_PREFIX + source["filename"]] = True
+
+
+def filename_where(filename: str) -> Dict:
+    """Filtro de Chroma para los chunks de un archivo, incluidos los deduplicados que lo citan"""
+    return {"$or": [{"filename": filename}, {SOURCE_FLAG_PREFIX + filename: True}]}
+
+
+class ChunkDeduplicator:
+    """
+    Agrupa chunks casi idénticos (encabezados repetidos, el mismo capítulo en
+    dos ediciones, solapamientos) para embeber y guardar uno solo
+
+    Cada chunk se representa por sus shingles de palabras y una firma MinHash.
+    La firma se divide en bandas (LSH): solo se comparan los chunks que
+    coinciden por completo en alguna banda, y el par se confirma con la
+    similitud de Jaccard exacta de los shingles (>= `threshold`). Con 32
+    bandas de 4 filas un par con Jaccard 0.8 queda como candidato con
+    probabilidad > 99.9 %.
+
+    Se conserva la primera aparición; su metadata recibe `duplicate_count` y
+    `sources` (JSON con filename, page y chunk_id de cada aparición) para
+    poder citar todas las fuentes.
+    """
+
+    def __init__(self, threshold: float = 0.8, shingle_size: int = 3, bands: int = 32, rows: int = 4):
+        """
+        Args:
+            threshold: Jaccard mínima entre shingles para considerar duplicados
+            shingle_size: Palabras por shingle
+            bands: Bandas de la firma MinHash
+            rows: Valores por banda (la firma tiene bands * rows valores)
+        """
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold debe estar entre 0 y 1")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.default_rng(0)
+        size = bands * rows
+        # Permutaciones aproximadas h -> a*h + b (mod 2^64) con a impar
+        self._a = rng.integers(1, 2 ** 63, size=size, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=size, dtype=np.uint64)
+
+    def signature(self, chunk_shingles: FrozenSet[int]) -> np.ndarray:
+        hashes = np.fromiter(chunk_shingles, dtype=np.uint64, count=len(chunk_shingles))
+        with np.errstate(over="ignore"):
+            return (hashes[:, None] * self._a + self._b).min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def deduplicate_against(
+        self,
+        index: "DedupIndex",
+        chunks: List[Dict],
+        replacing: Set[str]
+    ) -> Tuple[List[Dict], List[Tuple[str, Dict]], Dict]:
+        """
+        Deduplica contra los chunks ya guardados y luego entre los recibidos
+
+        Args:
+            index: Firmas de los chunks guardados en la generación destino
+            chunks: Chunks con text y metadata (filename, page, chunk_id)
+            replacing: Archivos que se re-indexan (sus chunks guardados se
+                reemplazan, así que no cuentan como originales)
+
+        Returns:
+            (chunks conservados, [(ID guardado, ubicación a agregar)], estadísticas)
+        """
+        started = time.perf_counter()
+        pending: List[Dict] = []
+        attached: List[Tuple[str, Dict]] = []
+        for chunk in chunks:
+            metadata = chunk["metadata"]
+            signature = self.signature(shingles(chunk["text"], self.shingle_size))
+            match = index.match(signature, replacing)
+            if match is None:
+                pending.append(chunk)
+                continue
+            attached.append((match, {
+                "filename": metadata["filename"], "page": metadata["page"], "chunk_id": metadata["chunk_id"]
+            }))
+
+        kept, stats = self.deduplicate(pending)
+        stats.update({
+            "chunks": len(chunks),
+            "duplicates_removed": len(chunks) - len(kept),
+            "matched_stored": len(attached),
+            "seconds": round(time.perf_counter() - started, 3)
+        })
+        return kept, attached, stats
+
+    def deduplicate(self, chunks: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """
+        Args:
+            chunks: Chunks con text y metadata (filename, page, chunk_id)
+
+        Returns:
+            (chunks conservados, estadísticas)
+        """
+        started = time.perf_counter()
+        kept: List[Dict] = []
+        sources: List[List[Dict]] = []
+        kept_shingles: List[FrozenSet[int]] = []
+        buckets: Dict[Tuple[int, bytes], List[int]] = {}
+
+        for chunk in chunks:
+            metadata = chunk["metadata"]
+            location = {"filename": metadata["filename"], "page": metadata["page"], "chunk_id": metadata["chunk_id"]}
+            chunk_shingles = shingles(chunk["text"], self.shingle_size)
+            keys = self._band_keys(self.signature(chunk_shingles))
+
+            candidates = sorted({index for key in keys for index in buckets.get(key, ())})
+            match: Optional[int] = next(
+                (index for index in candidates if jaccard(chunk_shingles, kept_shingles[index]) >= self.threshold),
+                None
+            )
+            if match is not None:
+                sources[match].append(location)
+                continue
+
+            index = len(kept)
+            kept.append(chunk)
+            sources.append([location])
+            kept_shingles.append(chunk_shingles)
+            for key in keys:
+                buckets.setdefault(key, []).append(index)
+
+        for chunk, locations in zip(kept, sources):
+            # Copia: la metadata original puede compartirse con el llamador
+            metadata = dict(chunk["metadata"])
+            if len(locations) > 1:
+                set_chunk_sources(metadata, locations)
+            else:
+                metadata["duplicate_count"] = 1
+            chunk["metadata"] = metadata
+
+        stats = {
+            "chunks": len(chunks),
+            "kept": len(kept),
+            "duplicates_removed": len(chunks) - len(kept),
+            "groups": sum(len(locations) > 1 for locations in sources),
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+        return kept, stats
+
+
+class DedupIndex:
+    """
+    Firmas MinHash/LSH de los chunks guardados en una generación
+
+    Permite que la indexación incremental (index_file, subidas, observador)
+    deduplique contra lo que ya está en el índice y no solo entre los PDFs de
+    una misma llamada. Como los shingles dependen de hash() del proceso, el
+    índice vive en memoria: se arma desde los textos guardados la primera vez
+    que se necesita y después se actualiza con cada escritura. Para no
+    conservar los shingles, la similitud con un chunk guardado se estima con
+    la fracción de valores iguales de las firmas (error típico ~0.04 con 128).
+    """
+
+    def __init__(self, deduplicator: ChunkDeduplicator, generation: str):
+        self.deduplicator = deduplicator
+        self.generation = generation
+        # ID -> {"signature", "sources"}
+        self._entries: Dict[str, Dict] = {}
+        self._buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add_many(self, ids: List[str], texts: List[str], metadatas: List[Dict]) -> None:
+        """Registra chunks guardados (con sus fuentes)"""
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            signature = self.deduplicator.signature(shingles(text, self.deduplicator.shingle_size))
+            self._insert(doc_id, {"signature": signature, "sources": chunk_sources(metadata)})
+
+    def _insert(self, doc_id: str, entry: Dict) -> None:
+        self._entries[doc_id] = entry
+        for key in self.deduplicator._band_keys(entry["signature"]):
+            self._buckets.setdefault(key, set()).add(doc_id)
+
+    def _remove(self, doc_id: str) -> Dict:
+        entry = self._entries.pop(doc_id)
+        for key in self.deduplicator._band_keys(entry["signature"]):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[key]
+        return entry
+
+    def match(self, signature: np.ndarray, replacing: Set[str]) -> Optional[str]:
+        """
+        ID del chunk guardado casi idéntico (None si no hay)
+
+        No se consideran los chunks cuyas fuentes son todas archivos que se
+        están re-indexando: se borran antes de guardar los nuevos.
+        """
+        candidates = sorted({
+            doc_id for key in self.deduplicator._band_keys(signature)
+            for doc_id in self._buckets.get(key, ())
+        })
+        for doc_id in candidates:
+            entry = self._entries[doc_id]
+            if all(source["filename"] in replacing for source in entry["sources"]):
+                continue
+            if float(np.mean(entry["signature"] == signature)) >= self.deduplicator.threshold:
+                return doc_id
+        return None
+
+    def attach(self, doc_id: str, location: Dict) -> None:
+        """Agrega una ubicación a las fuentes de un chunk guardado"""
+        self._entries[doc_id]["sources"].append(location)
+
+    def release(self, filenames: Set[str]) -> Dict[str, str]:
+        """
+        Quita archivos de las fuentes, con el mismo criterio que
+        RAGEngine._release_duplicates: los chunks sin fuentes restantes se
+        eliminan y los guardados a nombre de un archivo quitado pasan a la
+        primera fuente restante (cambia su ID)
+
+        Returns:
+            Dict ID anterior -> ID nuevo de los chunks que cambiaron de dueño
+        """
+        renamed: Dict[str, str] = {}
+        for doc_id in list(self._entries):
+            sources = self._entries[doc_id]["sources"]
+            remaining = [source for source in sources if source["filename"] not in filenames]
+            if len(remaining) == len(sources):
+                continue
+            if not remaining:
+                self._remove(doc_id)
+                continue
+            self._entries[doc_id]["sources"] = remaining
+            if doc_id.split("::", 1)[0] in filenames:
+                owner = remaining[0]
+                new_id = f"{owner['filename']}::{owner['chunk_id']}"
+                self._insert(new_id, self._remove(doc_id))
+                renamed[doc_id] = new_id
+        return renamed
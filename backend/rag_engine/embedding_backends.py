@@ -0,0 +1,289 @@
+"""
+Modelos de embeddings locales (en proceso) con micro-batching de consultas
+
+Alternativa a pedir cada embedding a Ollama: el modelo corre en un hilo o en
+un proceso worker de este backend y las consultas que llegan con pocos
+milisegundos de diferencia se calculan en un solo lote.
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import re
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class EmbeddingModel(ABC):
+    """Interfaz común: textos -> matriz float32 (un vector por fila)"""
+
+    name = ""
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        ...
+
+
+class SentenceTransformerModel(EmbeddingModel):
+    """
+    Modelo de sentence-transformers guardado en disco (o nombre del hub ya cacheado)
+
+    Con normalize=False y sin prefijos de tarea los vectores de
+    nomic-embed-text coinciden con los de /api/embeddings de Ollama (salvo
+    diferencias numéricas de la cuantización), así que sirven para el índice
+    existente.
+    """
+
+    name = "sentence-transformers"
+
+    def __init__(
+        self,
+        model_path: str,
+        device: str = "cpu",
+        normalize: bool = False,
+        prefix: str = "",
+        trust_remote_code: bool = True
+    ):
+        """
+        Args:
+            model_path: Directorio del modelo (o nombre ya descargado)
+            device: Dispositivo de torch ("cpu", "cuda")
+            normalize: Normalizar los vectores (Ollama no lo hace en /api/embeddings)
+            prefix: Texto antepuesto a cada entrada (p. ej. "search_query: ")
+            trust_remote_code: Necesario para modelos con código propio como nomic-embed
+        """
+        self.model_path = model_path
+        self.device = device
+        self.normalize = normalize
+        self.prefix = prefix
+        self.trust_remote_code = trust_remote_code
+        self._model = None
+
+    def _load(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(
+                self.model_path, device=self.device, trust_remote_code=self.trust_remote_code
+            )
+        return self._model
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        model = self._load()
+        if self.prefix:
+            texts = [self.prefix + text for text in texts]
+        vectors = model.encode(
+            texts,
+            batch_size=max(1, len(texts)),
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize,
+            show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class HashingModel(EmbeddingModel):
+    """
+    Modelo de juguete sin dependencias ni descargas: bolsa de palabras y
+    bigramas con hashing firmado, normalizada
+
+    Determinista entre procesos (usa blake2b, no hash()); sirve para pruebas y
+    benchmarks sin red. No es compatible con índices de otros modelos.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+
+    def _bucket(self, token: str) -> Tuple[int, float]:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dimension, 1.0 if value >> 63 else -1.0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _TOKEN_RE.findall(text.lower())
+            for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                index, sign = self._bucket(token)
+                matrix[row, index] += sign
+            norm = np.linalg.norm(matrix[row])
+            if norm:
+                matrix[row] /= norm
+        return matrix
+
+
+MODELS: Dict[str, Type[EmbeddingModel]] = {
+    model.name: model for model in (SentenceTransformerModel, HashingModel)
+}
+
+
+def create_model(kind: str, **options) -> EmbeddingModel:
+    """
+    Raises:
+        ValueError: Si el tipo de modelo no existe
+    """
+    if kind not in MODELS:
+        raise ValueError(f"Modelo de embeddings local desconocido: {kind} (opciones: {', '.join(MODELS)})")
+    return MODELS[kind](**options)
+
+
+# Modelo del proceso worker (ver LocalEmbedder con execution="process")
+_WORKER_MODEL: Optional[EmbeddingModel] = None
+
+
+def _init_worker(kind: str, options: Dict) -> None:
+    global _WORKER_MODEL
+    _WORKER_MODEL = create_model(kind, **options)
+
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    return _WORKER_MODEL.encode(texts)
+
+
+class LocalEmbedder:
+    """
+    Ejecuta un EmbeddingModel fuera del event loop y agrupa las consultas
+
+    Las llamadas a embed() esperan hasta `max_wait_ms` a que lleguen otras (o
+    hasta juntar `max_batch`) y se calculan en un solo encode(). Mientras un
+    lote se calcula, las nuevas consultas se acumulan para el siguiente, así
+    el tamaño del lote crece con la carga. embed_many() (indexación) manda
+    lotes completos directamente.
+
+    El modelo corre en un único hilo (execution="thread"; torch libera el GIL)
+    o en un proceso worker (execution="process") que lo carga al arrancar.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        options: Optional[Dict] = None,
+        execution: str = "thread",
+        max_batch: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Args:
+            kind: Tipo de modelo (ver MODELS)
+            options: Argumentos del modelo (p. ej. model_path)
+            execution: "thread" o "process"
+            max_batch: Consultas máximas por lote
+            max_wait_ms: Espera máxima de una consulta para juntar un lote
+        """
+        if execution not in ("thread", "process"):
+            raise ValueError("execution debe ser 'thread' o 'process'")
+        self.kind = kind
+        self.options = dict(options or {})
+        self.execution = execution
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        # En modo proceso el modelo se crea en el worker; igual se valida el tipo aquí
+        if kind not in MODELS:
+            create_model(kind)
+        self._model = create_model(kind, **self.options) if execution == "thread" else None
+        self._executor: Optional[Executor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._loop = None
+        self._batches = 0
+        self._batched_queries = 0
+        self._encode_seconds = 0.0
+
+    def _ensure_executor(self) -> Executor:
+        if self._executor is None:
+            if self.execution == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.kind, self.options)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        return self._executor
+
+    async def _encode(self, texts: List[str]) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        executor = self._ensure_executor()
+        started = time.perf_counter()
+        if self.execution == "process":
+            vectors = await loop.run_in_executor(executor, _encode_in_worker, texts)
+        else:
+            vectors = await loop.run_in_executor(executor, self._model.encode, texts)
+        self._encode_seconds += time.perf_counter() - started
+        return vectors
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embedding de una consulta, calculado junto con las que lleguen a la vez"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._collector is None or self._collector.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._collector = loop.create_task(self._collect(self._queue))
+        future = loop.create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def _collect(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            batch = [(text, future) for text, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+            try:
+                vectors = await self._encode([text for text, _ in batch])
+            except Exception as e:  # noqa: BLE001
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self._batches += 1
+            self._batched_queries += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    async def embed_many(self, texts: List[str], batch_size: int = 32) -> List[np.ndarray]:
+        """Embeddings de muchos textos (indexación) en lotes de batch_size"""
+        vectors: List[np.ndarray] = []
+        for i in range(0, len(texts), batch_size):
+            vectors.extend(await self._encode(texts[i:i + batch_size]))
+        return vectors
+
+    def metrics(self) -> Dict:
+        return {
+            "model": self.kind,
+            "execution": self.execution,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "query_batches": self._batches,
+            "avg_query_batch": round(self._batched_queries / self._batches, 2) if self._batches else 0.0,
+            "encode_seconds": round(self._encode_seconds, 3)
+        }
+
+    def close(self) -> None:
+        if self._collector is not None and not self._collector.done():
+            self._collector.cancel()
+        self._collector = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,108 @@
+"""
+Decide si un turno del chat necesita recuperar contexto del índice RAG
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .text import normalize_text
+
+# Mensajes que no piden información: agradecimientos, saludos, confirmaciones
+SMALLTALK = {
+    "gracias", "muchas gracias", "mil gracias", "ok", "okay", "oki", "vale", "dale",
+    "listo", "perfecto", "genial", "excelente", "bien", "muy bien", "entendido",
+    "entiendo", "de acuerdo", "claro", "si", "no", "hola", "buenas", "buenos dias",
+    "buenas tardes", "buenas noches", "chau", "chao", "adios", "hasta luego", "nos vemos",
+    "jaja", "jajaja", "de nada", "bueno", "ya", "ah", "ok gracias", "listo gracias",
+    "perfecto gracias", "genial gracias", "thanks", "thank you", "hi", "hello", "bye",
+}
+class RetrievalGate:
+    """
+    Filtro barato previo a la búsqueda de contexto
+
+    Tres etapas, de la más barata a la más cara:
+    1. Heurística sobre el texto: los mensajes de cortesía o demasiado cortos
+       no se embeben ni se buscan.
+    2. Opcional: similitud coseno entre la consulta (ya embebida) y el
+       centroide del índice; si queda por debajo del umbral la consulta se
+       considera fuera de tema.
+    3. Los chunks recuperados con similitud coseno (`similarity`) menor a
+       `min_relevance` se descartan para no inflar el prompt.
+
+    Cada decisión se cuenta en metrics() para poder ajustar los umbrales.
+    """
+
+    def __init__(
+        self,
+        min_relevance: Optional[float] = None,
+        centroid_threshold: Optional[float] = None,
+        min_query_chars: int = 4,
+        smalltalk: Optional[set] = None
+    ):
+        """
+        Args:
+            min_relevance: Score mínimo de un chunk para incluirlo (None = todos)
+            centroid_threshold: Similitud mínima con el centroide del índice
+                (None = no se compara)
+            min_query_chars: Letras/dígitos mínimos para que valga la pena buscar
+            smalltalk: Frases (normalizadas) que nunca disparan una búsqueda
+        """
+        self.min_relevance = min_relevance
+        self.centroid_threshold = centroid_threshold
+        self.min_query_chars = min_query_chars
+        self.smalltalk = SMALLTALK if smalltalk is None else smalltalk
+        self._decisions: Dict[str, int] = {
+            "retrieve": 0, "too_short": 0, "smalltalk": 0, "off_topic": 0, "no_results": 0
+        }
+        self._chunks_kept = 0
+        self._chunks_dropped = 0
+
+    def record(self, decision: str) -> None:
+        self._decisions[decision] = self._decisions.get(decision, 0) + 1
+
+    def check_query(self, query: str) -> Optional[str]:
+        """
+        Etapa heurística
+
+        Returns:
+            None si conviene buscar, o el motivo por el que se omite
+        """
+        normalized = normalize_text(query)
+        if normalized in self.smalltalk:
+            reason = "smalltalk"
+        elif sum(char.isalnum() for char in normalized) < self.min_query_chars:
+            reason = "too_short"
+        else:
+            return None
+        self.record(reason)
+        return reason
+
+    def on_topic(self, query_embedding: np.ndarray, centroid: Optional[np.ndarray]) -> bool:
+        """True si la consulta se parece lo suficiente al contenido del índice"""
+        if self.centroid_threshold is None or centroid is None:
+            return True
+        norm = np.linalg.norm(query_embedding)
+        if not norm:
+            return False
+        return float(np.dot(query_embedding, centroid) / norm) >= self.centroid_threshold
+
+    def filter_chunks(self, chunks: List[Dict]) -> List[Dict]:
+        """Descarta los chunks con similarity por debajo de min_relevance y registra la decisión"""
+        if self.min_relevance is not None:
+            kept = [chunk for chunk in chunks if chunk["similarity"] >= self.min_relevance]
+        else:
+            kept = chunks
+        self._chunks_kept += len(kept)
+        self._chunks_dropped += len(chunks) - len(kept)
+        self.record("retrieve" if kept else "no_results")
+        return kept
+
+    def metrics(self) -> Dict:
+        """Decisiones tomadas y chunks conservados/descartados"""
+        return {
+            "min_relevance": self.min_relevance,
+            "centroid_threshold": self.centroid_threshold,
+            "decisions": dict(self._decisions),
+            "chunks_kept": self._chunks_kept,
+            "chunks_dropped": self._chunks_dropped
+        }
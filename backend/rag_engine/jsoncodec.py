@@ -0,0 +1,39 @@
+"""
+JSON para el camino crítico del chat: orjson si está instalado, json si no
+
+orjson parsea directamente bytes (sin decodificar a str) y serializa a bytes,
+que es lo que consumen httpx y Starlette; con json se obtiene el mismo
+resultado, solo que más lento.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+# Ambos lanzan una subclase de ValueError ante JSON inválido
+DecodeError = ValueError
+
+if orjson is not None:
+    BACKEND = "orjson"
+
+    def loads(data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+else:
+    BACKEND = "json"
+
+    def loads(data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """Como json.dumps compacto (sin escapar caracteres no ASCII)"""
+    return dumps_bytes(obj).decode("utf-8")
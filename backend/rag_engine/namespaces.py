@@ -0,0 +1,193 @@
+"""
+Namespaces del índice RAG: una colección, un directorio de PDFs y una caché por curso
+"""
+import asyncio
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from .gating import RetrievalGate
+
+DEFAULT_NAMESPACE = "default"
+DEFAULT_COLLECTION = "willay_documents"
+_NAME_PATTERN = re.compile(r"[a-z0-9][a-z0-9-]{0,47}")
+
+
+class NamespaceError(ValueError):
+    """Nombre de namespace inválido o inexistente"""
+
+
+def validate_namespace(name: Optional[str]) -> str:
+    """
+    Normaliza y valida un nombre de namespace (None equivale al por defecto)
+
+    Se admiten minúsculas, dígitos y guiones (hasta 48 caracteres), así el
+    nombre sirve tanto de subdirectorio como de sufijo de colección en Chroma.
+    """
+    name = (name or DEFAULT_NAMESPACE).strip().lower()
+    if not _NAME_PATTERN.fullmatch(name):
+        raise NamespaceError(f"Namespace inválido: {name!r} (usa minúsculas, dígitos y guiones)")
+    return name
+
+
+def namespace_paths(name: str, pdf_dir: str = "rag", cache_dir: str = "backend/rag_engine/cache") -> Dict[str, str]:
+    """
+    Ubicaciones de un namespace
+
+    El namespace por defecto conserva rag/, la caché y la colección de
+    siempre; los demás usan rag/<nombre>/, cache/<nombre>/ y la colección
+    willay_documents_<nombre> dentro del mismo vector store.
+    """
+    name = validate_namespace(name)
+    if name == DEFAULT_NAMESPACE:
+        return {"pdf_dir": pdf_dir, "cache_dir": cache_dir, "collection_name": DEFAULT_COLLECTION}
+    return {
+        "pdf_dir": str(Path(pdf_dir) / name),
+        "cache_dir": str(Path(cache_dir) / name),
+        "collection_name": f"{DEFAULT_COLLECTION}_{name}"
+    }
+
+
+class NamespaceRegistry:
+    """
+    Mantiene un RAGEngine por namespace, creado al primer uso
+
+    Cada namespace tiene su propia colección (y generaciones), así las
+    búsquedas, estadísticas, borrados y reconstrucciones de un curso no
+    recorren ni afectan a los demás. La búsqueda en varios namespaces
+    embebe la consulta una sola vez y combina los mejores resultados.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], object],
+        default_engine=None,
+        pdf_dir: str = "rag"
+    ):
+        """
+        Args:
+            factory: Función (bloqueante) que crea el RAGEngine de un namespace
+            default_engine: Motor ya creado para el namespace por defecto
+            pdf_dir: Directorio raíz de PDFs (los namespaces son subdirectorios)
+        """
+        self._factory = factory
+        self.pdf_dir = Path(pdf_dir)
+        self._engines: Dict[str, object] = {}
+        if default_engine is not None:
+            self._engines[DEFAULT_NAMESPACE] = default_engine
+        self._lock = asyncio.Lock()
+
+    @property
+    def default(self):
+        return self._engines.get(DEFAULT_NAMESPACE)
+
+    def names(self) -> List[str]:
+        """Namespaces existentes: el por defecto y cada subdirectorio válido de pdf_dir"""
+        names = {DEFAULT_NAMESPACE, *self._engines}
+        if self.pdf_dir.exists():
+            for path in self.pdf_dir.iterdir():
+                if path.is_dir() and _NAME_PATTERN.fullmatch(path.name):
+                    names.add(path.name)
+        return sorted(names, key=lambda name: (name != DEFAULT_NAMESPACE, name))
+
+    def exists(self, name: str) -> bool:
+        return validate_namespace(name) in self.names()
+
+    def loaded(self) -> Dict[str, object]:
+        """Motores ya creados (no crea los que falten)"""
+        return dict(self._engines)
+
+    async def get(self, name: Optional[str] = None, create: bool = False):
+        """
+        Retorna el motor de un namespace
+
+        Args:
+            name: Namespace (None = por defecto)
+            create: Crear el namespace si todavía no existe
+
+        Raises:
+            NamespaceError: Si el nombre es inválido o el namespace no existe
+        """
+        name = validate_namespace(name)
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+        if not create and not self.exists(name):
+            raise NamespaceError(f"Namespace inexistente: {name}")
+
+        async with self._lock:
+            engine = self._engines.get(name)
+            if engine is None:
+                engine = await asyncio.to_thread(self._factory, name)
+                self._engines[name] = engine
+        return engine
+
+    async def search(
+        self,
+        query: str,
+        namespaces: List[str],
+        n_results: int = 5,
+        filename_filter: Optional[str] = None,
+        gate: Optional["RetrievalGate"] = None
+    ) -> List[Dict]:
+        """
+        Busca en varios namespaces y combina los `n_results` mejores
+
+        Cada chunk resultante incluye el namespace de origen. Los namespaces
+        sin documentos se omiten. Con `gate` se omiten además los namespaces
+        cuyo centroide no se parece a la consulta y se descartan los chunks
+        poco relevantes.
+        """
+        engines = {}
+        for name in dict.fromkeys(validate_namespace(name) for name in namespaces):
+            engine = await self.get(name)
+            if await engine.is_indexed():
+                engines[name] = engine
+        if not engines:
+            return []
+
+        # La consulta se embebe una vez (todos comparten el modelo)
+        first = next(iter(engines.values()))
+        query_embedding = await first.embedding_generator.generate_embedding(query)
+
+        if gate is not None and gate.centroid_threshold is not None:
+            engines = {
+                name: engine for name, engine in engines.items()
+                if gate.on_topic(engine.projector.transform(query_embedding), await engine.get_centroid())
+            }
+            if not engines:
+                gate.record("off_topic")
+                return []
+
+        per_namespace = await asyncio.gather(*(
+            engine.search_by_embedding(query_embedding, n_results, filename_filter)
+            for engine in engines.values()
+        ))
+
+        merged = []
+        for name, chunks in zip(engines, per_namespace):
+            for chunk in chunks:
+                chunk["namespace"] = name
+                merged.append(chunk)
+        merged.sort(key=lambda chunk: chunk["similarity"], reverse=True)
+        if gate is not None:
+            merged = gate.filter_chunks(merged)
+
+        top = merged[:n_results]
+        for rank, chunk in enumerate(top, 1):
+            chunk["rank"] = rank
+        return top
+
+    async def get_stats(self) -> Dict[str, Dict]:
+        """Resumen por namespace (chunks y archivos de la generación activa)"""
+        summary = {}
+        for name in self.names():
+            engine = await self.get(name)
+            stats = await engine.store.get_stats()
+            summary[name] = {
+                "total_chunks": stats["total_chunks"],
+                "total_files": stats["total_files"],
+                "generation": engine.vector_store.active_generation
+            }
+        return summary
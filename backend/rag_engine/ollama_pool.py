@@ -0,0 +1,402 @@
+"""
+Pool de instancias locales de Ollama con balanceo y chequeo de salud
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+
+
+class NoHealthyEndpointError(httpx.TransportError):
+    """Ninguna instancia del pool está disponible"""
+
+
+def _model_key(model: str) -> str:
+    # Ollama reporta "llama3.2:latest" aunque se pida "llama3.2"
+    return model if ":" in model else f"{model}:latest"
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class OllamaEndpoint:
+    """
+    Estado de una instancia de Ollama dentro del pool (con su circuit breaker)
+
+    closed: recibe peticiones normalmente.
+    open: expulsada; las peticiones no la eligen hasta `ejected_until`.
+    half_open: pasado ese tiempo (o tras un chequeo activo correcto) admite
+    una sola petición de prueba; si funciona se cierra, si falla se reabre.
+    """
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.tripped = False
+        self.trial_in_flight = False
+        self.models: Set[str] = set()
+        self.last_error: Optional[str] = None
+        self.last_check: Optional[float] = None
+        self.last_check_ok: Optional[bool] = None
+
+    @property
+    def state(self) -> str:
+        if time.monotonic() < self.ejected_until:
+            return OPEN
+        return HALF_OPEN if self.tripped else CLOSED
+
+    @property
+    def available(self) -> bool:
+        """Puede recibir la próxima petición"""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self.trial_in_flight)
+
+    def has_model(self, model: Optional[str]) -> bool:
+        return model is not None and _model_key(model) in self.models
+
+    def as_dict(self) -> Dict:
+        return {
+            "url": self.url,
+            "state": self.state,
+            "available": self.available,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "ejected_for_seconds": round(max(0.0, self.ejected_until - time.monotonic()), 1),
+            "models": sorted(self.models),
+            "last_error": self.last_error,
+            "last_check": self.last_check,
+            "last_check_ok": self.last_check_ok
+        }
+
+
+class OllamaPool:
+    """
+    Reparte peticiones entre varias instancias de Ollama
+
+    - Se elige la instancia con menos peticiones en curso, prefiriendo las
+      que ya tienen el modelo cargado (según /api/ps y las respuestas
+      exitosas) para no pagar la carga del modelo en otra.
+    - Circuit breaker por instancia: tras `eject_after` fallas seguidas
+      (conexión, timeout o 5xx) la instancia se abre por `eject_seconds`;
+      luego pasa a half-open y una petición de prueba decide si se cierra.
+      Si todas están abiertas las peticiones fallan al instante con
+      NoHealthyEndpointError en lugar de esperar el timeout.
+    - Chequeo activo: cada `health_interval` segundos se consulta /api/ps en
+      todas; el resultado queda cacheado para /health, un fallo abre el
+      circuito y una respuesta correcta lo pasa a half-open.
+
+    Todas las peticiones comparten un único cliente HTTP (pool de conexiones).
+    Chat y embeddings usan pools distintos para que las indexaciones no
+    compitan con las respuestas del chat.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        name: str = "ollama",
+        timeout: Optional[httpx.Timeout] = None,
+        eject_after: int = 3,
+        eject_seconds: float = 30.0,
+        health_interval: float = 10.0,
+        max_connections: int = 100
+    ):
+        """
+        Args:
+            urls: URLs base de las instancias (p. ej. http://127.0.0.1:11434)
+            name: Nombre del pool (para logs y métricas)
+            timeout: Timeout de las peticiones
+            eject_after: Fallas seguidas antes de expulsar una instancia
+            eject_seconds: Tiempo que una instancia expulsada queda fuera
+            health_interval: Segundos entre chequeos activos (0 = sin chequeo)
+            max_connections: Conexiones máximas del cliente compartido
+        """
+        if not urls:
+            raise ValueError("El pool necesita al menos una URL de Ollama")
+        self.name = name
+        self.endpoints = [OllamaEndpoint(url) for url in dict.fromkeys(urls)]
+        self.timeout = timeout or httpx.Timeout(60.0, connect=10.0)
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._next = 0
+        self.rejected = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Cliente HTTP compartido (se crea al primer uso)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections)
+            )
+        return self._client
+
+    # ==================== Selección ====================
+
+    def pick(self, model: Optional[str] = None, exclude: Optional[Set[str]] = None) -> OllamaEndpoint:
+        """
+        Instancia para la próxima petición
+
+        Raises:
+            NoHealthyEndpointError: Si todas están expulsadas (o excluidas)
+        """
+        candidates = [
+            endpoint for endpoint in self.endpoints
+            if endpoint.available and endpoint.url not in (exclude or ())
+        ]
+        if not candidates:
+            self.rejected += 1
+            raise NoHealthyEndpointError(f"Sin instancias de Ollama disponibles en el pool {self.name}")
+        with_model = [endpoint for endpoint in candidates if endpoint.has_model(model)]
+        if with_model:
+            candidates = with_model
+
+        # Menos peticiones en curso; los empates se reparten en ronda
+        self._next = (self._next + 1) % len(self.endpoints)
+        offset = self._next
+        return min(
+            candidates,
+            key=lambda endpoint: (endpoint.outstanding, (self.endpoints.index(endpoint) - offset) % len(self.endpoints))
+        )
+
+    @property
+    def circuit_open(self) -> bool:
+        """True si ninguna instancia puede recibir peticiones ahora"""
+        return not any(endpoint.available for endpoint in self.endpoints)
+
+    def admit(self) -> bool:
+        """Falla rápida: False (y se cuenta como rechazo) si no hay instancia disponible"""
+        if self.circuit_open:
+            self.rejected += 1
+            return False
+        return True
+
+    def _acquire(self, model: Optional[str], tried: Set[str]) -> OllamaEndpoint:
+        endpoint = self.pick(model, exclude=tried)
+        tried.add(endpoint.url)
+        if endpoint.state == HALF_OPEN:
+            endpoint.trial_in_flight = True
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        return endpoint
+
+    @staticmethod
+    def _release(endpoint: OllamaEndpoint) -> None:
+        endpoint.outstanding -= 1
+        endpoint.trial_in_flight = False
+
+    def _record_success(self, endpoint: OllamaEndpoint, model: Optional[str]) -> None:
+        endpoint.consecutive_failures = 0
+        if endpoint.tripped and endpoint.state == HALF_OPEN:
+            endpoint.tripped = False
+            print(f"✓ Ollama {endpoint.url} recuperada en el pool {self.name}")
+        if model:
+            endpoint.models.add(_model_key(model))
+
+    def _open(self, endpoint: OllamaEndpoint) -> None:
+        endpoint.ejected_until = time.monotonic() + self.eject_seconds
+        endpoint.ejections += 1
+        endpoint.tripped = True
+        endpoint.models.clear()
+        print(f"⚠️  Ollama {endpoint.url} fuera del pool {self.name} por {self.eject_seconds:.0f}s ({endpoint.last_error})")
+
+    def _record_failure(self, endpoint: OllamaEndpoint, error: Exception) -> None:
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        endpoint.last_error = str(error) or type(error).__name__
+        state = endpoint.state
+        # En half-open basta una falla para volver a abrir el circuito
+        if state == HALF_OPEN or (state == CLOSED and endpoint.consecutive_failures >= self.eject_after):
+            self._open(endpoint)
+
+    @staticmethod
+    def _is_endpoint_failure(error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+    # ==================== Peticiones ====================
+
+    async def post(self, path: str, json: Dict, model: Optional[str] = None) -> httpx.Response:
+        """
+        POST no streaming; si la instancia no responde se reintenta en otra
+
+        Returns:
+            Respuesta ya verificada con raise_for_status()
+        """
+        tried: Set[str] = set()
+        while True:
+            endpoint = self._acquire(model, tried)
+            try:
+                response = await self.client.post(f"{endpoint.url}{path}", json=json)
+                response.raise_for_status()
+            except httpx.HTTPError as error:
+                if not self._is_endpoint_failure(error):
+                    raise
+                self._record_failure(endpoint, error)
+                if not isinstance(error, httpx.TransportError) or len(tried) >= len(self.endpoints):
+                    raise
+                continue
+            finally:
+                self._release(endpoint)
+            self._record_success(endpoint, model)
+            return response
+
+    @asynccontextmanager
+    async def stream(self, path: str, json: Dict, model: Optional[str] = None) -> AsyncIterator[httpx.Response]:
+        """
+        POST streaming; solo se reintenta en otra instancia si falla la conexión
+
+        El cuerpo se lee dentro del bloque `async with`; los errores mientras
+        se lee cuentan como fallas de la instancia.
+        """
+        tried: Set[str] = set()
+        while True:
+            endpoint = self._acquire(model, tried)
+            request = self.client.build_request("POST", f"{endpoint.url}{path}", json=json)
+            try:
+                response = await self.client.send(request, stream=True)
+            except httpx.TransportError as error:
+                self._release(endpoint)
+                self._record_failure(endpoint, error)
+                if len(tried) >= len(self.endpoints):
+                    raise
+                continue
+            break
+
+        try:
+            if response.status_code >= 500:
+                await response.aread()
+            response.raise_for_status()
+            yield response
+        except httpx.HTTPError as error:
+            if self._is_endpoint_failure(error):
+                self._record_failure(endpoint, error)
+            raise
+        else:
+            self._record_success(endpoint, model)
+        finally:
+            self._release(endpoint)
+            await response.aclose()
+
+    async def get(self, path: str, model: Optional[str] = None) -> httpx.Response:
+        """GET a la instancia elegida (p. ej. /api/tags)"""
+        endpoint = self._acquire(model, set())
+        try:
+            response = await self.client.get(f"{endpoint.url}{path}")
+            response.raise_for_status()
+        except httpx.HTTPError as error:
+            if self._is_endpoint_failure(error):
+                self._record_failure(endpoint, error)
+            raise
+        finally:
+            self._release(endpoint)
+        self._record_success(endpoint, model)
+        return response
+
+    # ==================== Salud ====================
+
+    async def check_health(self, timeout: float = 3.0) -> List[Dict]:
+        """Consulta /api/ps en todas las instancias y actualiza modelos cargados y circuitos"""
+        async def probe(endpoint: OllamaEndpoint) -> None:
+            endpoint.last_check = time.time()
+            try:
+                response = await self.client.get(f"{endpoint.url}/api/ps", timeout=timeout)
+                response.raise_for_status()
+                models = response.json().get("models", [])
+            except (httpx.HTTPError, ValueError) as error:
+                endpoint.last_check_ok = False
+                endpoint.failures += 1
+                endpoint.last_error = str(error) or type(error).__name__
+                # Un chequeo fallido abre el circuito sin esperar a que fallen peticiones
+                if endpoint.state != OPEN:
+                    self._open(endpoint)
+                return
+            endpoint.last_check_ok = True
+            endpoint.models = {_model_key(model.get("name") or model.get("model", "")) for model in models}
+            if endpoint.state == OPEN:
+                # Responde otra vez: la próxima petición real decide (half-open)
+                endpoint.ejected_until = 0.0
+
+        await asyncio.gather(*(probe(endpoint) for endpoint in self.endpoints))
+        return self.metrics()["endpoints"]
+
+    async def _health_loop(self) -> None:
+        while True:
+            try:
+                await self.check_health()
+            except Exception as error:  # noqa: BLE001
+                print(f"⚠️  Error chequeando el pool {self.name}: {error}")
+            await asyncio.sleep(self.health_interval)
+
+    def start(self) -> None:
+        """Inicia el chequeo activo periódico (requiere un event loop corriendo)"""
+        if self.health_interval > 0 and (self._health_task is None or self._health_task.done()):
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self) -> None:
+        """Detiene el chequeo activo y cierra el cliente compartido"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def checked(self) -> bool:
+        """True si ya hubo al menos un chequeo activo"""
+        return any(endpoint.last_check is not None for endpoint in self.endpoints)
+
+    def health(self) -> Dict:
+        """
+        Estado cacheado del pool (no consulta a Ollama)
+
+        status: "ok" si todas las instancias tienen el circuito cerrado,
+        "degraded" si alguna no, "down" si todas están abiertas.
+        """
+        states = [endpoint.state for endpoint in self.endpoints]
+        if all(state == OPEN for state in states):
+            health_status = "down"
+        elif all(state == CLOSED for state in states):
+            health_status = "ok"
+        else:
+            health_status = "degraded"
+        return {
+            "status": health_status,
+            "endpoints": [
+                {
+                    "url": endpoint.url,
+                    "state": endpoint.state,
+                    "last_check": endpoint.last_check,
+                    "last_check_ok": endpoint.last_check_ok
+                }
+                for endpoint in self.endpoints
+            ]
+        }
+
+    def metrics(self) -> Dict:
+        return {
+            "name": self.name,
+            "available": sum(endpoint.available for endpoint in self.endpoints),
+            "rejected": self.rejected,
+            "endpoints": [endpoint.as_dict() for endpoint in self.endpoints]
+        }
@@ -0,0 +1,129 @@
+"""
+Backends de extracción de texto de PDFs (PyPDF2, PyMuPDF, pdfminer.six)
+
+Cada backend importa su librería recién al abrir un documento: solo PyPDF2
+es dependencia obligatoria, los demás se usan si están instalados.
+"""
+import importlib.util
+import io
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Type
+
+
+class PDFBackend(ABC):
+    """Interfaz común: abrir un documento, contar páginas y extraer una"""
+
+    name = ""
+    module = ""
+
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec(cls.module) is not None
+
+    @abstractmethod
+    def open(self, pdf_path: Path) -> Any:
+        ...
+
+    @abstractmethod
+    def page_count(self, document: Any) -> int:
+        ...
+
+    @abstractmethod
+    def extract_page(self, document: Any, index: int) -> str:
+        """Texto de la página `index` (desde 0)"""
+
+    def close(self, document: Any) -> None:
+        pass
+
+
+class PyPDF2Backend(PDFBackend):
+    name = "pypdf2"
+    module = "PyPDF2"
+
+    def open(self, pdf_path: Path) -> Any:
+        import PyPDF2
+        return PyPDF2.PdfReader(str(pdf_path))
+
+    def page_count(self, document: Any) -> int:
+        return len(document.pages)
+
+    def extract_page(self, document: Any, index: int) -> str:
+        return document.pages[index].extract_text() or ""
+
+
+class PyMuPDFBackend(PDFBackend):
+    name = "pymupdf"
+    module = "fitz"
+
+    def open(self, pdf_path: Path) -> Any:
+        import fitz
+        return fitz.open(str(pdf_path))
+
+    def page_count(self, document: Any) -> int:
+        return document.page_count
+
+    def extract_page(self, document: Any, index: int) -> str:
+        return document[index].get_text()
+
+    def close(self, document: Any) -> None:
+        document.close()
+
+
+class PdfMinerBackend(PDFBackend):
+    name = "pdfminer"
+    module = "pdfminer"
+
+    def open(self, pdf_path: Path) -> Any:
+        # El documento se parsea una sola vez; extract_text(page_numbers=...)
+        # lo volvería a recorrer entero en cada página
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfinterp import PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser
+
+        file = open(pdf_path, "rb")
+        try:
+            pages = list(PDFPage.create_pages(PDFDocument(PDFParser(file))))
+        except Exception:
+            file.close()
+            raise
+        return {"file": file, "pages": pages, "resources": PDFResourceManager(caching=True), "laparams": LAParams()}
+
+    def page_count(self, document: Any) -> int:
+        return len(document["pages"])
+
+    def extract_page(self, document: Any, index: int) -> str:
+        from pdfminer.converter import TextConverter
+        from pdfminer.pdfinterp import PDFPageInterpreter
+
+        output = io.StringIO()
+        device = TextConverter(document["resources"], output, laparams=document["laparams"])
+        try:
+            PDFPageInterpreter(document["resources"], device).process_page(document["pages"][index])
+        finally:
+            device.close()
+        return output.getvalue()
+
+    def close(self, document: Any) -> None:
+        document["file"].close()
+
+
+BACKENDS: Dict[str, Type[PDFBackend]] = {
+    backend.name: backend for backend in (PyPDF2Backend, PyMuPDFBackend, PdfMinerBackend)
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+def get_backend(name: str) -> PDFBackend:
+    """
+    Raises:
+        ValueError: Si el backend no existe
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de PDF desconocido: {name} (opciones: {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
@@ -1,19 +1,142 @@
 """
 Módulo de extracción de texto desde PDFs
 """
-import os
+import json
+import multiprocessing
+import threading
+import time
 from pathlib import Path
-from typing import Dict, List, Optional
-import PyPDF2
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .pdf_backends import BACKENDS, get_backend
+
+# Estados de una página en el reporte de extracción
+OK = "ok"
+EMPTY = "empty"
+ERROR = "error"
+TIMEOUT = "timeout"
+FAILED = (ERROR, TIMEOUT)
+
+
+def _extract_pages(backend_name: str, pdf_path: str, pages: Optional[List[int]]) -> Iterator[Tuple]:
+    """
+    Extrae las páginas indicadas (todas si es None) emitiendo un mensaje por página
+
+    Mensajes: ("opened", páginas), ("page", índice, texto, segundos),
+    ("error", índice, detalle, segundos) o ("failed", detalle) si el
+    documento no se pudo abrir.
+    """
+    backend = get_backend(backend_name)
+    try:
+        document = backend.open(Path(pdf_path))
+        count = backend.page_count(document)
+    except Exception as e:  # noqa: BLE001
+        yield ("failed", f"{type(e).__name__}: {e}")
+        return
+    yield ("opened", count)
+    try:
+        for index in (range(count) if pages is None else pages):
+            started = time.perf_counter()
+            try:
+                text = backend.extract_page(document, index)
+            except Exception as e:  # noqa: BLE001
+                yield ("error", index, f"{type(e).__name__}: {e}", time.perf_counter() - started)
+                continue
+            yield ("page", index, text, time.perf_counter() - started)
+    finally:
+        backend.close(document)
+
+
+def _serve_extraction(conn) -> None:
+    """Proceso worker: extrae documentos a pedido y envía cada página al terminarla"""
+    while True:
+        try:
+            backend_name, pdf_path, pages = conn.recv()
+        except (EOFError, OSError):
+            return
+        for message in _extract_pages(backend_name, pdf_path, pages):
+            conn.send(message)
+        conn.send(("done",))
+
+
+class _ExtractionWorker:
+    """Proceso worker de extracción; se mata y se reemplaza si una página excede el tiempo"""
+
+    def __init__(self):
+        self.process = None
+        self.conn = None
+
+    def ensure_started(self) -> None:
+        if self.process is not None and self.process.is_alive():
+            return
+        self.stop()
+        context = multiprocessing.get_context("spawn")
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_serve_extraction, args=(child,), name="willay-pdf-extractor", daemon=True
+        )
+        self.process.start()
+        child.close()
+
+    def stop(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.process is not None:
+            self.process.kill()
+            self.process.join(timeout=5)
+            self.process = None
 
 
 class PDFExtractor:
-    """Extrae texto de archivos PDF y lo cachea"""
+    """
+    Extrae texto de archivos PDF y lo cachea
+    
+    Las páginas se extraen con el primer backend de `backends`. Con
+    `page_timeout` la extracción corre en un proceso worker: una página que
+    excede el tiempo (o que hace fallar al backend) no descarta el resto del
+    documento, se reintenta con el siguiente backend y, si todos fallan, se
+    omite. El tiempo de cada página queda en el reporte de extracción
+    (`extraction_report.json` en cache_dir) para encontrar documentos lentos.
+    """
     
-    def __init__(self, pdf_dir: str, cache_dir: str):
+    REPORT_FILE = "extraction_report.json"
+    
+    def __init__(
+        self,
+        pdf_dir: str,
+        cache_dir: str,
+        backends: Sequence[str] = ("pypdf2",),
+        page_timeout: Optional[float] = 30.0
+    ):
+        """
+        Args:
+            pdf_dir: Directorio con los PDFs
+            cache_dir: Directorio para cachear texto extraído
+            backends: Backends en orden de preferencia (ver pdf_backends.BACKENDS);
+                los que no están instalados se omiten
+            page_timeout: Segundos máximos por página (None = sin límite, en
+                este mismo proceso)
+        
+        Raises:
+            ValueError: Si algún backend no existe o ninguno está instalado
+        """
         self.pdf_dir = Path(pdf_dir)
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for name in backends:
+            get_backend(name)
+        self.backends = [name for name in backends if BACKENDS[name].available()]
+        skipped = [name for name in backends if name not in self.backends]
+        if skipped:
+            print(f"⚠️  Backends de PDF no instalados: {', '.join(skipped)}")
+        if not self.backends:
+            raise ValueError("No hay ningún backend de PDF instalado")
+        self.page_timeout = page_timeout
+        self._worker = _ExtractionWorker()
+        self._lock = threading.Lock()
+        self.report_path = self.cache_dir / self.REPORT_FILE
+        self.reports: Dict[str, Dict] = self._load_reports()
     
     def extract_text_from_pdf(self, pdf_path: Path) -> Dict[int, str]:
         """
@@ -22,22 +145,167 @@ class PDFExtractor:
         Returns:
             Dict con número de página como clave y texto como valor
         """
-        pages_text = {}
+        started = time.perf_counter()
+        # índice de página -> (estado, backend, segundos, texto)
+        results: Dict[int, Tuple[str, str, float, str]] = {}
+        page_count: Optional[int] = None
         
-        try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                
-                for page_num, page in enumerate(reader.pages, start=1):
-                    text = page.extract_text()
-                    if text and text.strip():
-                        pages_text[page_num] = text.strip()
-                        
-        except Exception as e:
-            print(f"Error extrayendo {pdf_path.name}: {e}")
-            
+        with self._lock:
+            for backend_name in self.backends:
+                if page_count is None:
+                    pending = None
+                else:
+                    pending = [index for index in range(page_count) if results.get(index, (ERROR,))[0] in FAILED]
+                    if not pending:
+                        break
+                count, extracted = self._run_backend(backend_name, pdf_path, pending)
+                if count is None:
+                    continue
+                page_count = count
+                results.update(extracted)
+        
+        pages_text = {
+            index + 1: text.strip()
+            for index, (status, _, _, text) in sorted(results.items())
+            if status == OK
+        }
+        self._record(pdf_path, page_count, results, time.perf_counter() - started)
         return pages_text
     
+    def _run_backend(
+        self,
+        backend_name: str,
+        pdf_path: Path,
+        pages: Optional[List[int]]
+    ) -> Tuple[Optional[int], Dict[int, Tuple[str, str, float, str]]]:
+        """
+        Extrae páginas con un backend
+        
+        Returns:
+            (cantidad de páginas o None si no se pudo abrir, resultado por página)
+        """
+        if self.page_timeout is None:
+            messages = _extract_pages(backend_name, str(pdf_path), pages)
+            count, results, _ = self._collect(backend_name, pdf_path, lambda: next(messages, ("done",)))
+            return count, results
+        
+        count: Optional[int] = None
+        results: Dict[int, Tuple[str, str, float, str]] = {}
+        remaining = pages
+        while True:
+            self._worker.ensure_started()
+            self._worker.conn.send((backend_name, str(pdf_path), remaining))
+            opened, extracted, timed_out = self._collect(backend_name, pdf_path, self._receive)
+            count = opened if opened is not None else count
+            results.update(extracted)
+            if not timed_out:
+                return count, results
+            # El worker quedó colgado (o murió): reemplazarlo y seguir desde la página siguiente
+            self._worker.stop()
+            if count is None:
+                print(f"⚠️  {pdf_path.name}: {backend_name} no abrió el documento en {self.page_timeout}s")
+                return None, results
+            order = list(range(count)) if remaining is None else remaining
+            pending = [index for index in order if index not in extracted]
+            if not pending:
+                return count, results
+            stalled = pending[0]
+            results[stalled] = (TIMEOUT, backend_name, self.page_timeout, "")
+            print(f"⚠️  {pdf_path.name}: página {stalled + 1} excedió {self.page_timeout}s con {backend_name}")
+            remaining = pending[1:]
+            if not remaining:
+                return count, results
+    
+    def _receive(self) -> Optional[Tuple]:
+        """Siguiente mensaje del worker, o None si no llega dentro de page_timeout"""
+        try:
+            if not self._worker.conn.poll(self.page_timeout):
+                return None
+            return self._worker.conn.recv()
+        except (EOFError, OSError):
+            return None
+    
+    def _collect(self, backend_name: str, pdf_path: Path, receive) -> Tuple[Optional[int], Dict, bool]:
+        """
+        Consume los mensajes de una extracción
+        
+        Returns:
+            (páginas del documento o None si no se abrió, resultado por página,
+            True si el worker dejó de responder)
+        """
+        count: Optional[int] = None
+        results: Dict[int, Tuple[str, str, float, str]] = {}
+        while True:
+            message = receive()
+            if message is None:
+                return count, results, True
+            kind = message[0]
+            if kind == "done":
+                return count, results, False
+            if kind == "failed":
+                print(f"Error extrayendo {pdf_path.name} con {backend_name}: {message[1]}")
+            elif kind == "opened":
+                count = message[1]
+            elif kind == "page":
+                _, index, text, seconds = message
+                status = OK if text and text.strip() else EMPTY
+                results[index] = (status, backend_name, seconds, text)
+            elif kind == "error":
+                _, index, detail, seconds = message
+                print(f"Error extrayendo {pdf_path.name} página {index + 1} con {backend_name}: {detail}")
+                results[index] = (ERROR, backend_name, seconds, "")
+    
+    def _record(
+        self,
+        pdf_path: Path,
+        page_count: Optional[int],
+        results: Dict[int, Tuple[str, str, float, str]],
+        seconds: float
+    ) -> None:
+        """Guarda los tiempos por página del documento en el reporte"""
+        timings = [
+            [index + 1, backend, status, round(page_seconds, 4), len(text.strip())]
+            for index, (status, backend, page_seconds, text) in sorted(results.items())
+        ]
+        slowest = sorted(timings, key=lambda timing: timing[3], reverse=True)[:5]
+        self.reports[pdf_path.name] = {
+            "pages": page_count or 0,
+            "extracted": sum(1 for timing in timings if timing[2] == OK),
+            "seconds": round(seconds, 3),
+            "backends": sorted({timing[1] for timing in timings}),
+            "timeouts": [timing[0] for timing in timings if timing[2] == TIMEOUT],
+            "errors": [timing[0] for timing in timings if timing[2] == ERROR],
+            "fallbacks": [timing[0] for timing in timings if timing[1] != self.backends[0]],
+            "slowest_pages": [{"page": t[0], "backend": t[1], "seconds": t[3]} for t in slowest],
+            # [página, backend, estado, segundos, caracteres]
+            "timings": timings,
+            "extracted_at": time.time()
+        }
+        self._save_reports()
+    
+    def _load_reports(self) -> Dict[str, Dict]:
+        try:
+            return json.loads(self.report_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+    
+    def _save_reports(self) -> None:
+        tmp_path = self.report_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.reports, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self.report_path)
+    
+    def slowest_documents(self, limit: int = 5) -> List[Dict]:
+        """Documentos con la extracción más lenta (sin el detalle por página)"""
+        ranked = sorted(self.reports.items(), key=lambda item: item[1]["seconds"], reverse=True)[:limit]
+        return [
+            {"filename": filename, **{key: value for key, value in report.items() if key != "timings"}}
+            for filename, report in ranked
+        ]
+    
+    def close(self) -> None:
+        """Detiene el proceso worker de extracción"""
+        self._worker.stop()
+    
     def get_cache_path(self, pdf_path: Path) -> Path:
         """Retorna la ruta del archivo de caché para un PDF"""
         cache_name = pdf_path.stem + ".txt"
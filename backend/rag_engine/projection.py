@@ -0,0 +1,174 @@
+"""
+Reducción de dimensionalidad de embeddings para acelerar la búsqueda
+"""
+import json
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Similitud coseno acotada a [-1, 1] (0 si alguno de los vectores es nulo)"""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norms = float(np.linalg.norm(a) * np.linalg.norm(b))
+    if not norms:
+        return 0.0
+    return float(np.clip(np.dot(a, b) / norms, -1.0, 1.0))
+
+
+class EmbeddingProjector:
+    """
+    Proyecta embeddings a una dimensión reducida para el índice de búsqueda
+
+    Métodos soportados:
+        none: No reduce (usa el vector completo)
+        truncate: Truncado Matryoshka (prefijo de dimensiones + renormalización)
+        pca: Proyección PCA aprendida sobre los embeddings del índice
+    """
+
+    METHODS = ("none", "truncate", "pca")
+
+    def __init__(
+        self,
+        target_dimension: Optional[int] = None,
+        method: str = "truncate",
+        state_path: Optional[str] = None
+    ):
+        """
+        Args:
+            target_dimension: Dimensión reducida del índice (None desactiva la reducción)
+            method: Método de reducción (none, truncate, pca)
+            state_path: Archivo donde se persiste la proyección aprendida (PCA)
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Método de reducción desconocido: {method}")
+
+        self.target_dimension = target_dimension
+        self.method = method if target_dimension else "none"
+        self.state_path = Path(state_path) if state_path else None
+
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.source_dimension: Optional[int] = None
+
+        self.load()
+
+    @property
+    def enabled(self) -> bool:
+        """Indica si se aplica alguna reducción"""
+        return self.method != "none"
+
+    @property
+    def is_fitted(self) -> bool:
+        """Indica si la proyección está lista para aplicarse"""
+        if self.method == "pca":
+            return self.components is not None
+        return True
+
+    def output_dimension(self, source_dimension: int) -> int:
+        """Dimensión resultante para vectores de entrada de `source_dimension`"""
+        if not self.enabled:
+            return source_dimension
+        return min(self.target_dimension, source_dimension)
+
+    def fit(self, embeddings: List[np.ndarray]) -> None:
+        """
+        Aprende la proyección a partir de los embeddings del índice
+
+        Solo tiene efecto con el método PCA; el truncado no necesita ajuste.
+        """
+        if self.method != "pca" or not embeddings:
+            return
+
+        matrix = np.vstack(embeddings).astype(np.float32)
+        self.source_dimension = matrix.shape[1]
+        self.mean = matrix.mean(axis=0)
+
+        # Con menos muestras que dimensiones el rango queda limitado por las muestras
+        n_components = min(self.target_dimension, matrix.shape[0], matrix.shape[1])
+        _, _, vt = np.linalg.svd(matrix - self.mean, full_matrices=False)
+        self.components = vt[:n_components].astype(np.float32)
+
+        self.save()
+        print(f"✓ Proyección PCA ajustada: {self.source_dimension} → {n_components} dimensiones")
+
+    def transform(self, embedding: np.ndarray) -> np.ndarray:
+        """Aplica la proyección a un embedding individual"""
+        return self.transform_batch([embedding])[0]
+
+    def transform_batch(self, embeddings: List[np.ndarray]) -> List[np.ndarray]:
+        """Aplica la proyección a una lista de embeddings"""
+        if not self.enabled or not embeddings:
+            return list(embeddings)
+
+        matrix = np.vstack(embeddings).astype(np.float32)
+
+        if self.method == "truncate":
+            self.source_dimension = matrix.shape[1]
+            reduced = matrix[:, :self.target_dimension]
+        else:
+            if self.components is None:
+                raise RuntimeError("La proyección PCA no está ajustada; re-indexa los documentos")
+            if matrix.shape[1] != self.source_dimension:
+                raise ValueError(
+                    f"Embedding de {matrix.shape[1]} dimensiones, la proyección espera {self.source_dimension}"
+                )
+            reduced = (matrix - self.mean) @ self.components.T
+
+        # Renormalizar para que las distancias sigan siendo comparables
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        reduced = reduced / norms
+
+        return [row.astype(np.float32) for row in reduced]
+
+    def save(self) -> None:
+        """Persiste la proyección aprendida"""
+        if not self.state_path or self.components is None:
+            return
+
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_path, "wb") as f:
+            np.savez(
+                f,
+                mean=self.mean,
+                components=self.components,
+                info=np.array(json.dumps({
+                    "method": self.method,
+                    "target_dimension": self.target_dimension,
+                    "source_dimension": self.source_dimension
+                }))
+            )
+
+    def load(self) -> None:
+        """Carga la proyección persistida si coincide con la configuración actual"""
+        if self.method != "pca" or not self.state_path or not self.state_path.exists():
+            return
+
+        data = np.load(self.state_path)
+        info = json.loads(str(data["info"]))
+        if info.get("target_dimension") != self.target_dimension:
+            print("⚠️  La proyección guardada no coincide con la dimensión configurada; se re-ajustará")
+            return
+
+        self.mean = data["mean"]
+        self.components = data["components"]
+        self.source_dimension = info.get("source_dimension")
+
+    def reset(self) -> None:
+        """Descarta la proyección aprendida"""
+        self.mean = None
+        self.components = None
+        self.source_dimension = None
+        if self.state_path and self.state_path.exists():
+            self.state_path.unlink()
+
+    def describe(self) -> dict:
+        """Retorna la configuración de la proyección para estadísticas"""
+        return {
+            "method": self.method,
+            "target_dimension": self.target_dimension,
+            "source_dimension": self.source_dimension,
+            "fitted": self.is_fitted
+        }
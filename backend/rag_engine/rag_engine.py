@@ -3,10 +3,13 @@ Motor RAG principal que coordina extracción, chunking, embeddings y búsqueda
 """
 import asyncio
 from pathlib import Path
-from typing import List, Dict, Optional
-from .pdf_extractor import PDFExtractor
+from typing import List, Dict, Optional, Sequence, Set
+import numpy as np
 from .chunker import TextChunker, EmbeddingGenerator
+from .dedup import ChunkDeduplicator, DedupIndex, chunk_sources, filename_where, set_chunk_sources
 from .vector_store import VectorStore
+from .projection import EmbeddingProjector, cosine_similarity
+from .async_store import AsyncVectorStore
 
 
 class RAGEngine:
@@ -18,8 +21,23 @@ class RAGEngine:
         cache_dir: str = "backend/rag_engine/cache",
         vector_store_dir: str = "backend/rag_engine/vector_store",
         embedding_model: str = "nomic-embed-text",
+        ollama_base_url: str = "http://127.0.0.1:11434",
         chunk_size: int = 800,
-        chunk_overlap: int = 200
+        chunk_overlap: int = 200,
+        reduced_dimension: Optional[int] = None,
+        reduction_method: str = "truncate",
+        keep_full_vectors: bool = False,
+        rerank_factor: int = 4,
+        store_read_workers: int = 4,
+        rebuild_min_ratio: float = 0.5,
+        collection_name: str = VectorStore.DEFAULT_COLLECTION,
+        embedding_generator: Optional[EmbeddingGenerator] = None,
+        num_shards: int = 0,
+        ollama_pool=None,
+        ollama_keep_alive=None,
+        dedup_threshold: Optional[float] = 0.8,
+        pdf_backends: Sequence[str] = ("pypdf2",),
+        pdf_page_timeout: Optional[float] = 30.0
     ):
         """
         Inicializa el motor RAG con todos sus componentes
@@ -29,32 +47,134 @@ class RAGEngine:
             cache_dir: Directorio para cachear texto extraído
             vector_store_dir: Directorio para persistir embeddings
             embedding_model: Modelo de Ollama para embeddings
+            ollama_base_url: URL base del servidor Ollama para embeddings
             chunk_size: Tamaño de los chunks en caracteres
             chunk_overlap: Overlap entre chunks
+            reduced_dimension: Dimensión del índice de búsqueda (None = sin reducción)
+            reduction_method: Método de reducción ("truncate" o "pca")
+            keep_full_vectors: Guardar los vectores completos para re-ranking
+            rerank_factor: Multiplicador de candidatos a re-rankear con vectores completos
+            store_read_workers: Hilos para lecturas concurrentes del vector store
+            rebuild_min_ratio: Fracción mínima de chunks (respecto del índice
+                activo) que debe tener una reconstrucción para activarse
+            collection_name: Colección de Chroma (una por namespace)
+            embedding_generator: Generador compartido con otros motores (si se
+                omite se crea uno con embedding_model y ollama_base_url)
+            num_shards: Procesos worker entre los que repartir el índice
+                (0 o 1 = un único vector store en este proceso)
+            ollama_pool: OllamaPool para los embeddings (en lugar de ollama_base_url)
+            ollama_keep_alive: keep_alive de las peticiones de embeddings
+            dedup_threshold: Similitud mínima para guardar un solo chunk entre
+                casi duplicados (None = sin deduplicación)
+            pdf_backends: Backends de extracción en orden de preferencia
+                (ver PDFExtractor)
+            pdf_page_timeout: Segundos máximos por página al extraer (None = sin límite)
         """
-        self.pdf_extractor = PDFExtractor(pdf_dir, cache_dir)
+        self.cache_dir = cache_dir
+        self._pdf_extractor = None
+        self._pdf_config = (tuple(pdf_backends), pdf_page_timeout)
         self.chunker = TextChunker(chunk_size, chunk_overlap)
-        self.embedding_generator = EmbeddingGenerator(embedding_model)
-        self.vector_store = VectorStore(vector_store_dir)
+        self.deduplicator = ChunkDeduplicator(dedup_threshold) if dedup_threshold is not None else None
+        self.dedup_stats: Dict = {"chunks": 0, "duplicates_removed": 0, "last": None}
+        self.embedding_generator = embedding_generator or EmbeddingGenerator(
+            embedding_model, base_url=ollama_base_url, pool=ollama_pool, keep_alive=ollama_keep_alive
+        )
+        if num_shards > 1:
+            from .sharding import ShardedVectorStore
+            self.vector_store = ShardedVectorStore(
+                vector_store_dir,
+                num_shards=num_shards,
+                keep_full_vectors=keep_full_vectors,
+                collection_name=collection_name
+            )
+        else:
+            self.vector_store = VectorStore(
+                vector_store_dir,
+                keep_full_vectors=keep_full_vectors,
+                collection_name=collection_name
+            )
+        # Acceso no bloqueante al vector store desde el event loop
+        self.store = AsyncVectorStore(self.vector_store, read_workers=store_read_workers)
+        self.vector_store_dir = Path(vector_store_dir)
+        self._projection_config = (reduced_dimension, reduction_method)
+        # Cada generación del índice tiene su propia proyección aprendida
+        self.projector = self._projector_for(self.vector_store.active_generation)
+        self.rerank_factor = max(1, rerank_factor)
+        self.rebuild_min_ratio = rebuild_min_ratio
+        self._rebuild_lock = asyncio.Lock()
+        # Escrituras incrementales y firmas de deduplicación de la generación activa
+        self._index_lock = asyncio.Lock()
+        self._dedup_index: Optional[DedupIndex] = None
+        # (generación, chunks, vector) del centroide usado por el gating
+        self._centroid: Optional[tuple] = None
         self.pdf_dir = Path(pdf_dir)
+        # Firma (mtime, tamaño) de cada PDF al momento de indexarlo
+        self._indexed_signatures: Dict[str, tuple] = {}
         
         # Crear directorio de PDFs si no existe
         self.pdf_dir.mkdir(parents=True, exist_ok=True)
     
+    @property
+    def pdf_extractor(self):
+        """Extractor de PDFs, creado al primer uso para no cargar PyPDF2 antes de tiempo"""
+        if self._pdf_extractor is None:
+            from .pdf_extractor import PDFExtractor
+            backends, page_timeout = self._pdf_config
+            self._pdf_extractor = PDFExtractor(
+                str(self.pdf_dir), self.cache_dir, backends=backends, page_timeout=page_timeout
+            )
+        return self._pdf_extractor
+    
+    def _projector_for(self, generation: str) -> EmbeddingProjector:
+        """Proyección asociada a una generación del índice"""
+        reduced_dimension, reduction_method = self._projection_config
+        # La generación original del índice por defecto conserva el archivo de siempre
+        if generation == VectorStore.DEFAULT_COLLECTION:
+            filename = "projection.npz"
+        else:
+            filename = f"projection_{generation}.npz"
+        return EmbeddingProjector(
+            reduced_dimension,
+            method=reduction_method,
+            state_path=str(self.vector_store_dir / filename)
+        )
+    
+    def _prune_projections(self) -> None:
+        """Elimina proyecciones de generaciones que ya no existen"""
+        generations = self.vector_store.get_generations()
+        keep = {
+            self._projector_for(name).state_path
+            for name in [generations["active"], generations["previous"], *generations["building"]]
+            if name
+        }
+        # Solo archivos de esta colección: el directorio es compartido entre namespaces
+        collection = self.vector_store.collection_name
+        candidates = [
+            self._projector_for(collection).state_path,
+            *self.vector_store_dir.glob(f"projection_{collection}__g*.npz")
+        ]
+        for path in candidates:
+            if path not in keep:
+                path.unlink(missing_ok=True)
+    
     async def index_documents(self, force: bool = False) -> Dict:
         """
         Indexa todos los PDFs: extrae texto, chunking, embeddings y almacena
         
         Args:
-            force: Si True, fuerza la re-indexación aunque ya exista caché
+            force: Si True, reconstruye el índice completo en una generación
+                nueva y la activa al terminar (ver rebuild_index)
         
         Returns:
             Dict con estadísticas del proceso
         """
+        if force:
+            return await self.rebuild_index(force_extraction=True)
+        
         print("🔄 Iniciando indexación de documentos...")
         
-        # 1. Extraer texto de PDFs
-        all_documents = self.pdf_extractor.process_all_pdfs(force=force)
+        # 1. Extraer texto de PDFs (en un hilo: no bloquea el event loop)
+        all_documents = await asyncio.to_thread(self.pdf_extractor.process_all_pdfs, force=force)
         
         if not all_documents:
             print("⚠️  No se encontraron PDFs en el directorio")
@@ -62,37 +182,396 @@ class RAGEngine:
         
         print(f"✓ Extraídos {len(all_documents)} documentos")
         
-        # 2. Crear chunks con metadata
-        all_chunks = []
-        for filename, pages_text in all_documents.items():
-            chunks = self.chunker.chunk_document(pages_text, filename)
-            all_chunks.extend(chunks)
+        await self._index_pages(all_documents, refit_projection=force)
         
-        print(f"✓ Creados {len(all_chunks)} chunks")
+        stats = await self.store.get_stats()
         
-        # 3. Generar embeddings
-        texts = [chunk["text"] for chunk in all_chunks]
-        metadatas = [chunk["metadata"] for chunk in all_chunks]
+        print("✅ Indexación completada")
+        return {
+            "status": "success",
+            "total_chunks": stats["total_chunks"],
+            "duplicates_removed": self._last_duplicates_removed(),
+            "total_files": stats["total_files"],
+            "files": stats["files"]
+        }
+    
+    async def rebuild_index(self, force_extraction: bool = False) -> Dict:
+        """
+        Reconstruye el índice completo sin afectar las búsquedas en curso
         
-        print("🔄 Generando embeddings (esto puede tomar varios minutos)...")
-        embeddings = await self.embedding_generator.generate_embeddings_batch(texts)
+        Los documentos se indexan en una generación nueva mientras la activa
+        sigue respondiendo. La nueva solo se activa si pasa la validación
+        (cantidad de chunks y una búsqueda de prueba); si falla se descarta y
+        el índice activo queda intacto. La generación anterior se conserva
+        para rollback_index.
         
-        print(f"✓ Generados {len(embeddings)} embeddings")
+        Args:
+            force_extraction: Si True, vuelve a extraer el texto ignorando la caché
         
-        # 4. Guardar en vector store
-        ids = [f"chunk_{meta['chunk_id']}" for meta in metadatas]
-        self.vector_store.add_documents(texts, embeddings, metadatas, ids)
+        Returns:
+            Dict con estadísticas del proceso y la generación activada
+        """
+        async with self._rebuild_lock:
+            print("🔄 Reconstruyendo índice en una generación nueva...")
+            
+            # Firmas tomadas antes de extraer: lo que cambie después se re-indexa al final
+            signatures = {
+                path.name: self._file_signature(path.name)
+                for path in self.pdf_dir.glob("*.pdf")
+            }
+            all_documents = await asyncio.to_thread(
+                self.pdf_extractor.process_all_pdfs, force=force_extraction
+            )
+            if not all_documents:
+                print("⚠️  No se encontraron PDFs en el directorio")
+                return {"status": "no_documents", "total_chunks": 0}
+            
+            generation = await self.store.begin_generation()
+            projector = self._projector_for(generation)
+            try:
+                expected = await self._index_pages(
+                    all_documents,
+                    refit_projection=True,
+                    generation=generation,
+                    projector=projector
+                )
+                await self._validate_generation(generation, expected, projector)
+            except BaseException:
+                await self.store.discard_generation(generation)
+                projector.reset()
+                raise
+            
+            await self.store.activate_generation(generation)
+            self.projector = projector
+            self._indexed_signatures = {
+                name: signature for name, signature in signatures.items() if signature
+            }
+            self._prune_projections()
         
-        stats = self.vector_store.get_stats()
+        duplicates_removed = self._last_duplicates_removed()
+        await self._reconcile()
         
-        print("✅ Indexación completada")
+        stats = await self.store.get_stats()
+        print("✅ Reconstrucción completada")
         return {
             "status": "success",
+            "generation": generation,
             "total_chunks": stats["total_chunks"],
+            "duplicates_removed": duplicates_removed,
             "total_files": stats["total_files"],
             "files": stats["files"]
         }
     
+    async def _validate_generation(
+        self,
+        generation: str,
+        expected_chunks: int,
+        projector: EmbeddingProjector
+    ) -> None:
+        """
+        Verifica una generación antes de activarla
+        
+        Raises:
+            RuntimeError: Si la generación está incompleta, vacía o
+                considerablemente más chica que el índice activo
+        """
+        stored = await self.store.count_documents(generation=generation)
+        if stored != expected_chunks:
+            raise RuntimeError(f"La generación {generation} tiene {stored} chunks, se esperaban {expected_chunks}")
+        if stored == 0:
+            raise RuntimeError(f"La generación {generation} está vacía")
+        
+        active = await self.store.count_documents()
+        if active and stored < active * self.rebuild_min_ratio:
+            raise RuntimeError(
+                f"La generación {generation} tiene {stored} chunks frente a {active} del índice activo"
+            )
+        
+        # Búsqueda de prueba con el mismo camino que usarán las consultas
+        query_embedding = await self.embedding_generator.generate_embedding("prueba")
+        results = await self.store.search(
+            projector.transform(query_embedding),
+            n_results=1,
+            generation=generation
+        )
+        if not results["ids"]:
+            raise RuntimeError(f"La búsqueda de prueba en {generation} no retornó resultados")
+    
+    async def _reconcile(self) -> None:
+        """Re-indexa los PDFs que cambiaron (o se borraron) durante una reconstrucción"""
+        indexed = set(await self.store.get_filenames())
+        for filename in sorted(indexed):
+            if not (self.pdf_dir / filename).exists():
+                await self.forget_document(filename)
+        for path in sorted(self.pdf_dir.glob("*.pdf")):
+            if not self.is_file_current(path.name):
+                await self.index_file(path.name)
+    
+    async def rollback_index(self) -> str:
+        """
+        Vuelve a activar la generación anterior del índice
+        
+        Returns:
+            Nombre de la generación activada
+        """
+        async with self._rebuild_lock:
+            generation = await self.store.rollback()
+            self.projector = self._projector_for(generation)
+            # El contenido de esa generación puede no coincidir con los PDFs actuales
+            self._indexed_signatures.clear()
+        return generation
+    
+    async def index_file(self, filename: str, force: bool = False) -> Dict:
+        """
+        Indexa (o re-indexa) un único PDF del directorio, reemplazando sus chunks
+        
+        Args:
+            filename: Nombre del archivo dentro de pdf_dir
+            force: Si True, fuerza la re-extracción aunque exista caché
+        
+        Returns:
+            Dict con estadísticas del archivo indexado
+        """
+        pdf_path = self.pdf_dir / Path(filename).name
+        if not pdf_path.exists():
+            return {"status": "not_found", "filename": filename, "chunks": 0}
+        
+        pages_text = await asyncio.to_thread(self.pdf_extractor.process_pdf, pdf_path, force=force)
+        if not pages_text:
+            print(f"⚠️  No se extrajo texto de {pdf_path.name}")
+            return {"status": "no_text", "filename": pdf_path.name, "chunks": 0}
+        
+        chunks = await self._index_pages({pdf_path.name: pages_text})
+        print(f"✅ {pdf_path.name} indexado")
+        return {
+            "status": "success",
+            "filename": pdf_path.name,
+            "chunks": chunks,
+            "duplicates_removed": self._last_duplicates_removed()
+        }
+    
+    async def _index_pages(
+        self,
+        documents: Dict[str, Dict[int, str]],
+        refit_projection: bool = False,
+        generation: Optional[str] = None,
+        projector: Optional[EmbeddingProjector] = None
+    ) -> int:
+        """
+        Chunking, embeddings y almacenamiento de documentos ya extraídos
+        
+        Los chunks previos de cada archivo se reemplazan, así re-indexar un
+        archivo no deja fragmentos huérfanos ni IDs duplicados. Los casi
+        duplicados entre los documentos recibidos se guardan una sola vez
+        (ver ChunkDeduplicator); al escribir en la generación activa también
+        se comparan con los chunks ya guardados (ver DedupIndex) y los que
+        repiten uno solo se agregan a sus `sources`.
+        
+        Args:
+            documents: Texto por página de cada archivo
+            refit_projection: Volver a ajustar la proyección PCA
+            generation: Generación destino (por defecto la activa)
+            projector: Proyección a usar (por defecto la de la generación activa)
+        
+        Returns:
+            Cantidad de chunks almacenados
+        """
+        # 1. Crear chunks con metadata
+        all_chunks = []
+        for filename, pages_text in documents.items():
+            chunks = self.chunker.chunk_document(pages_text, filename)
+            all_chunks.extend(chunks)
+        
+        print(f"✓ Creados {len(all_chunks)} chunks")
+        if not all_chunks:
+            return 0
+        
+        # Las escrituras incrementales van de a una: deduplican contra el índice
+        # activo y lo actualizan. Una generación en construcción no lo necesita.
+        lock = self._index_lock if generation is None else asyncio.Lock()
+        async with lock:
+            # 1b. Descartar casi duplicados antes de pagar sus embeddings
+            attached: List[tuple] = []
+            dedup_index = None
+            if self.deduplicator is not None:
+                if generation is None:
+                    dedup_index = await self._get_dedup_index()
+                    all_chunks, attached, dedup = await asyncio.to_thread(
+                        self.deduplicator.deduplicate_against, dedup_index, all_chunks, set(documents)
+                    )
+                else:
+                    all_chunks, dedup = await asyncio.to_thread(self.deduplicator.deduplicate, all_chunks)
+                self.dedup_stats["chunks"] += dedup["chunks"]
+                self.dedup_stats["duplicates_removed"] += dedup["duplicates_removed"]
+                self.dedup_stats["last"] = dedup
+                print(f"✓ Descartados {dedup['duplicates_removed']} chunks casi duplicados ({dedup['groups']} grupos)")
+            
+            # 2. Generar embeddings
+            texts = [chunk["text"] for chunk in all_chunks]
+            metadatas = [chunk["metadata"] for chunk in all_chunks]
+            ids = [f"{meta['filename']}::{meta['chunk_id']}" for meta in metadatas]
+            projector = projector or self.projector
+            if texts:
+                print("🔄 Generando embeddings (esto puede tomar varios minutos)...")
+                dimension = await self.embedding_generator.detect_dimension()
+                print(f"✓ Modelo {self.embedding_generator.model}: {dimension} dimensiones")
+                embeddings = await self.embedding_generator.generate_embeddings_batch(texts)
+                
+                print(f"✓ Generados {len(embeddings)} embeddings")
+                
+                # 3. Reducir dimensionalidad para el índice de búsqueda
+                if projector.method == "pca" and (refit_projection or not projector.is_fitted):
+                    projector.fit(embeddings)
+                index_embeddings = projector.transform_batch(embeddings)
+            
+            # 4. Reemplazar en el vector store (IDs únicos por archivo)
+            await self._release_duplicates(set(documents), generation=generation)
+            for filename in documents:
+                await self.store.delete_by_filename(filename, generation=generation)
+            if texts:
+                await self.store.add_documents(
+                    texts,
+                    index_embeddings,
+                    metadatas,
+                    ids,
+                    full_embeddings=embeddings if projector.enabled else None,
+                    generation=generation
+                )
+            if dedup_index is not None:
+                await self._update_dedup_index(dedup_index, set(documents), attached, ids, texts, metadatas)
+        
+        if generation is not None:
+            return len(all_chunks)
+        
+        for filename in documents:
+            signature = self._file_signature(filename)
+            if signature:
+                self._indexed_signatures[filename] = signature
+        
+        return len(all_chunks)
+    
+    async def _get_dedup_index(self) -> DedupIndex:
+        """Firmas de los chunks del índice activo (se arman al primer uso de cada generación)"""
+        generation = self.vector_store.active_generation
+        if self._dedup_index is None or self._dedup_index.generation != generation:
+            records = await self.store.get_all_documents()
+            dedup_index = DedupIndex(self.deduplicator, generation)
+            await asyncio.to_thread(dedup_index.add_many, records["ids"], records["documents"], records["metadatas"])
+            self._dedup_index = dedup_index
+        return self._dedup_index
+    
+    async def _update_dedup_index(
+        self,
+        dedup_index: DedupIndex,
+        filenames: Set[str],
+        attached: List[tuple],
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict]
+    ) -> None:
+        """
+        Refleja una escritura incremental en el índice de deduplicación
+        
+        Quita los archivos re-indexados (como _release_duplicates), agrega
+        a los chunks ya guardados las ubicaciones nuevas que los repiten y
+        registra los chunks recién guardados.
+        """
+        renamed = dedup_index.release(filenames)
+        targets: Dict[str, List[Dict]] = {}
+        for doc_id, location in attached:
+            targets.setdefault(renamed.get(doc_id, doc_id), []).append(location)
+        
+        if targets:
+            stored = await self.store.get_metadatas(list(targets))
+            updated_ids: List[str] = []
+            updated_metadatas: List[Dict] = []
+            for doc_id, locations in targets.items():
+                if doc_id not in stored:
+                    # Solo si se activó otra generación durante la escritura
+                    continue
+                metadata = dict(stored[doc_id])
+                set_chunk_sources(metadata, chunk_sources(metadata) + locations)
+                updated_ids.append(doc_id)
+                updated_metadatas.append(metadata)
+                for location in locations:
+                    dedup_index.attach(doc_id, location)
+            await self.store.update_metadatas(updated_ids, updated_metadatas)
+        
+        await asyncio.to_thread(dedup_index.add_many, ids, texts, metadatas)
+    
+    def _last_duplicates_removed(self) -> int:
+        last = self.dedup_stats["last"]
+        return last["duplicates_removed"] if last else 0
+    
+    async def _release_duplicates(self, filenames: Set[str], generation: Optional[str] = None) -> None:
+        """
+        Quita los archivos indicados de las fuentes de los chunks deduplicados
+        
+        Un chunk guardado bajo uno de estos archivos que también aparece en
+        otros se vuelve a agregar (con el mismo vector) a nombre de la primera
+        fuente restante, para que borrar o re-indexar un PDF no elimine texto
+        que otros PDFs siguen teniendo.
+        """
+        records = await self.store.get_duplicate_records(generation=generation)
+        moved = {"ids": [], "documents": [], "metadatas": [], "positions": []}
+        updated_ids: List[str] = []
+        updated_metadatas: List[Dict] = []
+        
+        for position, (doc_id, doc, meta) in enumerate(
+            zip(records["ids"], records["documents"], records["metadatas"])
+        ):
+            sources = chunk_sources(meta)
+            remaining = [source for source in sources if source["filename"] not in filenames]
+            if len(remaining) == len(sources) or not remaining:
+                continue
+            metadata = dict(meta)
+            set_chunk_sources(metadata, remaining)
+            if meta["filename"] not in filenames:
+                updated_ids.append(doc_id)
+                updated_metadatas.append(metadata)
+                continue
+            owner = remaining[0]
+            metadata.update(owner)
+            moved["ids"].append(f"{owner['filename']}::{owner['chunk_id']}")
+            moved["documents"].append(doc)
+            moved["metadatas"].append(metadata)
+            moved["positions"].append(position)
+        
+        if updated_ids:
+            await self.store.update_metadatas(updated_ids, updated_metadatas, generation=generation)
+        if moved["ids"]:
+            positions = moved["positions"]
+            full = records["full_embeddings"]
+            await self.store.add_documents(
+                moved["documents"],
+                records["embeddings"][positions],
+                moved["metadatas"],
+                moved["ids"],
+                full_embeddings=full[positions] if full is not None else None,
+                generation=generation
+            )
+    
+    def _file_signature(self, filename: str) -> Optional[tuple]:
+        """(mtime, tamaño) del PDF, o None si no existe"""
+        try:
+            stat = (self.pdf_dir / filename).stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def is_file_current(self, filename: str) -> bool:
+        """Indica si el PDF no cambió desde la última vez que se indexó en este proceso"""
+        signature = self._file_signature(filename)
+        return signature is not None and self._indexed_signatures.get(filename) == signature
+    
+    async def forget_document(self, filename: str) -> None:
+        """Elimina del índice un PDF borrado del directorio, junto con su caché de texto"""
+        await self.remove_document(filename)
+        self._indexed_signatures.pop(filename, None)
+        cache_path = Path(self.cache_dir) / f"{Path(filename).stem}.txt"
+        if cache_path.exists():
+            cache_path.unlink()
+    
     async def search_context(
         self,
         query: str,
@@ -105,36 +584,183 @@ class RAGEngine:
         Args:
             query: Texto de la consulta del usuario
             n_results: Cantidad de chunks a recuperar
-            filename_filter: Filtrar por nombre de archivo específico
+            filename_filter: Filtrar por nombre de archivo específico (incluye
+                los chunks deduplicados guardados a nombre de otro archivo)
         
         Returns:
             Lista de chunks relevantes con metadata
         """
         # Generar embedding de la consulta
         query_embedding = await self.embedding_generator.generate_embedding(query)
+        return await self.search_by_embedding(query_embedding, n_results, filename_filter)
+    
+    async def search_by_embedding(
+        self,
+        query_embedding: np.ndarray,
+        n_results: int = 5,
+        filename_filter: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Igual que search_context pero con el embedding de la consulta ya calculado
         
-        # Buscar en vector store
-        filter_meta = {"filename": filename_filter} if filename_filter else None
-        results = self.vector_store.search(
-            query_embedding,
-            n_results=n_results,
+        Permite buscar la misma consulta en varios namespaces embebiéndola una vez.
+        """
+        # Buscar en vector store (más candidatos si se re-rankea con vectores completos)
+        filter_meta = filename_where(filename_filter) if filename_filter else None
+        results = await self.store.search(
+            self.projector.transform(query_embedding),
+            n_results=self._candidate_count(n_results),
             filter_metadata=filter_meta
         )
         
-        # Formatear resultados
+        return await self._format_results(query_embedding, results, n_results)
+    
+    async def search_context_batch(
+        self,
+        queries: List[Dict],
+        default_n_results: int = 5
+    ) -> List[List[Dict]]:
+        """
+        Busca contexto para muchas consultas a la vez
+        
+        Los embeddings de todas las consultas se generan sobre una misma
+        conexión y las consultas con el mismo filtro se resuelven con una
+        única búsqueda matricial en el vector store.
+        
+        Args:
+            queries: Lista de dicts con keys query, n_results (opcional)
+                y filename_filter (opcional)
+            default_n_results: Cantidad de chunks cuando la consulta no la indica
+        
+        Returns:
+            Lista de resultados (en el mismo orden que queries)
+        """
+        if not queries:
+            return []
+        
+        query_embeddings = await self.embedding_generator.generate_embeddings(
+            [q["query"] for q in queries]
+        )
+        index_embeddings = self.projector.transform_batch(query_embeddings)
+        
+        # Agrupar por filtro: Chroma acepta un solo `where` por consulta matricial
+        groups: Dict[Optional[str], List[int]] = {}
+        for position, query in enumerate(queries):
+            groups.setdefault(query.get("filename_filter"), []).append(position)
+        
+        all_results: List[List[Dict]] = [[] for _ in queries]
+        for filename_filter, positions in groups.items():
+            n_max = max(queries[p].get("n_results") or default_n_results for p in positions)
+            filter_meta = filename_where(filename_filter) if filename_filter else None
+            batch_results = await self.store.search_batch(
+                [index_embeddings[p] for p in positions],
+                n_results=self._candidate_count(n_max),
+                filter_metadata=filter_meta
+            )
+            
+            for position, results in zip(positions, batch_results):
+                all_results[position] = await self._format_results(
+                    query_embeddings[position],
+                    results,
+                    queries[position].get("n_results") or default_n_results
+                )
+        
+        return all_results
+    
+    async def get_centroid(self, drift: float = 0.1) -> Optional[np.ndarray]:
+        """
+        Dirección media (normalizada) de los embeddings del índice activo
+        
+        Se calcula una vez por generación y se recalcula cuando la cantidad de
+        chunks cambia más de `drift` respecto del cálculo anterior.
+        """
+        generation = self.vector_store.active_generation
+        count = await self.store.count_documents()
+        if not count:
+            return None
+        cached = self._centroid
+        if cached and cached[0] == generation and abs(count - cached[1]) <= cached[1] * drift:
+            return cached[2]
+        centroid = await asyncio.to_thread(self._compute_centroid, generation)
+        self._centroid = (generation, count, centroid)
+        return centroid
+    
+    def _compute_centroid(self, generation: str) -> Optional[np.ndarray]:
+        total = None
+        for page in self.vector_store.iter_records(generation=generation):
+            embeddings = page["embeddings"]
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            partial = (embeddings / norms).sum(axis=0)
+            total = partial if total is None else total + partial
+        if total is None:
+            return None
+        norm = np.linalg.norm(total)
+        return total / norm if norm else None
+    
+    def _candidate_count(self, n_results: int) -> int:
+        """Cantidad de candidatos a pedir al índice (más si hay re-ranking)"""
+        if self.projector.enabled and self.vector_store.keep_full_vectors:
+            return n_results * self.rerank_factor
+        return n_results
+    
+    async def _format_results(
+        self,
+        query_embedding: np.ndarray,
+        results: Dict[str, List],
+        n_results: int
+    ) -> List[Dict]:
+        """
+        Convierte resultados del vector store en chunks de contexto ordenados
+        
+        `relevance_score` (1 - distancia L2²) se conserva por compatibilidad;
+        `similarity` es la similitud coseno, acotada a [-1, 1], entre la
+        consulta y el vector guardado y es la que usan los umbrales.
+        """
+        index_query = self.projector.transform(query_embedding)
         context_chunks = []
-        for i, (doc, meta, distance) in enumerate(
-            zip(results["documents"], results["metadatas"], results["distances"])
+        for doc_id, doc, meta, distance, vector in zip(
+            results["ids"], results["documents"], results["metadatas"], results["distances"], results["embeddings"]
         ):
-            context_chunks.append({
+            chunk = {
+                "id": doc_id,
                 "text": doc,
                 "filename": meta["filename"],
                 "page": meta["page"],
                 "relevance_score": 1 - distance,  # Convertir distancia a score
-                "rank": i + 1
-            })
+                "similarity": cosine_similarity(index_query, vector)
+            }
+            if meta.get("duplicate_count", 1) > 1:
+                # Todas las ubicaciones del texto deduplicado, para citarlas
+                chunk["sources"] = list({
+                    (source["filename"], source["page"]): {"filename": source["filename"], "page": source["page"]}
+                    for source in chunk_sources(meta)
+                }.values())
+            context_chunks.append(chunk)
+        
+        if self.projector.enabled and self.vector_store.keep_full_vectors:
+            context_chunks = await self._rerank(query_embedding, context_chunks)
+        
+        for i, chunk in enumerate(context_chunks[:n_results]):
+            chunk["rank"] = i + 1
+            chunk.pop("id", None)
         
-        return context_chunks
+        return context_chunks[:n_results]
+    
+    async def _rerank(self, query_embedding: np.ndarray, context_chunks: List[Dict]) -> List[Dict]:
+        """Re-ordena candidatos por similitud coseno con los vectores completos"""
+        full_vectors = await self.store.get_full_embeddings([c["id"] for c in context_chunks])
+        if not full_vectors:
+            return context_chunks
+        
+        for chunk in context_chunks:
+            vector = full_vectors.get(chunk["id"])
+            if vector is not None:
+                # Misma medida que en el índice reducido, pero sin la pérdida de la proyección
+                chunk["similarity"] = cosine_similarity(query_embedding, vector)
+            chunk["rerank_score"] = chunk["similarity"]
+        
+        return sorted(context_chunks, key=lambda c: c["rerank_score"], reverse=True)
     
     def build_rag_prompt(
         self,
@@ -160,7 +786,10 @@ class RAGEngine:
         context_section = "CONTEXTO DE DOCUMENTOS:\n\n"
         
         for chunk in context_chunks:
-            context_section += f"[{chunk['filename']} - Página {chunk['page']}]\n"
+            sources = chunk.get("sources") or [chunk]
+            context_section += "[" + "; ".join(
+                f"{source['filename']} - Página {source['page']}" for source in sources
+            ) + "]\n"
             context_section += f"{chunk['text']}\n\n"
         
         context_section += "---\n\n"
@@ -181,22 +810,66 @@ Cuando respondas:
         
         return enhanced_prompt
     
-    def get_stats(self) -> Dict:
+    async def get_stats(self) -> Dict:
         """Retorna estadísticas del sistema RAG"""
-        return self.vector_store.get_stats()
+        stats = await self.store.get_stats()
+        stats["embeddings"] = {
+            "model": self.embedding_generator.model,
+            "backend": self.embedding_generator.describe(),
+            "model_dimension": self.embedding_generator.dimension,
+            "index_dimension": await self.store.get_dimension(),
+            "projection": self.projector.describe(),
+            "full_vectors": self.vector_store.keep_full_vectors
+        }
+        stats["generations"] = await self.store.get_generations()
+        stats["dedup"] = {
+            "enabled": self.deduplicator is not None,
+            "threshold": self.deduplicator.threshold if self.deduplicator else None,
+            **self.dedup_stats
+        }
+        if self._pdf_extractor is not None:
+            stats["extraction"] = {
+                "backends": self._pdf_extractor.backends,
+                "page_timeout": self._pdf_extractor.page_timeout,
+                "slowest_documents": self._pdf_extractor.slowest_documents()
+            }
+        if self.sharded:
+            stats["shards"] = await self.store.health()
+        return stats
     
-    def clear_index(self) -> None:
-        """Limpia completamente el índice"""
-        self.vector_store.clear()
+    async def clear_index(self) -> None:
+        """Limpia el índice activando una generación vacía (la actual queda para rollback)"""
+        async with self._rebuild_lock:
+            await self.store.clear()
+            self.projector = self._projector_for(self.vector_store.active_generation)
+            self._indexed_signatures.clear()
+            self._prune_projections()
     
-    def remove_document(self, filename: str) -> None:
+    async def remove_document(self, filename: str) -> None:
         """Elimina un documento específico del índice"""
-        self.vector_store.delete_by_filename(filename)
+        async with self._index_lock:
+            await self._release_duplicates({filename})
+            await self.store.delete_by_filename(filename)
+            if self._dedup_index is not None:
+                self._dedup_index.release({filename})
     
-    def get_indexed_files(self) -> List[str]:
+    async def get_indexed_files(self) -> List[str]:
         """Retorna lista de archivos indexados"""
-        return self.vector_store.get_filenames()
+        return await self.store.get_filenames()
+    
+    @property
+    def sharded(self) -> bool:
+        """True si el índice está repartido en procesos worker"""
+        return hasattr(self.vector_store, "rebalance")
+    
+    def close(self) -> None:
+        """Libera los hilos del vector store y detiene los workers de los shards y de extracción"""
+        self.store.shutdown()
+        if self._pdf_extractor is not None:
+            self._pdf_extractor.close()
+        if self.sharded:
+            self.vector_store.close()
     
-    def is_indexed(self) -> bool:
+    async def is_indexed(self) -> bool:
         """Verifica si hay documentos indexados"""
-        return self.vector_store.count_documents() > 0
+        return await self.store.count_documents() > 0
@@ -0,0 +1,252 @@
+"""
+Precarga, keep-alive y calentamiento de los modelos de Ollama
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from .ollama_pool import OllamaEndpoint, OllamaPool, _model_key
+
+POLICIES = ("pin", "preload", "off")
+
+KeepAlive = Union[str, int, float, None]
+
+
+def _expires_in(expires_at: Optional[str]) -> Optional[float]:
+    """Segundos hasta que Ollama descargue el modelo (None si no se sabe)"""
+    if not expires_at:
+        return None
+    try:
+        expires = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return expires.timestamp() - time.time()
+
+
+class ModelResidencyManager:
+    """
+    Mantiene cargados en Ollama los modelos del chat y de embeddings
+
+    Sin esto la primera petición después de un rato sin uso paga la carga del
+    modelo (varios segundos) y cada petición sin `keep_alive` deja que Ollama
+    lo descargue a los 5 minutos.
+
+    Políticas:
+    - "pin": al arrancar carga los modelos en todas las instancias y en cada
+      ciclo vuelve a cargar los que Ollama haya descargado o estén por vencer.
+    - "preload": solo la carga inicial; después rige el `keep_alive`.
+    - "off": no carga nada; solo reporta el estado de /api/ps.
+
+    La carga de un modelo de chat es una generación mínima (un token) con el
+    system prompt, que además deja ese prefijo procesado en la instancia.
+    Los modelos se cargan de a uno por instancia para no competir por memoria.
+    """
+
+    def __init__(
+        self,
+        chat_pool: OllamaPool,
+        embedding_pool: OllamaPool,
+        chat_models: List[str],
+        embedding_models: List[str],
+        keep_alive: KeepAlive = "30m",
+        policy: str = "pin",
+        interval: float = 60.0,
+        system_prompt: Optional[str] = None,
+        load_timeout: float = 120.0
+    ):
+        """
+        Args:
+            chat_pool: Pool de instancias del chat
+            embedding_pool: Pool de instancias de embeddings
+            chat_models: Modelos de chat a mantener cargados
+            embedding_models: Modelos de embeddings a mantener cargados
+            keep_alive: Valor de keep_alive para Ollama ("30m", 3600, -1 = siempre,
+                None = el de Ollama)
+            policy: "pin", "preload" u "off"
+            interval: Segundos entre revisiones de /api/ps
+            system_prompt: System prompt con el que se calientan los modelos de chat
+            load_timeout: Timeout de cada carga (incluye leer el modelo del disco)
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Política de residencia desconocida: {policy} (usar {', '.join(POLICIES)})")
+        self.keep_alive = keep_alive
+        self.policy = policy
+        self.interval = interval
+        self.system_prompt = system_prompt
+        self.load_timeout = load_timeout
+        self._targets: List[Tuple[str, OllamaPool, List[str]]] = [
+            ("chat", chat_pool, list(dict.fromkeys(chat_models))),
+            ("embeddings", embedding_pool, list(dict.fromkeys(embedding_models))),
+        ]
+        self._task: Optional[asyncio.Task] = None
+        self._running: Dict[str, Dict[str, List[Dict]]] = {kind: {} for kind, _, _ in self._targets}
+        self._warmups: Dict[Tuple[str, str], Dict] = {}
+        self.loads = 0
+        self.load_failures = 0
+        self.last_run: Optional[float] = None
+
+    # ==================== Carga ====================
+
+    def _load_request(self, kind: str, model: str) -> Tuple[str, Dict]:
+        if kind == "chat":
+            messages = [{"role": "user", "content": "hola"}]
+            if self.system_prompt:
+                messages.insert(0, {"role": "system", "content": self.system_prompt})
+            path, payload = "/api/chat", {
+                "model": model,
+                "messages": messages,
+                "stream": False,
+                "options": {"num_predict": 1}
+            }
+        else:
+            path, payload = "/api/embeddings", {"model": model, "prompt": "hola"}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return path, payload
+
+    async def _load(self, pool: OllamaPool, endpoint: OllamaEndpoint, kind: str, model: str) -> None:
+        """Carga (o mantiene) un modelo en una instancia concreta"""
+        path, payload = self._load_request(kind, model)
+        started = time.perf_counter()
+        error = None
+        try:
+            response = await pool.client.post(f"{endpoint.url}{path}", json=payload, timeout=self.load_timeout)
+            response.raise_for_status()
+            self.loads += 1
+        except httpx.HTTPError as exc:
+            self.load_failures += 1
+            error = str(exc) or type(exc).__name__
+            print(f"⚠️  No se pudo cargar {model} en {endpoint.url}: {error}")
+        self._warmups[(endpoint.url, model)] = {
+            "endpoint": endpoint.url,
+            "kind": kind,
+            "model": model,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "at": time.time(),
+            "error": error
+        }
+
+    async def _running_models(self, pool: OllamaPool, endpoint: OllamaEndpoint) -> Optional[List[Dict]]:
+        """Modelos que la instancia tiene cargados según /api/ps (None si no responde)"""
+        try:
+            response = await pool.client.get(f"{endpoint.url}/api/ps", timeout=5.0)
+            response.raise_for_status()
+            models = response.json().get("models", [])
+        except (httpx.HTTPError, ValueError):
+            return None
+        running = []
+        for model in models:
+            expires_in = _expires_in(model.get("expires_at"))
+            running.append({
+                "name": _model_key(model.get("name") or model.get("model", "")),
+                "size": model.get("size"),
+                "size_vram": model.get("size_vram"),
+                "expires_at": model.get("expires_at"),
+                "expires_in_seconds": round(expires_in, 1) if expires_in is not None else None
+            })
+        return running
+
+    def _needs_load(self, running: List[Dict], model: str, initial: bool) -> bool:
+        if self.policy == "off":
+            return False
+        if initial:
+            # La carga inicial también calienta el system prompt
+            return True
+        if self.policy != "pin":
+            return False
+        current = next((item for item in running if item["name"] == _model_key(model)), None)
+        if current is None:
+            return True
+        # Renovar antes de que venza: se revisa cada `interval` segundos
+        expires_in = current["expires_in_seconds"]
+        return expires_in is not None and 0 <= expires_in < 2 * self.interval
+
+    async def _refresh_endpoint(
+        self,
+        kind: str,
+        pool: OllamaPool,
+        endpoint: OllamaEndpoint,
+        models: List[str],
+        initial: bool
+    ) -> None:
+        running = await self._running_models(pool, endpoint)
+        if running is None:
+            self._running[kind].pop(endpoint.url, None)
+            return
+        loaded = False
+        for model in models:
+            if self._needs_load(running, model, initial):
+                await self._load(pool, endpoint, kind, model)
+                loaded = True
+        if loaded:
+            running = await self._running_models(pool, endpoint) or running
+        self._running[kind][endpoint.url] = running
+
+    async def refresh(self, initial: bool = False) -> Dict:
+        """
+        Revisa /api/ps en todas las instancias y carga los modelos que falten
+
+        Args:
+            initial: Carga inicial (calienta todos los modelos aunque ya estén cargados)
+        """
+        # Los pools de chat y embeddings pueden apuntar a la misma instancia
+        # (por defecto ambos usan OLLAMA_BASE_URL): en cada URL se carga en
+        # serie; instancias distintas se revisan en paralelo
+        by_url: Dict[str, List[Tuple]] = {}
+        for kind, pool, models in self._targets:
+            for endpoint in pool.endpoints:
+                if endpoint.available:
+                    by_url.setdefault(endpoint.url, []).append((kind, pool, endpoint, models))
+
+        async def refresh_url(targets: List[Tuple]) -> None:
+            for kind, pool, endpoint, models in targets:
+                await self._refresh_endpoint(kind, pool, endpoint, models, initial)
+
+        await asyncio.gather(*(refresh_url(targets) for targets in by_url.values()))
+        self.last_run = time.time()
+        return self.state()
+
+    # ==================== Ciclo de vida ====================
+
+    async def _loop(self) -> None:
+        initial = True
+        while True:
+            try:
+                await self.refresh(initial=initial)
+                initial = False
+            except Exception as error:  # noqa: BLE001
+                print(f"⚠️  Error revisando los modelos cargados en Ollama: {error}")
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Inicia la carga inicial y la revisión periódica (requiere un event loop corriendo)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def state(self) -> Dict:
+        """Estado de residencia para /metrics (no consulta a Ollama)"""
+        return {
+            "policy": self.policy,
+            "keep_alive": self.keep_alive,
+            "interval": self.interval,
+            "last_run": self.last_run,
+            "loads": self.loads,
+            "load_failures": self.load_failures,
+            "models": {kind: models for kind, _, models in self._targets},
+            "running": {kind: dict(running) for kind, running in self._running.items()},
+            "warmups": list(self._warmups.values())
+        }
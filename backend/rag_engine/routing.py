@@ -0,0 +1,189 @@
+"""
+Elige entre un modelo de chat rápido y uno de mayor calidad según el turno
+"""
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .text import normalize_text
+
+FAST = "fast"
+QUALITY = "quality"
+
+# Pedidos que suelen requerir razonamiento o respuestas elaboradas (normalizados)
+COMPLEX_TERMS = (
+    "por que", "explica", "explicame", "compara", "comparar", "diferencia", "diferencias",
+    "analiza", "analizar", "ventajas", "desventajas", "demuestra", "demostrar", "calcula",
+    "calcular", "resuelve", "resolver", "paso a paso", "como funciona", "justifica",
+    "evalua", "relacion entre", "resume", "resumen", "ejemplo", "ejemplos",
+)
+
+
+class _RouteStats:
+    """Cantidad de turnos y latencias recientes de una ruta"""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.failures = 0
+        self.reasons: Dict[str, int] = {}
+        self.first_token: Deque[float] = deque(maxlen=window)
+        self.total: Deque[float] = deque(maxlen=window)
+
+    @staticmethod
+    def _summary(values: Deque[float]) -> Dict:
+        ordered = sorted(values)
+        if not ordered:
+            return {"avg_ms": 0.0, "p95_ms": 0.0}
+        return {
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1)
+        }
+
+    def as_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "reasons": dict(self.reasons),
+            "first_token": self._summary(self.first_token),
+            "total": self._summary(self.total)
+        }
+
+
+class ModelRouter:
+    """
+    Clasifica cada turno con señales baratas y lo manda al modelo rápido o al
+    de calidad
+
+    Va al modelo de calidad si se cumple alguna de estas condiciones (en orden):
+    - long_prompt: el mensaje del usuario supera `max_fast_chars`
+    - deep_history: la conversación tiene más de `max_fast_turns` turnos del usuario
+    - complex_wording: el mensaje pide explicar, comparar, calcular, etc.
+    - weak_context: hubo búsqueda RAG pero el mejor chunk tiene una similitud
+      coseno (`similarity`) menor a `min_fast_relevance` (el modelo chico
+      responde peor sin buen contexto)
+
+    En cualquier otro caso ("simple") se usa el modelo rápido. Las decisiones y
+    la latencia de cada ruta quedan en metrics() para ajustar los umbrales.
+    """
+
+    def __init__(
+        self,
+        fast_model: str,
+        quality_model: str,
+        max_fast_chars: int = 160,
+        max_fast_turns: int = 6,
+        min_fast_relevance: Optional[float] = 0.5,
+        complex_terms: Optional[Tuple[str, ...]] = None,
+        window: int = 512
+    ):
+        """
+        Args:
+            fast_model: Modelo chico para consultas simples
+            quality_model: Modelo grande para el resto
+            max_fast_chars: Largo máximo del mensaje para la ruta rápida
+            max_fast_turns: Turnos del usuario en la conversación para la ruta rápida
+            min_fast_relevance: Similitud coseno mínima del mejor chunk RAG para
+                la ruta rápida (None = no se considera)
+            complex_terms: Expresiones (normalizadas) que fuerzan la ruta de calidad
+            window: Turnos recientes usados para las latencias
+        """
+        self.models = {FAST: fast_model, QUALITY: quality_model}
+        self.max_fast_chars = max_fast_chars
+        self.max_fast_turns = max_fast_turns
+        self.min_fast_relevance = min_fast_relevance
+        self.complex_terms = COMPLEX_TERMS if complex_terms is None else complex_terms
+        self._stats = {FAST: _RouteStats(window), QUALITY: _RouteStats(window)}
+        self.client_selected = 0
+
+    def _is_complex(self, prompt: str) -> bool:
+        normalized = f" {normalize_text(prompt)} "
+        return any(f" {term} " in normalized for term in self.complex_terms)
+
+    def classify(
+        self,
+        prompt: str,
+        user_turns: int,
+        top_relevance: Optional[float] = None
+    ) -> Tuple[str, str]:
+        """
+        Args:
+            prompt: Último mensaje del usuario
+            user_turns: Mensajes del usuario en la conversación (incluido este)
+            top_relevance: Similitud del mejor chunk recuperado (None = sin búsqueda
+                o sin resultados)
+
+        Returns:
+            (ruta, motivo)
+        """
+        if len(prompt) > self.max_fast_chars:
+            return QUALITY, "long_prompt"
+        if user_turns > self.max_fast_turns:
+            return QUALITY, "deep_history"
+        if self._is_complex(prompt):
+            return QUALITY, "complex_wording"
+        if (
+            top_relevance is not None
+            and self.min_fast_relevance is not None
+            and top_relevance < self.min_fast_relevance
+        ):
+            return QUALITY, "weak_context"
+        return FAST, "simple"
+
+    def route(self, prompt: str, user_turns: int, context_chunks: Optional[List[Dict]] = None) -> Tuple[str, str]:
+        """
+        Decide y registra la ruta de un turno
+
+        Returns:
+            (ruta, modelo)
+        """
+        top_relevance = None
+        if context_chunks:
+            top_relevance = max(chunk["similarity"] for chunk in context_chunks)
+        route, reason = self.classify(prompt, user_turns, top_relevance)
+        stats = self._stats[route]
+        stats.count += 1
+        stats.reasons[reason] = stats.reasons.get(reason, 0) + 1
+        return route, self.models[route]
+
+    def record(self, route: str, first_token: Optional[float], total: float, ok: bool = True) -> None:
+        """Registra la latencia (segundos) de una respuesta generada por la ruta"""
+        stats = self._stats[route]
+        if not ok:
+            stats.failures += 1
+            return
+        if first_token is not None:
+            stats.first_token.append(first_token)
+        stats.total.append(total)
+
+    def metrics(self) -> Dict:
+        return {
+            "models": dict(self.models),
+            "client_selected": self.client_selected,
+            "routes": {route: stats.as_dict() for route, stats in self._stats.items()}
+        }
+
+
+class RouteTimer:
+    """
+    Mide una respuesta generada por una ruta y la registra al salir del bloque
+
+    Sin router o sin ruta (modelo elegido por el cliente) no registra nada.
+    """
+
+    def __init__(self, router: Optional[ModelRouter], route: Optional[str]):
+        self.router = router
+        self.route = route
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+
+    def token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+
+    def __enter__(self) -> "RouteTimer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if self.router is not None and self.route is not None:
+            self.router.record(self.route, self.first_token, time.perf_counter() - self.started, ok=exc_type is None)
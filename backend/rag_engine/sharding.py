@@ -0,0 +1,618 @@
+"""
+Vector store particionado en procesos worker con búsqueda scatter-gather
+"""
+import json
+import multiprocessing
+import os
+import queue
+import secrets
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .vector_store import VectorStore
+
+# Métodos del VectorStore que un worker acepta ejecutar
+_SHARD_METHODS = {
+    "add_documents", "add_bulk", "search", "search_batch", "get_full_embeddings", "get_metadatas",
+    "get_dimension", "get_records_page", "get_records_by_filename", "get_duplicate_records",
+    "get_all_documents", "count_documents", "clear", "delete_by_filename", "update_metadatas",
+    "get_filenames", "get_file_stats", "get_stats",
+    "begin_generation", "activate_generation", "discard_generation", "rollback",
+    "get_generations",
+}
+
+
+class ShardError(RuntimeError):
+    """Un shard no respondió o rechazó la operación"""
+
+
+def _serve_shard(persist_dir: str, keep_full_vectors: bool, collection_name: str, authkey: bytes, ready) -> None:
+    """Proceso worker: abre el VectorStore del shard y atiende peticiones por socket local"""
+    store = VectorStore(persist_dir, keep_full_vectors=keep_full_vectors, collection_name=collection_name)
+    listener = Listener(authkey=authkey)
+    ready.send(listener.address)
+    ready.close()
+    while True:
+        try:
+            conn = listener.accept()
+        except (OSError, EOFError):
+            continue
+        threading.Thread(target=_handle_connection, args=(store, conn), daemon=True).start()
+
+
+def _handle_connection(store: VectorStore, conn) -> None:
+    with conn:
+        while True:
+            try:
+                method, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if method == "ping":
+                    result = {"pid": os.getpid(), "chunks": store.count_documents()}
+                elif method in _SHARD_METHODS:
+                    result = getattr(store, method)(*args, **kwargs)
+                else:
+                    raise ValueError(f"Operación no permitida: {method}")
+                reply = ("ok", result)
+            except Exception as e:  # noqa: BLE001
+                reply = ("error", f"{type(e).__name__}: {e}")
+            conn.send(reply)
+
+
+class _Shard:
+    """Proceso worker de un shard y su pool de conexiones"""
+
+    def __init__(self, index: int, persist_dir: Path, keep_full_vectors: bool, collection_name: str, authkey: bytes):
+        self.index = index
+        self.persist_dir = persist_dir
+        self.keep_full_vectors = keep_full_vectors
+        self.collection_name = collection_name
+        self.authkey = authkey
+        self.process = None
+        self.address = None
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self._connections: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def start(self, timeout: float) -> None:
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=_serve_shard,
+            args=(str(self.persist_dir), self.keep_full_vectors, self.collection_name, self.authkey, sender),
+            name=f"willay-shard-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        sender.close()
+        if not receiver.poll(timeout):
+            self.process.terminate()
+            raise ShardError(f"El shard {self.index} no arrancó en {timeout}s")
+        self.address = receiver.recv()
+        receiver.close()
+
+    def restart(self, timeout: float) -> None:
+        with self._lock:
+            self.stop()
+            self.start(timeout)
+            self.restarts += 1
+
+    def stop(self) -> None:
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                break
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(timeout=5)
+            self.process = None
+
+    def call(self, method: str, *args, **kwargs):
+        try:
+            conn = self._connections.get_nowait()
+        except queue.Empty:
+            conn = Client(self.address, authkey=self.authkey)
+        try:
+            conn.send((method, args, kwargs))
+            status, result = conn.recv()
+        except BaseException:
+            conn.close()
+            raise
+        self._connections.put(conn)
+        if status == "error":
+            raise ShardError(f"Shard {self.index}: {result}")
+        return result
+
+
+class ShardedVectorStore:
+    """
+    Reparte el índice entre N procesos worker con la misma interfaz que VectorStore
+
+    Cada shard es un VectorStore propio (`persist_dir/shard_<i>/`) servido por
+    un proceso aparte a través de un socket local autenticado, así las
+    búsquedas usan varios núcleos y la memoria del índice no recae en un solo
+    proceso. Cada archivo vive completo en un shard: por defecto el que indica
+    crc32(nombre) % N, salvo que rebalance() lo haya movido (la ubicación se
+    guarda en `shards.json`). Las búsquedas se envían a todos los shards en
+    paralelo y se combinan los k mejores por distancia.
+    """
+
+    def __init__(
+        self,
+        persist_dir: str = "backend/rag_engine/vector_store",
+        num_shards: int = 2,
+        keep_full_vectors: bool = False,
+        collection_name: str = VectorStore.DEFAULT_COLLECTION,
+        start_timeout: float = 60.0
+    ):
+        """
+        Args:
+            persist_dir: Directorio base; cada shard usa un subdirectorio
+            num_shards: Cantidad de procesos worker
+            keep_full_vectors: Guardar también los vectores completos
+            collection_name: Nombre base de la colección en cada shard
+            start_timeout: Segundos máximos de arranque de cada worker
+        """
+        if num_shards < 1:
+            raise ValueError("num_shards debe ser al menos 1")
+        self.persist_dir = Path(persist_dir)
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        self.num_shards = num_shards
+        self.keep_full_vectors = keep_full_vectors
+        self.collection_name = collection_name
+        self.start_timeout = start_timeout
+
+        if collection_name == VectorStore.DEFAULT_COLLECTION:
+            placement_name = "shards.json"
+        else:
+            placement_name = f"shards_{collection_name}.json"
+        self._placement_path = self.persist_dir / placement_name
+        self._placement_lock = threading.Lock()
+        self._placement = self._load_placement()
+
+        authkey = secrets.token_bytes(32)
+        self._shards = [
+            _Shard(i, self.persist_dir / f"shard_{i}", keep_full_vectors, collection_name, authkey)
+            for i in range(num_shards)
+        ]
+        self._pool = ThreadPoolExecutor(max_workers=num_shards * 4, thread_name_prefix="shard-scatter")
+        # Los workers arrancan en paralelo (cada uno importa chromadb)
+        list(self._pool.map(lambda shard: shard.start(start_timeout), self._shards))
+        print(f"✓ {num_shards} shards iniciados en {self.persist_dir}")
+
+    # ==================== Ubicación de archivos ====================
+
+    def _load_placement(self) -> Dict:
+        if self._placement_path.exists():
+            placement = json.loads(self._placement_path.read_text(encoding="utf-8"))
+            if placement["num_shards"] != self.num_shards and placement["files"]:
+                raise ValueError(
+                    f"El índice está repartido en {placement['num_shards']} shards; "
+                    f"para usar {self.num_shards} hay que reconstruirlo desde cero"
+                )
+            placement["num_shards"] = self.num_shards
+            return placement
+        return {"num_shards": self.num_shards, "files": {}}
+
+    def _save_placement(self) -> None:
+        tmp_path = self._placement_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._placement, indent=2, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self._placement_path)
+
+    def shard_for(self, filename: str) -> int:
+        """Shard que contiene (o recibirá) un archivo"""
+        entry = self._placement["files"].get(filename)
+        if entry is not None:
+            return entry["shard"]
+        return zlib.crc32(filename.encode("utf-8")) % self.num_shards
+
+    # ==================== Comunicación con los shards ====================
+
+    def _call(self, index: int, method: str, *args, **kwargs):
+        """Ejecuta una operación en un shard, reiniciándolo una vez si se cayó"""
+        shard = self._shards[index]
+        try:
+            return shard.call(method, *args, **kwargs)
+        except (EOFError, OSError) as e:
+            shard.last_error = str(e) or type(e).__name__
+            print(f"⚠️  Shard {index} no responde ({shard.last_error}); reiniciando...")
+            shard.restart(self.start_timeout)
+            return shard.call(method, *args, **kwargs)
+
+    def _scatter(self, method: str, *args, **kwargs) -> List:
+        """Ejecuta la misma operación en todos los shards en paralelo"""
+        futures = [
+            self._pool.submit(self._call, index, method, *args, **kwargs)
+            for index in range(self.num_shards)
+        ]
+        return [future.result() for future in futures]
+
+    def _group_by_shard(self, metadatas: List[Dict]) -> Dict[int, List[int]]:
+        groups: Dict[int, List[int]] = {}
+        for position, metadata in enumerate(metadatas):
+            groups.setdefault(self.shard_for(metadata["filename"]), []).append(position)
+        return groups
+
+    def _record_placement(
+        self,
+        metadatas: List[Dict],
+        groups: Dict[int, List[int]],
+        generation: Optional[str] = None
+    ) -> None:
+        """
+        Registra el shard de cada archivo y suma sus chunks nuevos
+
+        Los conteos son los de la generación activa: un archivo puede recibir
+        chunks en varias escrituras (p. ej. los deduplicados que hereda de otro
+        PDF), así que se acumulan. Las escrituras en una generación en
+        construcción solo fijan el shard; los conteos se recalculan al activarla.
+        """
+        counts: Dict[str, List[int]] = {}
+        for index, positions in groups.items():
+            for position in positions:
+                entry = counts.setdefault(metadatas[position]["filename"], [index, 0])
+                entry[1] += 1
+        with self._placement_lock:
+            files = self._placement["files"]
+            for filename, (index, chunks) in counts.items():
+                entry = files.setdefault(filename, {"shard": index, "chunks": 0})
+                if generation is None:
+                    entry["chunks"] += chunks
+            self._save_placement()
+
+    def _refresh_counts(self) -> None:
+        """Recalcula los chunks de cada archivo desde los shards (generación activa)"""
+        counts = {filename: info["stored"] for filename, info in self.get_file_stats().items()}
+        with self._placement_lock:
+            for filename, entry in self._placement["files"].items():
+                entry["chunks"] = counts.get(filename, 0)
+            self._save_placement()
+
+    # ==================== Escritura ====================
+
+    def add_documents(
+        self,
+        texts: List[str],
+        embeddings: List[np.ndarray],
+        metadatas: List[Dict],
+        ids: Optional[List[str]] = None,
+        full_embeddings: Optional[List[np.ndarray]] = None,
+        generation: Optional[str] = None
+    ) -> None:
+        """Agrega documentos enviando cada archivo a su shard"""
+        if not ids:
+            ids = [f"doc_{i}" for i in range(len(texts))]
+        groups = self._group_by_shard(metadatas)
+
+        def pick(values, positions):
+            return None if values is None else [values[p] for p in positions]
+
+        futures = [
+            self._pool.submit(
+                self._call, index, "add_documents",
+                pick(texts, positions), pick(embeddings, positions), pick(metadatas, positions),
+                pick(ids, positions), full_embeddings=pick(full_embeddings, positions), generation=generation
+            )
+            for index, positions in groups.items()
+        ]
+        for future in futures:
+            future.result()
+        self._record_placement(metadatas, groups, generation)
+
+    def add_bulk(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict],
+        embeddings: np.ndarray,
+        full_embeddings: Optional[np.ndarray] = None,
+        generation: Optional[str] = None
+    ) -> None:
+        """Inserta chunks ya embebidos (p. ej. desde un snapshot) en sus shards"""
+        groups = self._group_by_shard(metadatas)
+        futures = []
+        for index, positions in groups.items():
+            futures.append(self._pool.submit(
+                self._call, index, "add_bulk",
+                [ids[p] for p in positions],
+                [documents[p] for p in positions],
+                [metadatas[p] for p in positions],
+                np.take(embeddings, positions, axis=0),
+                full_embeddings=None if full_embeddings is None else np.take(full_embeddings, positions, axis=0),
+                generation=generation
+            ))
+        for future in futures:
+            future.result()
+        self._record_placement(metadatas, groups, generation)
+
+    def delete_by_filename(self, filename: str, generation: Optional[str] = None) -> None:
+        """Elimina un archivo (se consulta a todos los shards por si fue movido)"""
+        self._scatter("delete_by_filename", filename, generation=generation)
+        if generation is None:
+            with self._placement_lock:
+                if self._placement["files"].pop(filename, None) is not None:
+                    self._save_placement()
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict], generation: Optional[str] = None) -> None:
+        """Actualiza la metadata en el shard de cada archivo (no cambia de archivo)"""
+        groups = self._group_by_shard(metadatas)
+        futures = [
+            self._pool.submit(
+                self._call, index, "update_metadatas",
+                [ids[p] for p in positions], [metadatas[p] for p in positions], generation=generation
+            )
+            for index, positions in groups.items()
+        ]
+        for future in futures:
+            future.result()
+
+    def clear(self) -> None:
+        """Deja vacíos todos los shards (cada uno conserva su generación anterior)"""
+        self._scatter("clear")
+        self._refresh_counts()
+
+    # ==================== Generaciones ====================
+
+    @property
+    def active_generation(self) -> str:
+        return self._call(0, "get_generations")["active"]
+
+    def begin_generation(self) -> str:
+        """Crea una generación nueva en todos los shards (con el mismo nombre)"""
+        names = self._scatter("begin_generation")
+        if len(set(names)) != 1:
+            for index, name in enumerate(names):
+                self._call(index, "discard_generation", name)
+            raise ShardError(f"Los shards no coinciden en la generación: {names}")
+        return names[0]
+
+    def activate_generation(self, name: str) -> None:
+        self._scatter("activate_generation", name)
+        self._refresh_counts()
+
+    def discard_generation(self, name: str) -> None:
+        self._scatter("discard_generation", name)
+
+    def rollback(self) -> str:
+        name = self._scatter("rollback")[0]
+        self._refresh_counts()
+        return name
+
+    def get_generations(self) -> Dict:
+        return self._call(0, "get_generations")
+
+    # ==================== Lectura ====================
+
+    @staticmethod
+    def _merge(results: List[Dict], n_results: int) -> Dict[str, List]:
+        rows = []
+        for result in results:
+            rows.extend(zip(
+                result["distances"], result["ids"], result["documents"], result["metadatas"], result["embeddings"]
+            ))
+        rows.sort(key=lambda row: row[0])
+        rows = rows[:n_results]
+        return {
+            "ids": [row[1] for row in rows],
+            "documents": [row[2] for row in rows],
+            "metadatas": [row[3] for row in rows],
+            "distances": [row[0] for row in rows],
+            "embeddings": [row[4] for row in rows]
+        }
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        n_results: int = 5,
+        filter_metadata: Optional[Dict] = None,
+        generation: Optional[str] = None
+    ) -> Dict[str, List]:
+        """Busca en todos los shards en paralelo y combina los k más cercanos"""
+        results = self._scatter("search", query_embedding, n_results, filter_metadata, generation=generation)
+        return self._merge(results, n_results)
+
+    def search_batch(
+        self,
+        query_embeddings: List[np.ndarray],
+        n_results: int = 5,
+        filter_metadata: Optional[Dict] = None
+    ) -> List[Dict[str, List]]:
+        """Búsqueda matricial en todos los shards, combinada consulta por consulta"""
+        if not query_embeddings:
+            return []
+        per_shard = self._scatter("search_batch", query_embeddings, n_results, filter_metadata)
+        return [
+            self._merge([shard_results[i] for shard_results in per_shard], n_results)
+            for i in range(len(query_embeddings))
+        ]
+
+    def get_full_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Vectores completos pedidos al shard de cada archivo (IDs `archivo::chunk`)"""
+        if not self.keep_full_vectors or not ids:
+            return {}
+        groups: Dict[int, List[str]] = {}
+        for doc_id in ids:
+            groups.setdefault(self.shard_for(doc_id.split("::", 1)[0]), []).append(doc_id)
+        futures = [self._pool.submit(self._call, index, "get_full_embeddings", group) for index, group in groups.items()]
+        found: Dict[str, np.ndarray] = {}
+        for future in futures:
+            found.update(future.result())
+
+        missing = [doc_id for doc_id in ids if doc_id not in found]
+        if missing:
+            for result in self._scatter("get_full_embeddings", missing):
+                found.update(result)
+        return found
+
+    def get_metadatas(self, ids: List[str], generation: Optional[str] = None) -> Dict[str, Dict]:
+        """Metadata pedida al shard de cada archivo (IDs `archivo::chunk`)"""
+        groups: Dict[int, List[str]] = {}
+        for doc_id in ids:
+            groups.setdefault(self.shard_for(doc_id.split("::", 1)[0]), []).append(doc_id)
+        futures = [
+            self._pool.submit(self._call, index, "get_metadatas", group, generation=generation)
+            for index, group in groups.items()
+        ]
+        found: Dict[str, Dict] = {}
+        for future in futures:
+            found.update(future.result())
+        return found
+
+    def get_dimension(self) -> Optional[int]:
+        return next((dimension for dimension in self._scatter("get_dimension") if dimension), None)
+
+    def iter_records(self, batch_size: int = 1000, generation: Optional[str] = None) -> Iterator[Dict]:
+        """Recorre los chunks de todos los shards, uno tras otro"""
+        for index in range(self.num_shards):
+            offset = 0
+            while True:
+                page = self._call(index, "get_records_page", offset, batch_size, generation=generation)
+                if not page["ids"]:
+                    break
+                yield page
+                offset += len(page["ids"])
+
+    def get_duplicate_records(self, generation: Optional[str] = None) -> Dict:
+        """Chunks con duplicados de todos los shards (ver VectorStore.get_duplicate_records)"""
+        parts = [part for part in self._scatter("get_duplicate_records", generation=generation) if part["ids"]]
+        combined: Dict = {"ids": [], "documents": [], "metadatas": []}
+        for part in parts:
+            for key in combined:
+                combined[key].extend(part[key])
+        combined["embeddings"] = np.vstack([part["embeddings"] for part in parts]) if parts else np.zeros((0, 0), dtype=np.float32)
+        full = [part["full_embeddings"] for part in parts if part["full_embeddings"] is not None]
+        combined["full_embeddings"] = np.vstack(full) if full and len(full) == len(parts) else None
+        return combined
+
+    def get_all_documents(self) -> Dict[str, List]:
+        combined: Dict[str, List] = {"ids": [], "documents": [], "metadatas": []}
+        for result in self._scatter("get_all_documents"):
+            for key in combined:
+                combined[key].extend(result.get(key) or [])
+        return combined
+
+    def count_documents(self, generation: Optional[str] = None) -> int:
+        return sum(self._scatter("count_documents", generation=generation))
+
+    def get_filenames(self) -> List[str]:
+        return sorted(self.get_file_stats())
+
+    def get_file_stats(self) -> Dict[str, Dict]:
+        """Combina los conteos por archivo (un deduplicado puede citar archivos de otro shard)"""
+        files: Dict[str, Dict] = {}
+        for shard_files in self._scatter("get_file_stats"):
+            for filename, info in shard_files.items():
+                merged = files.setdefault(filename, {"chunks": 0, "stored": 0, "pages": set()})
+                merged["chunks"] += info["chunks"]
+                merged["stored"] += info["stored"]
+                merged["pages"] |= info["pages"]
+        return files
+
+    def get_stats(self) -> Dict:
+        return VectorStore.stats_from_files(self.count_documents(), self.get_file_stats())
+
+    # ==================== Salud y balanceo ====================
+
+    def health(self) -> List[Dict]:
+        """Estado de cada shard; los procesos caídos se reinician"""
+        report = []
+        for shard in self._shards:
+            entry = {"shard": shard.index, "restarts": shard.restarts, "last_error": shard.last_error}
+            if not shard.alive:
+                try:
+                    shard.restart(self.start_timeout)
+                    entry["restarted"] = True
+                except ShardError as e:
+                    shard.last_error = str(e)
+                    report.append({**entry, "alive": False, "last_error": str(e)})
+                    continue
+            started = time.perf_counter()
+            try:
+                ping = self._call(shard.index, "ping")
+            except (ShardError, OSError, EOFError) as e:
+                report.append({**entry, "alive": False, "last_error": str(e)})
+                continue
+            report.append({
+                **entry,
+                "alive": True,
+                "pid": ping["pid"],
+                "chunks": ping["chunks"],
+                "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+                "restarts": shard.restarts
+            })
+        return report
+
+    def rebalance(self, tolerance: float = 0.2) -> Dict:
+        """
+        Mueve archivos completos desde los shards más cargados a los menos cargados
+
+        Se detiene cuando ningún shard supera el promedio de chunks en más de
+        `tolerance` o cuando ya no hay un movimiento que reduzca la diferencia.
+
+        Returns:
+            Dict con los archivos movidos y la carga final de cada shard
+        """
+        # Decidir con los conteos reales de los shards, no con los acumulados
+        self._refresh_counts()
+        with self._placement_lock:
+            files = {name: dict(entry) for name, entry in self._placement["files"].items()}
+
+        loads = [0] * self.num_shards
+        for entry in files.values():
+            loads[entry["shard"]] += entry["chunks"]
+        average = sum(loads) / self.num_shards
+
+        moved = []
+        while average and max(loads) > average * (1 + tolerance):
+            source = loads.index(max(loads))
+            target = loads.index(min(loads))
+            gap = loads[source] - loads[target]
+            # El archivo más grande que achica la diferencia entre ambos shards
+            candidates = [
+                (entry["chunks"], name) for name, entry in files.items()
+                if entry["shard"] == source and 0 < entry["chunks"] < gap
+            ]
+            if not candidates:
+                break
+            chunks, filename = max(candidates)
+
+            records = self._call(source, "get_records_by_filename", filename)
+            if records["ids"]:
+                self._call(
+                    target, "add_bulk",
+                    records["ids"], records["documents"], records["metadatas"], records["embeddings"],
+                    full_embeddings=records["full_embeddings"]
+                )
+                self._call(source, "delete_by_filename", filename)
+
+            files[filename]["shard"] = target
+            loads[source] -= chunks
+            loads[target] += chunks
+            moved.append({"filename": filename, "from": source, "to": target, "chunks": chunks})
+            with self._placement_lock:
+                self._placement["files"][filename] = {"shard": target, "chunks": chunks}
+                self._save_placement()
+
+        if moved:
+            print(f"✓ Rebalanceo: {len(moved)} archivos movidos")
+        return {"moved": moved, "loads": loads}
+
+    def close(self) -> None:
+        """Detiene los procesos worker"""
+        for shard in self._shards:
+            shard.stop()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,342 @@
+"""
+Snapshots portables del índice RAG para replicarlo entre nodos sin re-embeber
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+
+class SnapshotError(Exception):
+    """Snapshot inválido, corrupto o incompatible con este nodo"""
+
+
+class SnapshotManager:
+    """
+    Exporta e importa la generación activa del índice como un único archivo
+
+    El snapshot es un tar sin comprimir con:
+
+    - `manifest.json`: versión del formato, modelo de embeddings, dimensiones,
+      proyección, PDFs de origen (con su SHA-256) y el SHA-256 de cada miembro
+    - `records.jsonl`: id, texto y metadata de cada chunk
+    - `embeddings.npy` (y `full_embeddings.npy` si se guardan vectores completos)
+    - `projection.npz` si la proyección es PCA
+    - `cache/*.txt`: texto extraído de cada PDF
+
+    Al no estar comprimido, las matrices .npy se leen con memmap directamente
+    desde el tar al importarlas, sin copiarlas a memoria ni a disco.
+    """
+
+    FORMAT = "willay-index-snapshot"
+    VERSION = 1
+    MANIFEST = "manifest.json"
+
+    def __init__(self, rag_engine, batch_size: int = 1000):
+        """
+        Args:
+            rag_engine: Instancia de RAGEngine a exportar o sobre la que importar
+            batch_size: Chunks por página al leer la colección en la exportación
+        """
+        self.rag = rag_engine
+        self.batch_size = batch_size
+
+    # ==================== Exportación ====================
+
+    async def export(self, path: str) -> Dict:
+        """
+        Escribe un snapshot de la generación activa en `path`
+
+        Returns:
+            El manifest del snapshot
+        """
+        async with self.rag._rebuild_lock:
+            generation = self.rag.vector_store.active_generation
+            return await asyncio.to_thread(self._export, Path(path), generation, self.rag.projector)
+
+    def _export(self, path: Path, generation: str, projector) -> Dict:
+        store = self.rag.vector_store
+        total = store.count_documents(generation=generation)
+        if total == 0:
+            raise SnapshotError("El índice está vacío, no hay nada que exportar")
+
+        with tempfile.TemporaryDirectory(prefix="willay-snapshot-") as tmp:
+            workdir = Path(tmp)
+            members: List[str] = []
+
+            # Chunks: registros en JSON Lines y vectores en matrices .npy
+            embeddings = full_embeddings = None
+            filenames = set()
+            row = 0
+            with open(workdir / "records.jsonl", "w", encoding="utf-8") as records:
+                for page in store.iter_records(self.batch_size, generation=generation):
+                    count = len(page["ids"])
+                    if embeddings is None:
+                        embeddings = np.lib.format.open_memmap(
+                            workdir / "embeddings.npy", mode="w+", dtype=np.float32,
+                            shape=(total, page["embeddings"].shape[1])
+                        )
+                    embeddings[row:row + count] = page["embeddings"]
+
+                    if page["full_embeddings"] is not None:
+                        if any(vector is None for vector in page["full_embeddings"]):
+                            raise SnapshotError("Faltan vectores completos para algunos chunks")
+                        full = np.asarray(page["full_embeddings"], dtype=np.float32)
+                        if full_embeddings is None:
+                            full_embeddings = np.lib.format.open_memmap(
+                                workdir / "full_embeddings.npy", mode="w+", dtype=np.float32,
+                                shape=(total, full.shape[1])
+                            )
+                        full_embeddings[row:row + count] = full
+
+                    for doc_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                        filenames.add(metadata["filename"])
+                        records.write(json.dumps(
+                            {"id": doc_id, "document": document, "metadata": metadata},
+                            ensure_ascii=False
+                        ) + "\n")
+                    row += count
+
+            if row != total:
+                raise SnapshotError(f"El índice cambió durante la exportación ({row} de {total} chunks)")
+
+            index_dimension = int(embeddings.shape[1])
+            full_dimension = int(full_embeddings.shape[1]) if full_embeddings is not None else None
+            embeddings.flush()
+            del embeddings
+            members += ["records.jsonl", "embeddings.npy"]
+            if full_embeddings is not None:
+                full_embeddings.flush()
+                del full_embeddings
+                members.append("full_embeddings.npy")
+
+            if projector.method == "pca" and projector.state_path and projector.state_path.exists():
+                shutil.copyfile(projector.state_path, workdir / "projection.npz")
+                members.append("projection.npz")
+
+            # Texto extraído, para no volver a procesar los PDFs
+            cache_dir = Path(self.rag.cache_dir)
+            (workdir / "cache").mkdir()
+            for filename in sorted(filenames):
+                cache_path = cache_dir / f"{Path(filename).stem}.txt"
+                if cache_path.exists():
+                    shutil.copyfile(cache_path, workdir / "cache" / cache_path.name)
+                    members.append(f"cache/{cache_path.name}")
+
+            manifest = {
+                "format": self.FORMAT,
+                "version": self.VERSION,
+                "created_at": time.time(),
+                "generation": generation,
+                "embedding_model": self.rag.embedding_generator.model,
+                "model_dimension": full_dimension or self.rag.embedding_generator.dimension,
+                "index_dimension": index_dimension,
+                "projection": projector.describe(),
+                "chunks": total,
+                "files": [self._describe_pdf(filename) for filename in sorted(filenames)],
+                "members": {name: _sha256(workdir / name) for name in members}
+            }
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            with tarfile.open(tmp_path, "w", format=tarfile.PAX_FORMAT) as archive:
+                data = json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8")
+                info = tarfile.TarInfo(self.MANIFEST)
+                info.size = len(data)
+                info.mtime = int(manifest["created_at"])
+                archive.addfile(info, io.BytesIO(data))
+                for name in members:
+                    archive.add(workdir / name, arcname=name, recursive=False)
+            os.replace(tmp_path, path)
+
+        print(f"✓ Snapshot exportado: {path} ({total} chunks, {len(filenames)} archivos)")
+        return manifest
+
+    def _describe_pdf(self, filename: str) -> Dict:
+        pdf_path = self.rag.pdf_dir / filename
+        if not pdf_path.exists():
+            return {"filename": filename, "sha256": None, "size": None}
+        return {"filename": filename, "sha256": _sha256(pdf_path), "size": pdf_path.stat().st_size}
+
+    # ==================== Importación ====================
+
+    @classmethod
+    def read_manifest(cls, path: str) -> Dict:
+        """Lee y valida la cabecera de un snapshot sin cargar su contenido"""
+        try:
+            with tarfile.open(path, "r:") as archive:
+                member = archive.extractfile(cls.MANIFEST)
+                manifest = json.load(member)
+        except (tarfile.TarError, KeyError, json.JSONDecodeError) as e:
+            raise SnapshotError(f"Snapshot ilegible: {e}") from e
+
+        if manifest.get("format") != cls.FORMAT:
+            raise SnapshotError("El archivo no es un snapshot de Willay")
+        if manifest.get("version") != cls.VERSION:
+            raise SnapshotError(f"Versión de snapshot no soportada: {manifest.get('version')}")
+        return manifest
+
+    async def load(self, path: str, force: bool = False) -> Dict:
+        """
+        Importa un snapshot en una generación nueva y la activa
+
+        No se generan embeddings: los vectores se insertan tal cual desde el
+        archivo. La generación previa queda disponible para rollback.
+
+        Args:
+            path: Archivo del snapshot
+            force: Importar aunque el modelo o la proyección no coincidan con
+                la configuración de este nodo
+
+        Returns:
+            Dict con status, generation, chunks y files
+        """
+        manifest = await asyncio.to_thread(self.read_manifest, path)
+        self._check_compatibility(manifest, force)
+        await asyncio.to_thread(self.verify, path, manifest)
+
+        async with self.rag._rebuild_lock:
+            generation = await self.rag.store.begin_generation()
+            projector = self.rag._projector_for(generation)
+            try:
+                await asyncio.to_thread(self._load, Path(path), manifest, generation, projector)
+                stored = await self.rag.store.count_documents(generation=generation)
+                if stored != manifest["chunks"]:
+                    raise SnapshotError(f"Se importaron {stored} de {manifest['chunks']} chunks")
+            except BaseException:
+                await self.rag.store.discard_generation(generation)
+                projector.reset()
+                raise
+
+            await self.rag.store.activate_generation(generation)
+            self.rag.projector = projector
+            self.rag._indexed_signatures = self._matching_signatures(manifest)
+            self.rag._prune_projections()
+
+        print(f"✓ Snapshot importado en {generation} ({manifest['chunks']} chunks)")
+        return {
+            "status": "success",
+            "generation": generation,
+            "chunks": manifest["chunks"],
+            "files": len(manifest["files"])
+        }
+
+    def _check_compatibility(self, manifest: Dict, force: bool) -> None:
+        problems = []
+        model = self.rag.embedding_generator.model
+        if manifest["embedding_model"] != model:
+            problems.append(f"modelo {manifest['embedding_model']} (este nodo usa {model})")
+
+        local = self.rag.projector.describe()
+        remote = manifest["projection"]
+        if (remote.get("method"), remote.get("target_dimension")) != (local.get("method"), local.get("target_dimension")):
+            problems.append(f"proyección {remote.get('method')}/{remote.get('target_dimension')} "
+                            f"(este nodo usa {local.get('method')}/{local.get('target_dimension')})")
+
+        if problems and not force:
+            raise SnapshotError("Snapshot incompatible: " + "; ".join(problems))
+
+    @staticmethod
+    def verify(path: str, manifest: Dict) -> None:
+        """
+        Comprueba que estén todos los miembros del snapshot y sus checksums
+
+        Raises:
+            SnapshotError: Si falta algún archivo o su contenido no coincide
+        """
+        with tarfile.open(path, "r:") as archive:
+            members = {member.name: member for member in archive.getmembers()}
+            missing = [name for name in manifest["members"] if name not in members]
+            if missing:
+                raise SnapshotError(f"Faltan archivos en el snapshot: {', '.join(missing)}")
+            for name, digest in manifest["members"].items():
+                if _sha256_stream(archive.extractfile(members[name])) != digest:
+                    raise SnapshotError(f"Checksum inválido para {name}")
+
+    def _load(self, path: Path, manifest: Dict, generation: str, projector) -> None:
+        with tarfile.open(path, "r:") as archive:
+            members = {member.name: member for member in archive.getmembers()}
+            expected = manifest["members"]
+
+            ids: List[str] = []
+            documents: List[str] = []
+            metadatas: List[Dict] = []
+            for line in archive.extractfile(members["records.jsonl"]):
+                record = json.loads(line)
+                ids.append(record["id"])
+                documents.append(record["document"])
+                metadatas.append(record["metadata"])
+
+            embeddings = _memmap_member(path, members["embeddings.npy"])
+            full_embeddings = None
+            if "full_embeddings.npy" in members:
+                full_embeddings = _memmap_member(path, members["full_embeddings.npy"])
+            if embeddings.shape[0] != len(ids):
+                raise SnapshotError("La cantidad de vectores no coincide con la de registros")
+
+            self.rag.vector_store.add_bulk(
+                ids, documents, metadatas, embeddings,
+                full_embeddings=full_embeddings, generation=generation
+            )
+
+            if "projection.npz" in members and projector.state_path:
+                projector.state_path.parent.mkdir(parents=True, exist_ok=True)
+                with archive.extractfile(members["projection.npz"]) as source, \
+                        open(projector.state_path, "wb") as target:
+                    shutil.copyfileobj(source, target)
+                projector.load()
+
+            cache_dir = Path(self.rag.cache_dir)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            for name in expected:
+                if name.startswith("cache/"):
+                    with archive.extractfile(members[name]) as source, \
+                            open(cache_dir / Path(name).name, "wb") as target:
+                        shutil.copyfileobj(source, target)
+
+    def _matching_signatures(self, manifest: Dict) -> Dict[str, tuple]:
+        """Marca como indexados los PDFs locales idénticos a los del snapshot"""
+        signatures = {}
+        for entry in manifest["files"]:
+            pdf_path = self.rag.pdf_dir / entry["filename"]
+            if entry["sha256"] and pdf_path.exists() and _sha256(pdf_path) == entry["sha256"]:
+                signature = self.rag._file_signature(entry["filename"])
+                if signature:
+                    signatures[entry["filename"]] = signature
+        return signatures
+
+
+def _sha256(path: Path) -> str:
+    with open(path, "rb") as f:
+        return _sha256_stream(f)
+
+
+def _sha256_stream(stream, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(block_size), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _memmap_member(path: Path, member: tarfile.TarInfo) -> np.ndarray:
+    """Abre una matriz .npy guardada en el tar como memmap de solo lectura"""
+    with open(path, "rb") as f:
+        f.seek(member.offset_data)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        header_end = f.tell()
+    if fortran_order:
+        raise SnapshotError(f"{member.name}: orden Fortran no soportado")
+    return np.memmap(path, dtype=dtype, mode="r", offset=header_end, shape=shape)
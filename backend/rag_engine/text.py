@@ -0,0 +1,17 @@
+"""
+Normalización de texto compartida (gating, routing, deduplicación, lotes)
+
+Sin dependencias pesadas: se importa en el camino de `import app`.
+"""
+import re
+import unicodedata
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sin tildes, sin puntuación ni emojis"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", text)).strip()
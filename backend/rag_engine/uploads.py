@@ -0,0 +1,271 @@
+"""
+Recepción de PDFs por streaming con hash al vuelo, escritura atómica y deduplicación
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+
+class UploadError(Exception):
+    """Error de validación de una subida"""
+
+
+class UploadTooLargeError(UploadError):
+    """La subida supera el tamaño máximo permitido"""
+
+
+class UploadOffsetError(UploadError):
+    """El offset de una subida reanudable no coincide con lo ya recibido"""
+
+
+class UploadManager:
+    """
+    Guarda PDFs subidos en el directorio RAG sin bloquear el event loop
+
+    El contenido se escribe por bloques en un archivo temporal dentro de
+    `pdf_dir/.uploads/` (mismo sistema de archivos) mientras se calcula su
+    SHA-256; al terminar se renombra atómicamente al destino. Un registro
+    hash → archivo permite descartar contenido idéntico subido con otro nombre.
+    """
+
+    PDF_MAGIC = b"%PDF-"
+
+    def __init__(
+        self,
+        pdf_dir: str = "rag",
+        max_bytes: int = 512 * 1024 * 1024,
+        chunk_size: int = 1024 * 1024
+    ):
+        """
+        Args:
+            pdf_dir: Directorio destino de los PDFs
+            max_bytes: Tamaño máximo por archivo
+            chunk_size: Tamaño de bloque de lectura/escritura
+        """
+        self.pdf_dir = Path(pdf_dir)
+        self.staging_dir = self.pdf_dir / ".uploads"
+        self.registry_path = self.staging_dir / "registry.json"
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self._registry: Optional[Dict[str, str]] = None
+        self._lock = asyncio.Lock()
+        # Un escritor por subida reanudable: el chequeo de offset y la escritura van juntos
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def safe_filename(filename: Optional[str]) -> str:
+        """Normaliza el nombre (sin rutas) y valida la extensión"""
+        name = Path(filename or "").name
+        if not name or not name.lower().endswith(".pdf"):
+            raise UploadError("Solo se permiten archivos PDF")
+        return name
+
+    # ==================== Registro de hashes ====================
+
+    def _load_registry(self) -> Dict[str, str]:
+        """Carga el registro y agrega los PDFs existentes que aún no tengan hash"""
+        registry: Dict[str, str] = {}
+        if self.registry_path.exists():
+            registry = json.loads(self.registry_path.read_text(encoding="utf-8"))
+
+        # Descartar entradas de archivos que ya no existen
+        registry = {h: name for h, name in registry.items() if (self.pdf_dir / name).exists()}
+
+        known = set(registry.values())
+        for pdf_path in self.pdf_dir.glob("*.pdf"):
+            if pdf_path.name not in known:
+                registry[self._hash_file(pdf_path)] = pdf_path.name
+
+        self._save_registry(registry)
+        return registry
+
+    def _save_registry(self, registry: Dict[str, str]) -> None:
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.registry_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(registry, indent=2, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.registry_path)
+
+    def _hash_file(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(self.chunk_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    async def _get_registry(self) -> Dict[str, str]:
+        if self._registry is None:
+            self._registry = await asyncio.to_thread(self._load_registry)
+        return self._registry
+
+    async def forget(self, filename: str) -> None:
+        """Elimina un archivo del registro (p. ej. al borrarlo del índice)"""
+        async with self._lock:
+            registry = await self._get_registry()
+            for digest in [h for h, name in registry.items() if name == filename]:
+                registry.pop(digest)
+            await asyncio.to_thread(self._save_registry, dict(registry))
+
+    # ==================== Subida directa ====================
+
+    async def save_stream(self, filename: str, chunks: AsyncIterator[bytes]) -> Dict:
+        """
+        Guarda un PDF recibido como flujo de bloques
+
+        Args:
+            filename: Nombre destino del archivo
+            chunks: Iterador asíncrono con el contenido
+
+        Returns:
+            Dict con filename, sha256, size, duplicate_of (o None) y status
+        """
+        name = self.safe_filename(filename)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.staging_dir / f"{uuid.uuid4().hex}.part"
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as buffer:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if size == 0 and not chunk.startswith(self.PDF_MAGIC[:len(chunk)]):
+                        raise UploadError("El archivo no es un PDF válido")
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLargeError(f"El archivo supera el máximo de {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    await asyncio.to_thread(buffer.write, chunk)
+            if size == 0:
+                raise UploadError("El archivo está vacío")
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        return await self._finalize(tmp_path, name, digest.hexdigest(), size)
+
+    async def _finalize(self, tmp_path: Path, name: str, sha256: str, size: int) -> Dict:
+        """Deduplica y mueve atómicamente el archivo temporal a su destino"""
+        async with self._lock:
+            registry = await self._get_registry()
+            existing = registry.get(sha256)
+
+            if existing and (self.pdf_dir / existing).exists():
+                tmp_path.unlink(missing_ok=True)
+                return {
+                    "status": "duplicate" if existing != name else "unchanged",
+                    "filename": name,
+                    "sha256": sha256,
+                    "size": size,
+                    "duplicate_of": existing
+                }
+
+            os.replace(tmp_path, self.pdf_dir / name)
+
+            # El archivo pudo existir antes con otro contenido
+            for digest in [h for h, n in registry.items() if n == name]:
+                registry.pop(digest)
+            registry[sha256] = name
+            await asyncio.to_thread(self._save_registry, dict(registry))
+
+        return {"status": "stored", "filename": name, "sha256": sha256, "size": size, "duplicate_of": None}
+
+    # ==================== Subida reanudable ====================
+
+    def _session_paths(self, upload_id: str):
+        if not upload_id.isalnum():
+            raise UploadError("Identificador de subida inválido")
+        return self.staging_dir / f"{upload_id}.part", self.staging_dir / f"{upload_id}.json"
+
+    def create_session(self, filename: str) -> Dict:
+        """Inicia una subida reanudable y retorna su identificador"""
+        name = self.safe_filename(filename)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._session_paths(upload_id)
+        part_path.touch()
+        meta_path.write_text(json.dumps({"filename": name, "created_at": time.time()}), encoding="utf-8")
+        return {"upload_id": upload_id, "filename": name, "offset": 0}
+
+    def get_session(self, upload_id: str) -> Dict:
+        """Estado de una subida reanudable (offset = bytes ya recibidos)"""
+        part_path, meta_path = self._session_paths(upload_id)
+        if not meta_path.exists() or not part_path.exists():
+            raise KeyError(upload_id)
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        return {"upload_id": upload_id, "filename": meta["filename"], "offset": part_path.stat().st_size}
+
+    def _session_lock(self, upload_id: str) -> asyncio.Lock:
+        """
+        Lock de la subida; falla si otra petición la está usando
+
+        Raises:
+            UploadOffsetError: Si hay otra escritura (o cierre) en curso
+        """
+        lock = self._session_locks.setdefault(upload_id, asyncio.Lock())
+        if lock.locked():
+            raise UploadOffsetError("Otra petición está escribiendo esta subida")
+        return lock
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict:
+        """
+        Agrega bytes a una subida reanudable a partir de `offset`
+
+        Raises:
+            UploadOffsetError: Si offset no coincide con los bytes ya recibidos
+                o si otra petición está escribiendo la misma subida
+        """
+        self.get_session(upload_id)  # KeyError antes de crear el lock de una subida inexistente
+        async with self._session_lock(upload_id):
+            session = self.get_session(upload_id)
+            if offset != session["offset"]:
+                raise UploadOffsetError(f"Offset esperado {session['offset']}, recibido {offset}")
+
+            part_path, _ = self._session_paths(upload_id)
+            size = offset
+            with open(part_path, "ab") as buffer:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if size == 0 and not chunk.startswith(self.PDF_MAGIC[:len(chunk)]):
+                        raise UploadError("El archivo no es un PDF válido")
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLargeError(f"El archivo supera el máximo de {self.max_bytes} bytes")
+                    await asyncio.to_thread(buffer.write, chunk)
+
+        return {"upload_id": upload_id, "filename": session["filename"], "offset": size}
+
+    async def complete(self, upload_id: str) -> Dict:
+        """Cierra una subida reanudable: calcula el hash, deduplica y mueve el archivo"""
+        self.get_session(upload_id)  # KeyError antes de crear el lock de una subida inexistente
+        async with self._session_lock(upload_id):
+            session = self.get_session(upload_id)
+            part_path, meta_path = self._session_paths(upload_id)
+            if session["offset"] == 0:
+                raise UploadError("La subida está vacía")
+
+            # El hash no se puede conservar entre peticiones, se calcula al cerrar
+            sha256 = await asyncio.to_thread(self._hash_file, part_path)
+            result = await self._finalize(part_path, session["filename"], sha256, session["offset"])
+            meta_path.unlink(missing_ok=True)
+        self._session_locks.pop(upload_id, None)
+        return result
+
+    def cleanup_stale(self, max_age_seconds: float = 24 * 3600) -> int:
+        """Elimina temporales y sesiones abandonadas; retorna la cantidad eliminada"""
+        if not self.staging_dir.exists():
+            return 0
+        removed = 0
+        cutoff = time.time() - max_age_seconds
+        for path in self.staging_dir.iterdir():
+            if path.suffix in (".part", ".json") and path != self.registry_path and path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                self._session_locks.pop(path.stem, None)
+                removed += 1
+        return removed
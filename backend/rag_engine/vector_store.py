@@ -1,22 +1,48 @@
 """
 Vector Store usando ChromaDB para almacenar y buscar embeddings
 """
-from typing import List, Dict, Optional
+import json
+import os
+import re
+import threading
+from typing import Iterator, List, Dict, Optional, Tuple
 import chromadb
 from chromadb.config import Settings
 import numpy as np
 from pathlib import Path
+from .dedup import chunk_sources
 
 
 class VectorStore:
-    """Almacena y busca embeddings usando ChromaDB"""
+    """
+    Almacena y busca embeddings usando ChromaDB
+
+    El índice se organiza en generaciones: cada una es una colección de Chroma
+    (`willay_documents__g<N>`, más su colección `_full` opcional). Las
+    lecturas usan la generación activa; una reconstrucción completa escribe en
+    una generación nueva y al terminar se activa de forma atómica, conservando
+    la anterior para poder volver atrás. La colección original
+    `willay_documents` se toma como la generación inicial.
+    """
+    
+    DEFAULT_COLLECTION = "willay_documents"
+    # Las búsquedas retornan también los vectores guardados (similitud coseno)
+    QUERY_INCLUDE = ["documents", "metadatas", "distances", "embeddings"]
     
-    def __init__(self, persist_dir: str = "backend/rag_engine/vector_store"):
+    def __init__(
+        self,
+        persist_dir: str = "backend/rag_engine/vector_store",
+        keep_full_vectors: bool = False,
+        collection_name: str = DEFAULT_COLLECTION
+    ):
         """
         Inicializa ChromaDB con persistencia local
         
         Args:
             persist_dir: Directorio donde se guardarán los datos
+            keep_full_vectors: Si True, guarda también los embeddings sin reducir
+                en una colección aparte para re-ranking
+            collection_name: Nombre base de la colección (uno por namespace)
         """
         self.persist_dir = Path(persist_dir)
         self.persist_dir.mkdir(parents=True, exist_ok=True)
@@ -30,19 +56,184 @@ class VectorStore:
             )
         )
         
-        # Crear o obtener colección
-        self.collection_name = "willay_documents"
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
+        self.collection_name = collection_name
+        self.keep_full_vectors = keep_full_vectors
+        self._lock = threading.Lock()
+        self._staging: Dict[str, Tuple] = {}
+        
+        # Puntero a la generación activa y a la anterior (para rollback)
+        if collection_name == self.DEFAULT_COLLECTION:
+            pointer_name = "generations.json"
+        else:
+            pointer_name = f"generations_{collection_name}.json"
+        self._pointer_path = self.persist_dir / pointer_name
+        self._pointer = self._load_pointer()
+        
+        # (nombre, colección, colección completa): se reemplaza en una sola asignación
+        self._active = self._open_generation(self._pointer["active"])
+        self._drop_orphan_generations()
+    
+    # ==================== Generaciones ====================
+    
+    @property
+    def collection(self):
+        return self._active[1]
+    
+    @property
+    def full_collection(self):
+        return self._active[2]
+    
+    @property
+    def active_generation(self) -> str:
+        return self._active[0]
+    
+    @property
+    def full_collection_name(self) -> str:
+        return f"{self.active_generation}_full"
+    
+    def _load_pointer(self) -> Dict:
+        if self._pointer_path.exists():
+            return json.loads(self._pointer_path.read_text(encoding="utf-8"))
+        return {"active": self.collection_name, "previous": None, "counter": 0}
+    
+    def _save_pointer(self, pointer: Dict) -> None:
+        tmp_path = self._pointer_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(pointer, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self._pointer_path)
+    
+    def _open_generation(self, name: str) -> Tuple:
+        collection = self.client.get_or_create_collection(
+            name=name,
             metadata={"description": "Willay RAG knowledge base"}
         )
+        # Colección opcional con los vectores completos (solo IDs + embeddings)
+        full_collection = None
+        if self.keep_full_vectors:
+            full_collection = self.client.get_or_create_collection(
+                name=f"{name}_full",
+                metadata={"description": "Willay RAG full-dimension vectors"}
+            )
+        return (name, collection, full_collection)
+    
+    def _drop_generation(self, name: Optional[str]) -> None:
+        if not name:
+            return
+        existing = {getattr(c, "name", c) for c in self.client.list_collections()}
+        for collection_name in (name, f"{name}_full"):
+            if collection_name in existing:
+                self.client.delete_collection(collection_name)
+    
+    def _drop_orphan_generations(self) -> None:
+        """
+        Elimina generaciones que nada referencia (p. ej. de una reconstrucción
+        interrumpida entre begin_generation y activate_generation)
+
+        Se llama al abrir el store: en ese momento no hay ninguna en construcción.
+        """
+        keep = {self._pointer["active"], self._pointer.get("previous"), *self._staging}
+        pattern = re.compile(rf"{re.escape(self.collection_name)}__g\d+")
+        existing = {getattr(c, "name", c) for c in self.client.list_collections()}
+        orphans = sorted({
+            name[:-len("_full")] if name.endswith("_full") else name
+            for name in existing
+        } - keep)
+        for name in orphans:
+            if pattern.fullmatch(name):
+                self._drop_generation(name)
+                print(f"🗑️  Generación huérfana eliminada: {name}")
+    
+    def _target(self, generation: Optional[str] = None) -> Tuple:
+        """Colecciones de la generación indicada (por defecto la activa)"""
+        if generation is None or generation == self._active[0]:
+            return self._active
+        try:
+            return self._staging[generation]
+        except KeyError:
+            raise ValueError(f"Generación desconocida: {generation}") from None
+    
+    def begin_generation(self) -> str:
+        """
+        Crea una generación vacía para reconstruir el índice sin tocar la activa
+        
+        Returns:
+            Nombre de la nueva generación (usar en generation= al escribir)
+        """
+        with self._lock:
+            self._pointer["counter"] += 1
+            name = f"{self.collection_name}__g{self._pointer['counter']}"
+            self._save_pointer(self._pointer)
+            self._drop_generation(name)
+            self._staging[name] = self._open_generation(name)
+        print(f"✓ Generación {name} creada")
+        return name
+    
+    def activate_generation(self, name: str) -> None:
+        """
+        Activa una generación en construcción
+        
+        Las búsquedas en curso terminan sobre la generación anterior y las
+        nuevas usan la activada. Se conserva la anterior para rollback y se
+        descarta la previa a esa.
+        """
+        with self._lock:
+            generation = self._target(name)
+            obsolete = self._pointer.get("previous")
+            previous = self._active[0]
+            
+            self._save_pointer({**self._pointer, "active": name, "previous": previous})
+            self._pointer.update(active=name, previous=previous)
+            self._active = generation
+            self._staging.pop(name, None)
+            
+            if obsolete not in (None, name, previous):
+                self._drop_generation(obsolete)
+        print(f"✓ Generación activa: {name} (anterior: {previous})")
+    
+    def discard_generation(self, name: str) -> None:
+        """Elimina una generación en construcción que no se va a activar"""
+        with self._lock:
+            if self._staging.pop(name, None) is not None:
+                self._drop_generation(name)
+    
+    def rollback(self) -> str:
+        """
+        Vuelve a la generación anterior (la actual pasa a ser la anterior)
+        
+        Returns:
+            Nombre de la generación activada
+        
+        Raises:
+            ValueError: Si no hay generación anterior
+        """
+        with self._lock:
+            previous = self._pointer.get("previous")
+            if not previous:
+                raise ValueError("No hay una generación anterior")
+            generation = self._open_generation(previous)
+            current = self._active[0]
+            
+            self._save_pointer({**self._pointer, "active": previous, "previous": current})
+            self._pointer.update(active=previous, previous=current)
+            self._active = generation
+        print(f"✓ Rollback a {previous}")
+        return previous
+    
+    def get_generations(self) -> Dict:
+        """Generación activa, anterior y las que están en construcción"""
+        return {
+            "active": self._active[0],
+            "previous": self._pointer.get("previous"),
+            "building": sorted(self._staging)
+        }
     
     def add_documents(
         self,
         texts: List[str],
         embeddings: List[np.ndarray],
         metadatas: List[Dict],
-        ids: Optional[List[str]] = None
+        ids: Optional[List[str]] = None,
+        full_embeddings: Optional[List[np.ndarray]] = None,
+        generation: Optional[str] = None
     ) -> None:
         """
         Agrega documentos al vector store
@@ -52,7 +243,10 @@ class VectorStore:
             embeddings: Lista de embeddings correspondientes
             metadatas: Lista de metadatos para cada chunk
             ids: IDs únicos para cada documento (se genera si no se provee)
+            full_embeddings: Embeddings sin reducir (solo si keep_full_vectors)
+            generation: Generación destino (por defecto la activa)
         """
+        _, collection, full_collection = self._target(generation)
         if not ids:
             ids = [f"doc_{i}" for i in range(len(texts))]
         
@@ -67,12 +261,18 @@ class VectorStore:
             batch_metadatas = metadatas[i:i + batch_size]
             batch_ids = ids[i:i + batch_size]
             
-            self.collection.add(
+            collection.add(
                 documents=batch_texts,
                 embeddings=batch_embeddings,
                 metadatas=batch_metadatas,
                 ids=batch_ids
             )
+            
+            if full_collection is not None and full_embeddings is not None:
+                full_collection.add(
+                    embeddings=[emb.tolist() for emb in full_embeddings[i:i + batch_size]],
+                    ids=batch_ids
+                )
         
         print(f"✓ Agregados {len(texts)} chunks al vector store")
     
@@ -80,7 +280,8 @@ class VectorStore:
         self,
         query_embedding: np.ndarray,
         n_results: int = 5,
-        filter_metadata: Optional[Dict] = None
+        filter_metadata: Optional[Dict] = None,
+        generation: Optional[str] = None
     ) -> Dict[str, List]:
         """
         Busca documentos similares usando un embedding de consulta
@@ -89,88 +290,281 @@ class VectorStore:
             query_embedding: Embedding de la consulta
             n_results: Número de resultados a retornar
             filter_metadata: Filtros opcionales (ej: {"filename": "libro.pdf"})
+            generation: Generación a consultar (por defecto la activa)
         
         Returns:
-            Dict con keys: documents, metadatas, distances
+            Dict con keys: ids, documents, metadatas, distances, embeddings
+            (los vectores guardados, para calcular similitud coseno)
         """
-        results = self.collection.query(
+        results = self._target(generation)[1].query(
             query_embeddings=[query_embedding.tolist()],
             n_results=n_results,
-            where=filter_metadata
+            where=filter_metadata,
+            include=self.QUERY_INCLUDE
         )
         
         return {
+            "ids": results["ids"][0] if results["ids"] else [],
             "documents": results["documents"][0] if results["documents"] else [],
             "metadatas": results["metadatas"][0] if results["metadatas"] else [],
-            "distances": results["distances"][0] if results["distances"] else []
+            "distances": results["distances"][0] if results["distances"] else [],
+            "embeddings": list(results["embeddings"][0]) if results["embeddings"] is not None else []
         }
     
+    def search_batch(
+        self,
+        query_embeddings: List[np.ndarray],
+        n_results: int = 5,
+        filter_metadata: Optional[Dict] = None
+    ) -> List[Dict[str, List]]:
+        """
+        Busca varias consultas en una sola llamada matricial
+        
+        Args:
+            query_embeddings: Embeddings de las consultas
+            n_results: Número de resultados por consulta
+            filter_metadata: Filtro común a todas las consultas
+        
+        Returns:
+            Lista (una entrada por consulta) de dicts con keys: ids, documents,
+            metadatas, distances, embeddings
+        """
+        if not query_embeddings:
+            return []
+        
+        results = self.collection.query(
+            query_embeddings=[emb.tolist() for emb in query_embeddings],
+            n_results=n_results,
+            where=filter_metadata,
+            include=self.QUERY_INCLUDE
+        )
+        
+        return [
+            {
+                "ids": results["ids"][i],
+                "documents": results["documents"][i] if results["documents"] else [],
+                "metadatas": results["metadatas"][i] if results["metadatas"] else [],
+                "distances": results["distances"][i] if results["distances"] else [],
+                "embeddings": list(results["embeddings"][i]) if results["embeddings"] is not None else []
+            }
+            for i in range(len(query_embeddings))
+        ]
+    
+    def get_full_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Retorna los embeddings completos de los IDs indicados
+        
+        Returns:
+            Dict con ID como clave y embedding sin reducir como valor
+        """
+        full_collection = self.full_collection
+        if full_collection is None or not ids:
+            return {}
+        
+        results = full_collection.get(ids=ids, include=["embeddings"])
+        return {
+            doc_id: np.asarray(emb, dtype=np.float32)
+            for doc_id, emb in zip(results["ids"], results["embeddings"])
+        }
+    
+    def get_metadatas(self, ids: List[str], generation: Optional[str] = None) -> Dict[str, Dict]:
+        """Metadata de los IDs indicados (los inexistentes se omiten)"""
+        if not ids:
+            return {}
+        results = self._target(generation)[1].get(ids=ids, include=["metadatas"])
+        return dict(zip(results["ids"], results["metadatas"]))
+    
+    def get_dimension(self) -> Optional[int]:
+        """Retorna la dimensión de los embeddings almacenados (None si está vacío)"""
+        results = self.collection.get(limit=1, include=["embeddings"])
+        embeddings = results.get("embeddings")
+        if embeddings is None or len(embeddings) == 0:
+            return None
+        return len(embeddings[0])
+    
+    def iter_records(
+        self,
+        batch_size: int = 1000,
+        generation: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        Recorre todos los chunks de una generación por páginas
+        
+        Yields:
+            Dicts con ids, documents, metadatas, embeddings y full_embeddings
+            (None si no se guardan vectores completos)
+        """
+        offset = 0
+        while True:
+            page = self.get_records_page(offset, batch_size, generation=generation)
+            if not page["ids"]:
+                return
+            yield page
+            offset += len(page["ids"])
+    
+    def get_records_page(self, offset: int, limit: int, generation: Optional[str] = None) -> Dict:
+        """Una página de chunks con sus vectores (ver iter_records)"""
+        _, collection, full_collection = self._target(generation)
+        page = collection.get(
+            limit=limit,
+            offset=offset,
+            include=["documents", "metadatas", "embeddings"]
+        )
+        full = None
+        if full_collection is not None and page["ids"]:
+            stored = full_collection.get(ids=page["ids"], include=["embeddings"])
+            by_id = dict(zip(stored["ids"], stored["embeddings"]))
+            full = [by_id.get(doc_id) for doc_id in page["ids"]]
+        return {
+            "ids": page["ids"],
+            "documents": page["documents"],
+            "metadatas": page["metadatas"],
+            "embeddings": np.asarray(page["embeddings"], dtype=np.float32),
+            "full_embeddings": full
+        }
+    
+    def get_records_by_filename(self, filename: str, generation: Optional[str] = None) -> Dict:
+        """
+        Todos los chunks de un archivo con sus vectores (para moverlos de shard)
+        
+        Returns:
+            Dict con ids, documents, metadatas, embeddings y full_embeddings
+        """
+        return self._get_records({"filename": filename}, generation)
+    
+    def get_duplicate_records(self, generation: Optional[str] = None) -> Dict:
+        """Chunks que representan a varias apariciones del mismo texto (ver dedup.py)"""
+        return self._get_records({"duplicate_count": {"$gt": 1}}, generation)
+    
+    def _get_records(self, where: Dict, generation: Optional[str]) -> Dict:
+        _, collection, full_collection = self._target(generation)
+        results = collection.get(
+            where=where,
+            include=["documents", "metadatas", "embeddings"]
+        )
+        full = None
+        if full_collection is not None and results["ids"]:
+            stored = full_collection.get(ids=results["ids"], include=["embeddings"])
+            by_id = dict(zip(stored["ids"], stored["embeddings"]))
+            full = np.asarray([by_id[doc_id] for doc_id in results["ids"]], dtype=np.float32)
+        return {
+            "ids": results["ids"],
+            "documents": results["documents"],
+            "metadatas": results["metadatas"],
+            "embeddings": np.asarray(results["embeddings"], dtype=np.float32),
+            "full_embeddings": full
+        }
+    
+    def add_bulk(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict],
+        embeddings: np.ndarray,
+        full_embeddings: Optional[np.ndarray] = None,
+        generation: Optional[str] = None
+    ) -> None:
+        """
+        Inserta chunks ya embebidos usando el máximo lote que admite Chroma
+        
+        A diferencia de add_documents, recibe las matrices tal cual (pueden
+        ser memmaps) y no las convierte a listas ni imprime progreso.
+        """
+        _, collection, full_collection = self._target(generation)
+        batch_size = self.client.get_max_batch_size()
+        for i in range(0, len(ids), batch_size):
+            batch_ids = ids[i:i + batch_size]
+            collection.add(
+                ids=batch_ids,
+                documents=documents[i:i + batch_size],
+                metadatas=metadatas[i:i + batch_size],
+                embeddings=np.ascontiguousarray(embeddings[i:i + batch_size])
+            )
+            if full_collection is not None and full_embeddings is not None:
+                full_collection.add(
+                    ids=batch_ids,
+                    embeddings=np.ascontiguousarray(full_embeddings[i:i + batch_size])
+                )
+    
     def get_all_documents(self) -> Dict[str, List]:
         """Retorna todos los documentos del vector store"""
         results = self.collection.get()
         return results
     
-    def count_documents(self) -> int:
-        """Retorna la cantidad de documentos en el store"""
-        return self.collection.count()
+    def count_documents(self, generation: Optional[str] = None) -> int:
+        """Retorna la cantidad de documentos en el store (o en una generación)"""
+        return self._target(generation)[1].count()
     
     def clear(self) -> None:
-        """Elimina todos los documentos del vector store"""
-        self.client.delete_collection(self.collection_name)
-        self.collection = self.client.create_collection(
-            name=self.collection_name,
-            metadata={"description": "Willay RAG knowledge base"}
-        )
+        """
+        Deja el vector store vacío
+        
+        Se activa una generación nueva vacía en lugar de borrar la actual,
+        que queda como anterior (recuperable con rollback).
+        """
+        self.activate_generation(self.begin_generation())
         print("✓ Vector store limpiado")
     
-    def delete_by_filename(self, filename: str) -> None:
+    def delete_by_filename(self, filename: str, generation: Optional[str] = None) -> None:
         """Elimina todos los chunks de un archivo específico"""
+        _, collection, full_collection = self._target(generation)
         # ChromaDB no soporta delete con where directamente,
         # necesitamos obtener los IDs primero
-        results = self.collection.get(where={"filename": filename})
+        results = collection.get(where={"filename": filename})
         if results["ids"]:
-            self.collection.delete(ids=results["ids"])
+            collection.delete(ids=results["ids"])
+            if full_collection is not None:
+                full_collection.delete(ids=results["ids"])
             print(f"✓ Eliminados {len(results['ids'])} chunks de {filename}")
     
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict], generation: Optional[str] = None) -> None:
+        """Reemplaza la metadata de chunks existentes (sin tocar textos ni vectores)"""
+        _, collection, _ = self._target(generation)
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+    
     def get_filenames(self) -> List[str]:
-        """Retorna lista de archivos únicos en el vector store"""
-        results = self.collection.get()
-        if not results["metadatas"]:
-            return []
+        """Retorna lista de archivos únicos en el vector store (incluye las fuentes de los deduplicados)"""
+        return sorted(self.get_file_stats())
+    
+    def get_file_stats(self) -> Dict[str, Dict]:
+        """
+        Chunks y páginas por archivo en la generación activa
+        
+        Un chunk deduplicado cuenta en cada archivo donde aparece su texto
+        (ver dedup.chunk_sources); `stored` cuenta solo los guardados a
+        nombre del archivo, que son los que ocupan su shard.
         
-        filenames = set(meta["filename"] for meta in results["metadatas"])
-        return sorted(list(filenames))
+        Returns:
+            Dict filename -> {"chunks", "stored", "pages" (set)}
+        """
+        results = self.collection.get(include=["metadatas"])
+        files: Dict[str, Dict] = {}
+        for meta in results["metadatas"] or []:
+            files.setdefault(meta["filename"], {"chunks": 0, "stored": 0, "pages": set()})["stored"] += 1
+            locations = chunk_sources(meta)
+            for filename in {location["filename"] for location in locations}:
+                info = files.setdefault(filename, {"chunks": 0, "stored": 0, "pages": set()})
+                info["chunks"] += 1
+                info["pages"].update(location["page"] for location in locations if location["filename"] == filename)
+        return files
     
     def get_stats(self) -> Dict:
         """Retorna estadísticas del vector store"""
-        all_docs = self.collection.get()
-        
-        if not all_docs["metadatas"]:
-            return {
-                "total_chunks": 0,
-                "total_files": 0,
-                "files": []
-            }
-        
-        filenames = {}
-        for meta in all_docs["metadatas"]:
-            filename = meta["filename"]
-            if filename not in filenames:
-                filenames[filename] = {"chunks": 0, "pages": set()}
-            filenames[filename]["chunks"] += 1
-            filenames[filename]["pages"].add(meta["page"])
-        
-        files_info = [
-            {
-                "filename": fname,
-                "chunks": info["chunks"],
-                "pages": len(info["pages"])
-            }
-            for fname, info in filenames.items()
-        ]
-        
+        return self.stats_from_files(self.count_documents(), self.get_file_stats())
+    
+    @staticmethod
+    def stats_from_files(total_chunks: int, files: Dict[str, Dict]) -> Dict:
+        """Arma la respuesta de get_stats a partir de get_file_stats"""
         return {
-            "total_chunks": len(all_docs["metadatas"]),
-            "total_files": len(filenames),
-            "files": files_info
+            "total_chunks": total_chunks,
+            "total_files": len(files),
+            "files": [
+                {
+                    "filename": filename,
+                    "chunks": info["chunks"],
+                    "pages": len(info["pages"])
+                }
+                for filename, info in files.items()
+            ]
         }
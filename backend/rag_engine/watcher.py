@@ -0,0 +1,182 @@
+"""
+Observador del directorio de PDFs con debounce e indexación incremental
+"""
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+
+class DocumentWatcher:
+    """
+    Mantiene el índice sincronizado con los PDFs del directorio
+
+    Los eventos de cada archivo se agrupan durante una ventana de debounce
+    (copiar un PDF dispara varios eventos) y luego se re-indexa solo ese
+    archivo, o se eliminan sus chunks si ya no existe. Los cambios se
+    procesan de a uno en una tarea del event loop, así puede correr dentro
+    del servidor compartiendo el mismo cliente de Chroma; la extracción de
+    texto y el recorrido del directorio corren en hilos para no bloquearlo.
+    """
+
+    def __init__(
+        self,
+        rag_engine,
+        debounce_seconds: float = 2.0,
+        poll_interval: float = 5.0
+    ):
+        """
+        Args:
+            rag_engine: Instancia de RAGEngine a mantener sincronizada
+            debounce_seconds: Silencio requerido antes de procesar un archivo
+            poll_interval: Intervalo de sondeo si watchdog no está instalado
+        """
+        self.rag = rag_engine
+        self.pdf_dir = Path(rag_engine.pdf_dir)
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._observer = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._worker_task: Optional[asyncio.Task] = None
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._pending: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self.stats = {"events": 0, "indexed": 0, "removed": 0, "skipped": 0, "errors": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._worker_task is not None and not self._worker_task.done()
+
+    async def start(self) -> None:
+        """Comienza a observar el directorio (watchdog o sondeo como respaldo)"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._worker_task = asyncio.create_task(self._worker())
+
+        try:
+            from watchdog.observers import Observer
+            self._observer = Observer()
+            self._observer.schedule(self._make_handler(), str(self.pdf_dir), recursive=False)
+            self._observer.start()
+            print(f"👀 Observando {self.pdf_dir}/ (debounce {self.debounce_seconds}s)")
+        except ImportError:
+            self._poll_task = asyncio.create_task(self._poll())
+            print(f"👀 watchdog no instalado; sondeando {self.pdf_dir}/ cada {self.poll_interval}s")
+
+    async def stop(self) -> None:
+        """Detiene la observación y las tareas pendientes"""
+        if self._observer is not None:
+            observer, self._observer = self._observer, None
+            observer.stop()
+            await asyncio.to_thread(observer.join)
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in (self._poll_task, self._worker_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._poll_task = self._worker_task = None
+
+    # ==================== Recepción de eventos ====================
+
+    def _make_handler(self):
+        from watchdog.events import FileSystemEventHandler
+
+        watcher = self
+
+        class PDFHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+                    if path:
+                        watcher.notify(path)
+
+        return PDFHandler()
+
+    def notify(self, path: str) -> None:
+        """Registra un evento para `path`; seguro de llamar desde otros hilos"""
+        file_path = Path(path)
+        if file_path.suffix.lower() != ".pdf" or file_path.parent.resolve() != self.pdf_dir.resolve():
+            return
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._schedule, file_path.name)
+
+    def _schedule(self, filename: str) -> None:
+        """Reinicia la ventana de debounce del archivo"""
+        self.stats["events"] += 1
+        timer = self._timers.pop(filename, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[filename] = self._loop.call_later(self.debounce_seconds, self._enqueue, filename)
+
+    def _enqueue(self, filename: str) -> None:
+        self._timers.pop(filename, None)
+        self._pending.add(filename)
+        self._wakeup.set()
+
+    # ==================== Procesamiento ====================
+
+    async def _worker(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                filename = self._pending.pop()
+                try:
+                    await self._sync_file(filename)
+                except Exception as e:  # noqa: BLE001
+                    self.stats["errors"] += 1
+                    print(f"❌ Error sincronizando {filename}: {e}")
+
+    async def _sync_file(self, filename: str) -> None:
+        path = self.pdf_dir / filename
+
+        if not path.exists():
+            print(f"🗑️  PDF eliminado: {filename}")
+            await self.rag.forget_document(filename)
+            self.stats["removed"] += 1
+            return
+
+        # Si el archivo se sigue escribiendo, esperar otra ventana
+        if time.time() - path.stat().st_mtime < self.debounce_seconds:
+            self._schedule(filename)
+            return
+
+        if self.rag.is_file_current(filename):
+            self.stats["skipped"] += 1
+            return
+
+        print(f"📝 Re-indexando {filename}...")
+        await self.rag.index_file(filename)
+        self.stats["indexed"] += 1
+
+    async def _poll(self) -> None:
+        """Respaldo sin watchdog: compara mtime/tamaño en cada intervalo"""
+        snapshot = await asyncio.to_thread(self._snapshot)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = await asyncio.to_thread(self._snapshot)
+            for name in set(snapshot) | set(current):
+                if snapshot.get(name) != current.get(name):
+                    self._schedule(name)
+            snapshot = current
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        result = {}
+        for path in self.pdf_dir.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            result[path.name] = (stat.st_mtime_ns, stat.st_size)
+        return result
@@ -0,0 +1,119 @@
+"""
+Pruebas de LocalEmbedder con el modelo de juguete "hashing" (sin red ni descargas)
+
+Uso (desde backend/):
+    python -m pytest tests
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from rag_engine.embedding_backends import HashingModel, LocalEmbedder
+
+
+class CountingModel(HashingModel):
+    """HashingModel que registra el tamaño de cada lote (y puede fallar)"""
+
+    def __init__(self, dimension: int = 64):
+        super().__init__(dimension)
+        self.batches = []
+        self.error = None
+
+    def encode(self, texts):
+        self.batches.append(len(texts))
+        if self.error is not None:
+            raise self.error
+        return super().encode(texts)
+
+
+def make_embedder(**kwargs) -> LocalEmbedder:
+    embedder = LocalEmbedder("hashing", {"dimension": 64}, **kwargs)
+    embedder._model = CountingModel(64)
+    return embedder
+
+
+def test_concurrent_queries_share_one_encode():
+    embedder = make_embedder(max_batch=32, max_wait_ms=50)
+    texts = [f"consulta numero {i}" for i in range(10)]
+
+    async def run():
+        return await asyncio.gather(*(embedder.embed(text) for text in texts))
+
+    try:
+        vectors = asyncio.run(run())
+    finally:
+        embedder.close()
+    assert embedder._model.batches == [10]
+    np.testing.assert_allclose(np.stack(vectors), HashingModel(64).encode(texts))
+    assert embedder.metrics()["avg_query_batch"] == 10
+
+
+def test_query_batches_respect_max_batch():
+    embedder = make_embedder(max_batch=4, max_wait_ms=50)
+
+    async def run():
+        return await asyncio.gather(*(embedder.embed(f"texto {i}") for i in range(10)))
+
+    try:
+        vectors = asyncio.run(run())
+    finally:
+        embedder.close()
+    assert len(vectors) == 10
+    assert max(embedder._model.batches) <= 4
+    assert sum(embedder._model.batches) == 10
+
+
+def test_embed_many_splits_into_batches():
+    embedder = make_embedder()
+    texts = [f"chunk {i}" for i in range(10)]
+    try:
+        vectors = asyncio.run(embedder.embed_many(texts, batch_size=4))
+    finally:
+        embedder.close()
+    assert embedder._model.batches == [4, 4, 2]
+    np.testing.assert_allclose(np.stack(vectors), HashingModel(64).encode(texts))
+
+
+def test_encode_error_reaches_every_waiting_query():
+    embedder = make_embedder(max_batch=32, max_wait_ms=50)
+    embedder._model.error = RuntimeError("modelo caído")
+
+    async def run():
+        failed = await asyncio.gather(*(embedder.embed(f"texto {i}") for i in range(5)), return_exceptions=True)
+        # El colector sigue vivo después del error
+        embedder._model.error = None
+        recovered = await embedder.embed("otra consulta")
+        return failed, recovered
+
+    try:
+        failed, recovered = asyncio.run(run())
+    finally:
+        embedder.close()
+    assert len(failed) == 5
+    assert all(isinstance(result, RuntimeError) and str(result) == "modelo caído" for result in failed)
+    assert recovered.shape == (64,)
+
+
+def test_process_execution_matches_in_process_model():
+    embedder = LocalEmbedder("hashing", {"dimension": 64}, execution="process", max_wait_ms=20)
+    texts = ["la célula tiene membrana", "la mitocondria produce energía"]
+
+    async def run():
+        queries = await asyncio.gather(*(embedder.embed(text) for text in texts))
+        return queries, await embedder.embed_many(texts, batch_size=1)
+
+    try:
+        queries, documents = asyncio.run(run())
+    finally:
+        embedder.close()
+    expected = HashingModel(64).encode(texts)
+    np.testing.assert_allclose(np.stack(queries), expected)
+    np.testing.assert_allclose(np.stack(documents), expected)
+
+
+def test_unknown_model_or_execution_is_rejected():
+    with pytest.raises(ValueError):
+        LocalEmbedder("no-existe")
+    with pytest.raises(ValueError):
+        LocalEmbedder("hashing", execution="gpu")
@@ -2,6 +2,7 @@
   const API_BASE = "http://127.0.0.1:8000";
   const systemMessage = { role: "system", content: "Responde en frases cortas." };
   const MAX_CONTEXT = 20;
+  const CHAT_PROTOCOL = 1;
   let isStreaming = false;
 
   const messagesContainer = document.getElementById("messages");
@@ -139,6 +140,7 @@
       id: currentSessionId,
       title: "Nueva conversación",
       messages: [systemMessage],
+      serverTurn: 0,
       timestamp: Date.now()
     };
     const sessions = getAllSessions();
@@ -314,17 +316,17 @@
     showStatus("Enviando...");
 
     const assistantBubble = renderMessageBubble("assistant", "");
-    const payload = buildPayload();
 
     let assistantText = "";
     let reader = null;
 
     try {
-      const response = await fetch(`${API_BASE}/chat/stream`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload)
-      });
+      let response = await postChat(buildPayload());
+      if (response.status === 409) {
+        // El servidor perdió o no coincide con el historial: reenviar completo
+        response = await postChat(buildPayload(true));
+      }
+      setServerTurn(response.ok ? response.headers.get("X-Session-Turn") : null);
 
       if (!response.ok || !response.body) {
         let errorDetail = "Error interno";
@@ -361,6 +363,7 @@
       pushMessage({ role: "assistant", content: assistantText });
       showStatus("Listo");
     } catch (error) {
+      setServerTurn(null);
       assistantBubble.textContent = error.message || "Error interno";
       assistantBubble.classList.add("message-error");
       showStatus(error.message || "Error interno");
@@ -376,17 +379,46 @@
     }
   }
 
-  function buildPayload() {
+  function postChat(payload) {
+    return fetch(`${API_BASE}/chat/stream`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload)
+    });
+  }
+
+  function buildPayload(fullHistory = false) {
     const session = getCurrentSession();
-    const messages = session.messages.map((item) => ({ role: item.role, content: item.content }));
-    return {
+    const payload = {
       clientId,
+      sessionId: currentSessionId,
+      protocol: CHAT_PROTOCOL,
       model: modelSelect.value,
       temperature: Number(temperatureRange.value),
-      messages,
       useRag: ragToggle ? ragToggle.checked : false,
       ragNResults: 5
     };
+
+    // Protocolo delta: solo el mensaje nuevo y el último turno confirmado
+    const lastMessage = session.messages[session.messages.length - 1];
+    if (!fullHistory && Number.isInteger(session.serverTurn) && lastMessage && lastMessage.role === "user") {
+      return { ...payload, turn: session.serverTurn, prompt: lastMessage.content };
+    }
+
+    payload.messages = session.messages.map((item) => ({ role: item.role, content: item.content }));
+    return payload;
+  }
+
+  function setServerTurn(value) {
+    const sessions = getAllSessions();
+    const session = sessions[currentSessionId];
+    if (!session) {
+      return;
+    }
+    const turn = Number.parseInt(value, 10);
+    // Sin turno confirmado el próximo envío manda el historial completo
+    session.serverTurn = Number.isInteger(turn) ? turn : null;
+    saveSessions(sessions);
   }
 
   function clearConversation() {
@@ -505,18 +537,17 @@
     formData.append("file", file);
 
     try {
-      showStatus("Subiendo PDF...");
-      const response = await fetch(`${API_BASE}/rag/upload`, {
+      showStatus("Subiendo e indexando PDF...");
+      // index=true indexa solo este archivo en el servidor al terminar la subida
+      const response = await fetch(`${API_BASE}/rag/upload?index=true`, {
         method: "POST",
         body: formData
       });
 
       if (response.ok) {
         const data = await response.json();
-        showStatus(`✓ ${data.filename} subido. Indexando...`);
-        
-        // Auto-indexar después de subir
-        await handleRagIndex();
+        showStatus(`✓ ${data.filename}: ${data.message}`);
+        await loadRagStatus();
       } else {
         const error = await response.json();
         showStatus(`Error: ${error.detail}`);